@@ -1,17 +1,28 @@
+import io
+import json
 import os
-from flask import Flask, render_template, request, send_file, url_for
+from datetime import datetime
+from flask import Flask, jsonify, render_template, request, send_file, url_for
 from werkzeug.utils import secure_filename
-import whisper
 
+import config
+from services import (ai_service, live_service, metrics_service, output_store, preview_service, profiling_service,
+                      report_store, transcript_cache)
 # ✅ เรียกใช้งานทีมงานผู้เชี่ยวชาญ (Services)
-from services.parser_service import normalize_text, extract_data
-from services.pdf_service import fill_pdf
+from services.pipeline_service import rerender, resolve_template, run_pipeline
+from services.job_service import JobQueue, QueueFull
+
+try:
+    from flask_sock import Sock
+except ImportError:  # ไม่ได้ลง flask-sock: ปิด Live Dictation (อัปโหลดไฟล์ใช้ได้ตามเดิม)
+    Sock = None
 
 app = Flask(__name__)
+sock = Sock(app) if Sock is not None and config.LIVE_DICTATION else None
 
 # ตั้งค่าโฟลเดอร์
 UPLOAD_FOLDER = 'uploads'
-OUTPUT_FOLDER = 'outputs'
+OUTPUT_FOLDER = config.OUTPUT_FOLDER  # PDF ที่สร้างแล้ว (จัดการโดย Output Store)
 ASSETS_FOLDER = 'assets'  # โฟลเดอร์เก็บ Template
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -20,10 +31,100 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 
-# โหลดโมเดล Whisper
-print("Loading Whisper model...")
-model = whisper.load_model("base")
-print("Model loaded!")
+# โหลดโมเดล Whisper ผ่าน Model Registry (ตัวเดียวกับ ai_service)
+# ถ้ารันด้วย gunicorn.conf.py จะโหลดครั้งเดียวใน master แล้วทุก worker ใช้ร่วมกัน
+# ใช้ Inference Worker: โมเดลอยู่ใน process นั้นแทน web process ไม่ต้องโหลด
+if not config.INFERENCE_WORKER:
+    model = ai_service.load_model()
+    print("Model loaded!")
+
+TEMPLATE_FILENAME = "RCC_Wilms_Tumor_Template.pdf"
+
+
+def process_job(job_id, audio_bytes, filename, profile=None, profiling=False):
+    """
+    งานที่รันใน Worker: ถอดเสียง -> ดึงข้อมูล -> เขียน PDF
+    profiling=True (หรือ config.PROFILE_JOBS): เก็บ flamegraph ของงานนี้ไว้ข้างไฟล์งาน (/jobs/<id>/profile)
+    """
+    prof = None
+    try:
+        with profiling_service.profiled(profiling or config.PROFILE_JOBS, config.PROFILE_INTERVAL_MS) as prof:
+            result = _run_job(job_id, audio_bytes, filename, profile)
+    finally:
+        # งานที่ล้มเหลวก็เก็บ flamegraph ไว้ดูได้
+        if prof is not None:
+            summary = profiling_service.save(prof, config.JOB_FOLDER, job_id, config.PROFILE_TOP_N)
+    if prof is not None:
+        result["profiling"] = summary
+    return result
+
+
+def _run_job(job_id, audio_bytes, filename, profile):
+    template_path = resolve_template(ASSETS_FOLDER, TEMPLATE_FILENAME)
+    try:
+        result = run_pipeline(audio_bytes, template_path, filename=filename, profile=profile)
+    except Exception:
+        metrics_service.get_metrics().inc("pathology_jobs_total", status="failed")
+        raise
+    metrics_service.get_metrics().inc("pathology_jobs_total", status="done")
+    with profiling_service.span("store"):
+        # PDF สร้างใน RAM แล้วเก็บเข้า Output Store (ชื่อไฟล์ = hash ของเนื้อหา)
+        pdf_filename = output_store.get_store().put(result["pdf_bytes"], {"regions": result["regions"]})
+        # บันทึกรายงานลง Report Store (ค้นย้อนหลังผ่าน /reports)
+        report_id = report_store.get_store().add(
+            result["specimens"], raw_text=result["raw_text"], transcription=result["transcription"],
+            job_id=job_id, source=filename, template=template_path, profile=result["profile"],
+            timings=result["timings"], pdf=pdf_filename)
+    return {
+        "transcription": result["transcription"],
+        "data": result["data"],
+        "specimens": result["specimens"],  # หลาย specimen: 1 หน้าต่อ specimen ใน PDF
+        "profile": result["profile"],  # Decode Profile ที่ใช้ถอดงานนี้
+        "pdf_filename": pdf_filename,
+        "download_name": f"Report_{os.path.splitext(filename)[0]}.pdf",
+        "report_id": report_id,
+    }
+
+
+jobs = JobQueue(process_job,
+                workers=config.JOB_WORKERS,
+                max_pending=config.JOB_QUEUE_SIZE,
+                result_ttl=config.JOB_RESULT_TTL,
+                store_dir=config.JOB_FOLDER)
+
+
+def submit_upload(file, profile=None):
+    """
+    อ่านไฟล์ที่อัปโหลดเข้าหน่วยความจำแล้วส่งเข้าคิว (คืนค่า job id)
+    profile = Decode Profile (fast / balanced / accurate) ชื่อไม่ถูกต้อง -> ValueError
+    header X-Profile: 1 = เก็บ flamegraph ของงานนี้ด้วย
+    """
+    # ไม่เขียนลง uploads/ แล้ว: ถอดรหัสเสียงจาก bytes โดยตรง ชื่อไฟล์ซ้ำกันก็ไม่ทับกัน
+    profile = profile or config.DEFAULT_DECODE_PROFILE
+    if profile not in config.DECODE_PROFILES:
+        raise ValueError(f"Unknown profile {profile!r} (choose from {', '.join(config.DECODE_PROFILES)})")
+    filename = secure_filename(file.filename) or "audio"
+    with metrics_service.get_metrics().timer("upload"):
+        profiling = request.headers.get(config.PROFILE_HEADER, '').lower() in ('1', 'true', 'yes')
+        return jobs.submit(file.read(), filename, profile, profiling)
+
+
+@app.context_processor
+def decode_profiles():
+    # ตัวเลือก Decode Profile ในฟอร์มอัปโหลด (ทุกหน้า)
+    return {"profiles": config.DECODE_PROFILES, "default_profile": config.DEFAULT_DECODE_PROFILE}
+
+
+@app.context_processor
+def live_dictation_enabled():
+    return {"live_enabled": sock is not None}
+
+
+def job_status(job):
+    status = {k: job[k] for k in ("id", "status", "submitted_at", "started_at", "finished_at", "error")}
+    status["result_url"] = url_for('job_result', job_id=job["id"])
+    return status
+
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -34,58 +135,356 @@ def index():
         if file.filename == '':
             return "No selected file"
 
-        if file:
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-
-            # 1. ถอดเสียง (Ear) 👂
-            print("Transcribing...")
-            result = model.transcribe(filepath)
-            raw_text = result["text"]
-            print(f"Raw Text: {raw_text}")
-
-            # 2. แปลงข้อมูล (Brain) 🧠 -> เรียกใช้ parser_service
-            # แปลงคำพูดให้เป็นระเบียบ (one -> 1, cm, x)
-            cleaned_text = normalize_text(raw_text)
-            print(f"Cleaned: {cleaned_text}")
-            
-            # ดึงข้อมูลสำคัญออกมา (Measuring, margins, checkboxes)
-            data_points = extract_data(cleaned_text)
-            print(f"Extracted Data: {data_points}")
-
-            # 3. เตรียมไฟล์ Template
-            template_filename = "RCC_Wilms_Tumor_Template.pdf"
-            template_path = os.path.join(ASSETS_FOLDER, template_filename)
-
-            # (ระบบกันพลาด: ถ้าหาไม่เจอ ให้ใช้ไฟล์ blank)
-            if not os.path.exists(template_path):
-                print(f"Warning: Template not found at {template_path}, trying fallback...")
-                template_path = "template.pdf" 
-
-            output_filename = f"Report_{filename}.pdf"
-            output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-
-            # 4. เขียนลง PDF (Hand) ✍️ -> เรียกใช้ pdf_service
-            # ส่งข้อมูลที่กลั่นกรองแล้ว ไปให้คนเขียน เขียนลงช่องเป๊ะๆ
-            try:
-                fill_pdf(template_path, output_path, data_points)
-                print("PDF Generated Successfully!")
-            except Exception as e:
-                print(f"Error generating PDF: {e}")
-                return f"Error: {e}"
-
-            return render_template('index.html', 
-                                   transcription=cleaned_text,  # โชว์ข้อความที่เกลาแล้ว
-                                   pdf_filename=output_filename)
+        try:
+            job_id = submit_upload(file, request.form.get('profile'))
+        except ValueError as e:
+            return str(e), 400
+        except QueueFull as e:
+            return f"Server busy: {e}", 429, {"Retry-After": "30"}
+        # หน้าเว็บจะ poll สถานะจนเสร็จ แล้วโหลดผลลัพธ์ผ่าน ?job=<id>
+        return render_template('index.html', job_id=job_id)
+
+    job_id = request.args.get('job')
+    if job_id:
+        job = jobs.get(job_id)
+        if job and job["status"] == "done":
+            return render_template('index.html',
+                                   transcription=job["result"]["transcription"],  # โชว์ข้อความที่เกลาแล้ว
+                                   pdf_filename=job["result"]["pdf_filename"],
+                                   preview_urls=_preview_urls(job["result"]),
+                                   download_name=job["result"].get("download_name"),
+                                   profile=job["result"].get("profile"),
+                                   result_job_id=job_id)
+        if job and job["status"] == "failed":
+            return f"Error: {job['error']}"
+        if job:
+            return render_template('index.html', job_id=job_id)
 
     return render_template('index.html')
 
+
+# ==========================================
+# Job API: ส่งงานแล้วได้ job id กลับทันที แล้วค่อย poll ผล
+# ==========================================
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    file = request.files.get('audio_file')
+    if file is None or file.filename == '':
+        return jsonify(error="No audio_file uploaded"), 400
+    try:
+        job_id = submit_upload(file, request.form.get('profile'))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except QueueFull as e:
+        return jsonify(error=str(e)), 429, {"Retry-After": "30"}
+    return jsonify(job_status(jobs.get(job_id))), 202, {"Location": url_for('get_job', job_id=job_id)}
+
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    status = job_status(job)
+    status["queue_depth"] = jobs.depth()
+    return jsonify(status)
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    if job["status"] == "failed":
+        return jsonify(job_status(job)), 500
+    if job["status"] != "done":
+        # ยังไม่เสร็จ: ให้ client poll ต่อ
+        return jsonify(job_status(job)), 202
+    result = dict(job["result"])
+    result["pdf_url"] = url_for('download_file', filename=result["pdf_filename"], name=result.get("download_name"))
+    result["preview_url"] = url_for('preview_file', filename=result["pdf_filename"], highlight=1)
+    result["preview_urls"] = _preview_urls(result)
+    if "profiling" in result:
+        result["profiling"] = dict(result["profiling"], flamegraph_url=url_for('job_profile', job_id=job_id))
+    return jsonify(result)
+
+
+@app.route('/jobs/<job_id>/profile')
+def job_profile(job_id):
+    """
+    flamegraph ของงานที่ส่งมาพร้อม header X-Profile: 1 (SVG เปิดใน browser ชี้เมาส์ดูเวลา)
+    ?format=folded = folded stacks (speedscope / flamegraph.pl) / ?format=json = ตาราง top-N + เวลาแต่ละ span
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    fmt = request.args.get('format', 'svg')
+    if fmt == 'json':
+        summary = (job["result"] or {}).get("profiling")
+        return (jsonify(summary), 200) if summary else (jsonify(error="Job was not profiled"), 404)
+    if fmt not in ('svg', 'folded'):
+        return jsonify(error="format must be svg, folded or json"), 400
+    path = os.path.join(config.JOB_FOLDER, f"{job_id}.profile.{fmt}")
+    if not os.path.exists(path):
+        return jsonify(error="Job was not profiled" if job["finished_at"] else f"Job is {job['status']}"), 404
+    return send_file(path, mimetype='image/svg+xml' if fmt == 'svg' else 'text/plain')
+
+
+@app.route('/jobs/<job_id>/rerender', methods=['POST'])
+def rerender_job(job_id):
+    """
+    แก้ transcript ของงานที่เสร็จแล้ว -> สร้าง PDF ใหม่โดยไม่ถอดเสียงซ้ำ
+    body: JSON {"text": "..."} หรือ form field text
+    คืนค่า PDF ใหม่ (pdf_url) + diff รายช่องของข้อมูลที่เปลี่ยน
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    if job["status"] != "done":
+        return jsonify(error=f"Job is {job['status']}"), 409
+    payload = request.get_json(silent=True) or request.form
+    text = payload.get('text')
+    if not text or not text.strip():
+        return jsonify(error="No text"), 400
+
+    template_path = resolve_template(ASSETS_FOLDER, TEMPLATE_FILENAME)
+    previous = job["result"].get("specimens") or [{"label": None, "data": job["result"]["data"]}]
+    edited = rerender(text, template_path, previous)
+    pdf_filename = output_store.get_store().put(edited["pdf_bytes"], {"regions": edited["regions"]})
+    # ฉบับแก้เป็น record ใหม่ใน Report Store (ฉบับก่อนแก้ยังค้นได้ด้วย job_id เดียวกัน)
+    report_id = report_store.get_store().add(
+        edited["specimens"], transcription=edited["transcription"], job_id=job_id,
+        template=template_path, profile=job["result"].get("profile"), timings=edited["timings"], pdf=pdf_filename)
+    result = dict(job["result"],
+                  transcription=edited["transcription"],
+                  data=edited["data"],
+                  specimens=edited["specimens"],
+                  pdf_filename=pdf_filename,
+                  report_id=report_id,
+                  revision=job["result"].get("revision", 0) + 1)
+    # เก็บเป็นผลล่าสุดของงาน: เปิดหน้าผลใหม่ / แก้ครั้งถัดไปจะเทียบกับฉบับนี้
+    jobs.update_result(job_id, result)
+
+    response = dict(result, diff=edited["diff"])
+    response["pdf_url"] = url_for('download_file', filename=result["pdf_filename"], name=result.get("download_name"))
+    response["preview_url"] = url_for('preview_file', filename=result["pdf_filename"], highlight=1)
+    response["preview_urls"] = _preview_urls(result)
+    return jsonify(response)
+
+
 @app.route('/download/<filename>')
 def download_file(filename):
-    file_path = os.path.join(app.config['OUTPUT_FOLDER'], filename)
+    store = output_store.get_store()
+    found = store.get(filename)
+    if found is None:
+        return "Report not found (it may have expired)", 404
+    pdf_bytes, file_path, mtime = found
+    store.touch(filename)
+
+    # ชื่อไฟล์ = hash ของเนื้อหา ใช้เป็น ETag ได้เลย: เปิดดูซ้ำได้ 304 ไม่ต้องส่งไฟล์ใหม่
+    # conditional=True รองรับ If-None-Match / If-Modified-Since / Range (viewer ขอทีละช่วงได้)
     # as_attachment=False เพื่อให้เปิดดูได้เลย ไม่ต้องโหลด
-    return send_file(file_path, as_attachment=False)
+    download_name = secure_filename(request.args.get('name', '')) or os.path.basename(file_path)
+    response = send_file(io.BytesIO(pdf_bytes) if pdf_bytes is not None else file_path,
+                         mimetype='application/pdf', as_attachment=False, download_name=download_name,
+                         conditional=True, etag=os.path.splitext(os.path.basename(file_path))[0],
+                         last_modified=mtime, max_age=config.OUTPUT_BROWSER_CACHE_SECONDS)
+    # รายงานผู้ป่วย: ให้ cache ได้เฉพาะใน browser ของผู้ใช้ ห้าม proxy กลางทางเก็บ
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+
+@app.route('/preview/<filename>')
+def preview_file(filename):
+    """
+    รูป PNG ของหน้ารายงาน ?page=<หน้า เริ่มที่ 0> (หลาย specimen = หลายหน้า) ?dpi=<ความละเอียด> (ค่าเริ่มต้น PREVIEW_DPI)
+    ?highlight=1 ระบายสีช่องที่ระบบเขียนลงไป
+    render ครั้งแรกแล้ว cache ไว้ เปิดซ้ำ / refresh ไม่ต้อง render ใหม่
+    """
+    store = output_store.get_store()
+    found = store.get(filename)
+    if found is None:
+        return "Report not found (it may have expired)", 404
+    pdf_bytes, file_path, _ = found
+    dpi = min(max(request.args.get('dpi', config.PREVIEW_DPI, type=int), 20), config.PREVIEW_MAX_DPI)
+    regions = None
+    if request.args.get('highlight') in ('1', 'true'):
+        regions = (store.get_meta(filename) or {}).get("regions", [])
+
+    try:
+        png_path = preview_service.get_preview(filename, pdf_bytes if pdf_bytes is not None else file_path, dpi,
+                                               regions, request.args.get('page', 0, type=int))
+    except ValueError as e:
+        return f"Page not found: {e}", 404
+    stem = os.path.splitext(os.path.basename(png_path))[0]
+    response = send_file(png_path, mimetype='image/png', conditional=True, etag=stem,
+                         max_age=config.OUTPUT_BROWSER_CACHE_SECONDS)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+
+def _preview_urls(result):
+    """ลิงก์ preview ทุกหน้า (1 หน้าต่อ specimen) หน้าแรกใช้ URL เดียวกับ preview_url"""
+    pages = len(result.get("specimens") or []) or 1
+    return [url_for('preview_file', filename=result["pdf_filename"], highlight=1, **({"page": i} if i else {}))
+            for i in range(pages)]
+
+
+# ==========================================
+# Live Dictation: WebSocket /live?profile=fast (ต้องลง flask-sock)
+# client -> server: frame binary = PCM 16-bit 16 kHz mono / ข้อความ {"type": "stop"} = พูดจบ
+# server -> client: {"type": "ready"} / {"type": "update", "changes": [...]} ระหว่างพูด
+#                   / {"type": "done", "pdf_url": ...} หลัง stop / {"type": "error", "error": ...}
+# ==========================================
+def live_dictation(ws):
+    try:
+        session = live_service.LiveSession(request.args.get('profile'))
+    except ValueError as e:
+        ws.send(json.dumps({"type": "error", "error": str(e)}))
+        return
+    ws.send(json.dumps({"type": "ready", "profile": session.profile, "sample_rate": live_service.SAMPLE_RATE,
+                        "step_seconds": config.LIVE_STEP_SECONDS}))
+    try:
+        while True:
+            message = ws.receive()
+            # ถอดช้ากว่าพูด: รวม frame ที่ค้างอยู่ทั้งหมดแล้วถอดรอบเดียว (ไม่ถอดทีละ frame จนตามไม่ทัน)
+            while isinstance(message, bytes):
+                session.add(message)
+                message = ws.receive(timeout=0)
+            if message is not None and json.loads(message).get("type") == "stop":
+                break
+            if session.due():
+                ws.send(json.dumps(session.step()))
+    except ValueError as e:
+        ws.send(json.dumps({"type": "error", "error": str(e)}))
+        return
+
+    template_path = resolve_template(ASSETS_FOLDER, TEMPLATE_FILENAME)
+    with metrics_service.get_metrics().timer("live_finish"):
+        result = session.finish(template_path)
+        pdf_filename = output_store.get_store().put(result["pdf_bytes"], {"regions": result["regions"]})
+        report_id = report_store.get_store().add(
+            result["specimens"], raw_text=result["raw_text"], transcription=result["transcription"],
+            source="live", template=template_path, profile=result["profile"], timings=result["timings"],
+            pdf=pdf_filename)
+    download_name = f"Report_live_{datetime.now():%Y%m%d_%H%M%S}.pdf"
+    ws.send(json.dumps({
+        "type": "done",
+        "transcription": result["transcription"],
+        "data": result["data"],
+        "specimens": result["specimens"],
+        "profile": result["profile"],
+        "timings": result["timings"],
+        "report_id": report_id,
+        "pdf_url": url_for('download_file', filename=pdf_filename, name=download_name),
+        "preview_url": url_for('preview_file', filename=pdf_filename, highlight=1),
+        "preview_urls": _preview_urls({"pdf_filename": pdf_filename, "specimens": result["specimens"]}),
+    }))
+
+
+if sock is not None:
+    sock.route('/live')(live_dictation)
+
+
+# ==========================================
+# Report Store: ค้นรายงานย้อนหลังจากข้อมูลที่ดึงได้ (ไม่ต้องเปิด PDF)
+# ==========================================
+@app.route('/reports')
+def list_reports():
+    """
+    ค้นรายงาน ใหม่สุดก่อน เช่น /reports?deep_margin_lt=1&since=2026-10-01
+    ตัวกรอง: since / until (วันที่ YYYY-MM-DD หรือ epoch วินาที), template, profile, job_id,
+             side, procedure, deep_margin_lt, min_margin_lt, mass_size_gte
+    หน้าถัดไป: ?before=<next_before> (limit สูงสุด 500 ต่อหน้า, text=1 รวมข้อความ transcript)
+    """
+    filters = {}
+    try:
+        for name in report_store.FILTERS:
+            value = request.args.get(name)
+            if value is None or value == '':
+                continue
+            if name in ('since', 'until'):
+                value = _parse_time(value)
+            elif name.endswith(('_lt', '_gte')):
+                value = float(value)
+            filters[name] = value
+        page = report_store.get_store().query(limit=request.args.get('limit', 50, type=int),
+                                              before=request.args.get('before', type=int),
+                                              with_text=request.args.get('text') in ('1', 'true'),
+                                              **filters)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    for item in page["items"]:
+        _add_pdf_url(item)
+    if page["next_before"] is not None:
+        page["next_url"] = url_for('list_reports', **dict(request.args.items(), before=page["next_before"]))
+    return jsonify(page)
+
+
+@app.route('/reports/<int:report_id>')
+def get_report(report_id):
+    report = report_store.get_store().get(report_id)
+    if report is None:
+        return jsonify(error="Report not found"), 404
+    _add_pdf_url(report)
+    return jsonify(report)
+
+
+def _add_pdf_url(report):
+    # ลิงก์เฉพาะ PDF ใน Output Store (ชื่อ <hash>.pdf) รายงานเก่าจาก batch.py ที่เก็บ path บนเครื่องไว้ไม่มีลิงก์
+    if report["pdf"] and os.path.basename(report["pdf"]) == report["pdf"]:
+        report["pdf_url"] = url_for('download_file', filename=report["pdf"])
+
+
+def _parse_time(value):
+    """"2026-10-01" / "2026-10-01T08:00" (เวลาเครื่อง) หรือ epoch วินาที -> epoch วินาที"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+# ==========================================
+# Health checks
+# ==========================================
+@app.route('/healthz')
+def healthz():
+    # Liveness: process ยังตอบได้
+    return jsonify(status="ok", pid=os.getpid())
+
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: โมเดลโหลดแล้วและ warm-up เสร็จ พร้อมรับงาน
+    status = ai_service.model_status()
+    status["pid"] = os.getpid()
+    return jsonify(status), 200 if status["warm"] else 503
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    # hit / miss ของ Transcript Cache (ตัวนับแยกต่อ worker process)
+    return jsonify(transcript_cache.get_cache().stats())
+
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus scrape: รวมค่าจากทุก worker process
+    counts = jobs.stats()
+    gauges = {
+        "pathology_job_queue_depth": ("Jobs waiting in the queue (all workers)", counts["queued"]),
+        "pathology_jobs_in_flight": ("Jobs currently being processed (all workers)", counts["running"]),
+    }
+    return metrics_service.render(gauges), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=7860)
\ No newline at end of file
+    metrics_service.reset()
+    if config.INFERENCE_WORKER:
+        from services import inference_service
+        inference_service.start_workers()
+    else:
+        ai_service.warm_up_async()
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 7860)))
@@ -0,0 +1,251 @@
+"""
+ประมวลผลไฟล์เสียงทั้งโฟลเดอร์ (เช่น dump ตอนสิ้นวัน) แบบขนาน
+
+    python batch.py recordings/ --out batch_outputs --asr-workers 2 --cpu-workers 2
+    python batch.py manifest.txt --out batch_outputs
+    python batch.py batch_outputs/summary.jsonl --rerender [--combined day.pdf]
+
+- ถอดเสียงใน process pool (1 โมเดลต่อ 1 worker process)
+- normalize/extract/fill_pdf ของไฟล์ที่ถอดเสียงเสร็จแล้ว รันใน CPU pool อีกชุด ซ้อนกันไปได้
+- เขียน PDF + summary.jsonl (1 บรรทัดต่อไฟล์) ถ้าโปรแกรมล่มกลางทาง รันใหม่จะข้ามไฟล์ที่เสร็จแล้ว
+- บันทึกแต่ละรายงานลง Report Store ด้วย (ค้นผ่าน /reports ได้เหมือนงานจากหน้าเว็บ, --no-store = ไม่บันทึก)
+  PDF ใส่ Output Store ด้วย (ลิงก์ดาวน์โหลดจาก /reports ใช้ได้ หมดอายุตามกฎเดียวกับงานจากหน้าเว็บ)
+- --rerender: สร้าง PDF ใหม่ทั้งหมดจาก summary.jsonl (ไม่ถอดเสียงซ้ำ) เช่น หลังเปลี่ยน Template
+  เปิด Template ครั้งเดียวแล้วเขียนทุกรายงานต่อกัน (--combined = รวมเป็นไฟล์เดียว 1 หน้าต่อรายงาน)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import config
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".webm")
+
+
+# ==========================================
+# Worker functions (รันใน process ลูก)
+# ==========================================
+def _init_asr_worker(torch_threads):
+    from services import ai_service
+    # batch ขนานกันระดับไฟล์อยู่แล้ว ไม่ต้องแตกไฟล์ยาวเป็นท่อนซ้อนอีกชั้น
+    config.LONG_AUDIO_WORKERS = 1
+    config.INFERENCE_WORKER = False  # แต่ละ process ถือโมเดลของตัวเอง
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+    ai_service.load_model()  # โหลดโมเดลครั้งเดียวต่อ process
+
+
+def _transcribe(audio_path, profile=None):
+    from services import ai_service
+    t0 = time.time()
+    raw_text = ai_service.transcribe(audio_path, profile)
+    return raw_text, time.time() - t0
+
+
+def _render(raw_text, template_path, output_path):
+    from services.parser_service import normalize_text, extract_specimens
+    from services.pdf_service import fill_pdf, render_bulk
+    t0 = time.time()
+    cleaned_text = normalize_text(raw_text)
+    specimens = extract_specimens(cleaned_text)
+    if len(specimens) == 1:
+        fill_pdf(template_path, output_path, specimens[0]["data"])
+    else:
+        render_bulk(template_path, [s["data"] for s in specimens], output_path)  # 1 หน้าต่อ specimen
+    return cleaned_text, specimens, time.time() - t0
+
+
+# ==========================================
+# Input / resume helpers
+# ==========================================
+def collect_inputs(source):
+    """รับได้ทั้งโฟลเดอร์ หรือไฟล์ manifest (1 path ต่อบรรทัด)"""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths += [os.path.join(root, f) for f in files if f.lower().endswith(AUDIO_EXTENSIONS)]
+        return sorted(paths)
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return paths
+
+
+def file_key(path):
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def load_completed(summary_path):
+    """อ่าน summary.jsonl เดิม คืนค่า key ของไฟล์ที่ทำเสร็จแล้ว"""
+    done = set()
+    if not os.path.exists(summary_path):
+        return done
+    with open(summary_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # บรรทัดสุดท้ายอาจเขียนไม่ครบตอนล่ม
+            if record.get("status") == "ok":
+                done.add(record["key"])
+    return done
+
+
+def output_name(audio_path, used):
+    stem = os.path.splitext(os.path.basename(audio_path))[0]
+    name = f"Report_{stem}.pdf"
+    i = 1
+    while name in used:
+        name = f"Report_{stem}_{i}.pdf"; i += 1
+    used.add(name)
+    return name
+
+
+def rerender(summary_path, template_path, combined_path=None):
+    from services import pdf_service
+    records = {}
+    with open(summary_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok":
+                records[record["key"]] = record  # รันซ้ำหลายรอบ: ใช้ผลล่าสุดของแต่ละไฟล์
+    records = list(records.values())
+    if not records:
+        print(f"No completed records in {summary_path}")
+        return 1
+
+    # หลาย specimen = หลายหน้า (เหมือน _render) ไม่ใช่แค่ specimen แรกใน "data"
+    pages = [[s["data"] for s in r["specimens"]] if r.get("specimens") else [r["data"]] for r in records]
+    n_pages = sum(len(p) for p in pages)
+    started = time.time()
+    if combined_path:
+        pdf_service.render_bulk(template_path, [data for p in pages for data in p], combined_path)
+        target = combined_path
+    else:
+        single = [(p[0], r["pdf"]) for p, r in zip(pages, records) if len(p) == 1]
+        if single:
+            pdf_service.render_bulk_files(template_path, [d for d, _ in single], [path for _, path in single])
+        for p, r in zip(pages, records):
+            if len(p) > 1:
+                pdf_service.render_bulk(template_path, p, r["pdf"])
+        target = f"{len(records)} files"
+    seconds = time.time() - started
+    print(f"Re-rendered {len(records)} reports ({n_pages} pages) -> {target} in {seconds:.2f}s "
+          f"({len(records) / max(seconds, 1e-9):.0f} reports/s)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch dictation -> PDF report")
+    parser.add_argument("source", help="โฟลเดอร์ไฟล์เสียง หรือ manifest (.txt) (--rerender: summary.jsonl)")
+    parser.add_argument("--out", default="batch_outputs")
+    parser.add_argument("--summary", default=None, help="ค่าเริ่มต้น: <out>/summary.jsonl")
+    parser.add_argument("--template", default=os.path.join(config.ASSETS_FOLDER, config.TEMPLATE_PDF))
+    parser.add_argument("--asr-workers", type=int, default=1)
+    parser.add_argument("--cpu-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--torch-threads", type=int, default=0, help="จำนวน thread ของ torch ต่อ ASR worker (0 = ค่าเริ่มต้น)")
+    parser.add_argument("--profile", default=config.DEFAULT_DECODE_PROFILE, choices=sorted(config.DECODE_PROFILES),
+                        help="Decode Profile (config.DECODE_PROFILES)")
+    parser.add_argument("--no-store", action="store_true", help="ไม่บันทึกรายงานลง Report Store (config.REPORT_DB)")
+    parser.add_argument("--rerender", action="store_true", help="สร้าง PDF ใหม่จาก summary.jsonl โดยไม่ถอดเสียงซ้ำ")
+    parser.add_argument("--combined", default=None, help="(--rerender) รวมทุกรายงานเป็น PDF ไฟล์เดียว")
+    args = parser.parse_args()
+
+    if args.rerender:
+        return rerender(args.source, args.template, args.combined)
+
+    os.makedirs(args.out, exist_ok=True)
+    summary_path = args.summary or os.path.join(args.out, "summary.jsonl")
+
+    inputs = collect_inputs(args.source)
+    done = load_completed(summary_path)
+    used_names = set()
+    todo = []
+    for path in inputs:
+        key = file_key(path)
+        name = output_name(path, used_names)
+        if key not in done:
+            todo.append((path, key, os.path.join(args.out, name)))
+    print(f"Found {len(inputs)} files, {len(inputs) - len(todo)} already done, {len(todo)} to process")
+    if not todo:
+        return 0
+
+    # spawn: ไม่ fork process ที่ import torch ไปแล้ว
+    ctx = multiprocessing.get_context("spawn")
+    asr_pool = ProcessPoolExecutor(args.asr_workers, mp_context=ctx,
+                                   initializer=_init_asr_worker, initargs=(args.torch_threads,))
+    cpu_pool = ProcessPoolExecutor(args.cpu_workers, mp_context=ctx)
+
+    store = outputs = None
+    if not args.no_store:
+        from services import output_store, report_store
+        store = report_store.get_store()
+        outputs = output_store.get_store()
+
+    failed = 0
+    started = time.time()
+    with open(summary_path, "a") as summary, asr_pool, cpu_pool:
+        def write_record(record):
+            summary.write(json.dumps(record, ensure_ascii=False) + "\n")
+            summary.flush()
+            os.fsync(summary.fileno())
+
+        pending = {}
+        for path, key, output_path in todo:
+            pending[asr_pool.submit(_transcribe, path, args.profile)] = ("asr", path, key, output_path, None)
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                stage, path, key, output_path, asr_info = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ {path}: {stage} failed: {e}")
+                    write_record({"key": key, "audio": path, "status": "error", "stage": stage, "error": str(e)})
+                    continue
+
+                if stage == "asr":
+                    raw_text, asr_seconds = result
+                    # ถอดเสียงเสร็จ -> ส่งต่อให้ CPU pool ทันที (ไม่รอไฟล์อื่น)
+                    render = cpu_pool.submit(_render, raw_text, args.template, output_path)
+                    pending[render] = ("render", path, key, output_path, (raw_text, asr_seconds))
+                else:
+                    raw_text, asr_seconds = asr_info
+                    cleaned_text, specimens, render_seconds = result
+                    if store is not None:
+                        with open(output_path, "rb") as f:
+                            pdf_filename = outputs.put(f.read())  # /reports ลิงก์ด้วยชื่อใน store ไม่ใช่ path บนเครื่อง
+                        store.add(specimens, raw_text=raw_text, transcription=cleaned_text,
+                                  source=os.path.basename(path), template=args.template, profile=args.profile,
+                                  timings={"transcribe": round(asr_seconds, 4), "render": round(render_seconds, 4)},
+                                  pdf=pdf_filename)
+                    write_record({
+                        "key": key, "audio": path, "status": "ok", "pdf": output_path,
+                        "raw_text": raw_text, "transcription": cleaned_text, "data": specimens[0]["data"],
+                        "specimens": specimens if len(specimens) > 1 else None, "profile": args.profile,
+                        "asr_seconds": round(asr_seconds, 3), "render_seconds": round(render_seconds, 3),
+                    })
+                    print(f"✅ {os.path.basename(path)} -> {output_path}")
+
+    print(f"Done: {len(todo) - failed} ok, {failed} failed in {time.time() - started:.1f}s (summary: {summary_path})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+เทียบ ASR backend (config.ASR_BACKEND): real-time factor (RTF) และ WER บนเฉลยชุดเดียวกัน
+
+    python benchmarks/bench_asr.py                                          # ทุก backend, เฉลยใน answer_keys/
+    python benchmarks/bench_asr.py my_corpus/ --backends whisper whisper-int8 --out asr.json
+
+เฉลยรูปแบบเดียวกับ evaluate.py (ใช้เฉพาะเคสที่มีทั้ง "audio" และ "reference")
+แต่ละ backend รันใน process ของตัวเอง (หน่วยความจำไม่ปนกัน) ไม่ผ่าน Transcript Cache
+RTF = เวลาถอดเสียง / ความยาวเสียง (ต่ำกว่า = เร็วกว่า, < 1 = เร็วกว่าเวลาจริง)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from evaluate import load_keys, wer_text
+from benchmarks.bench_pipeline import max_rss_kb
+
+
+def run_backend(backend, keys, size, torch_threads):
+    """รันใน process แยก: โหลด backend -> warm-up -> ถอดทุกเคส"""
+    import numpy as np
+    import torch
+    from services import ai_service, asr_backend, audio_service
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+
+    t0 = time.perf_counter()
+    model = asr_backend.load(size, backend)
+    load_seconds = time.perf_counter() - t0
+    options = {"language": "en", "initial_prompt": ai_service.MEDICAL_PROMPT}
+    model.transcribe(np.zeros(audio_service.SAMPLE_RATE, dtype=np.float32), language="en")  # warm-up
+
+    cases = []
+    for key in keys:
+        samples = ai_service.load_audio(key["audio"], key["audio"])
+        t0 = time.perf_counter()
+        text = model.transcribe(samples, **options)["text"]
+        seconds = time.perf_counter() - t0
+        duration = len(samples) / audio_service.SAMPLE_RATE
+        cases.append({"id": key["id"], "hypothesis": text, "seconds": round(seconds, 3),
+                      "audio_seconds": round(duration, 2), "rtf": round(seconds / duration, 4) if duration else None})
+    return {"backend": backend, "load_seconds": round(load_seconds, 2), "max_rss_kb": max_rss_kb(), "cases": cases}
+
+
+def summarize(keys, run):
+    from jiwer import wer
+    refs = {k["id"]: wer_text(k["reference"]) for k in keys}
+    cases = run["cases"]
+    total_seconds = sum(c["seconds"] for c in cases)
+    total_audio = sum(c["audio_seconds"] for c in cases)
+    for c in cases:
+        c["wer"] = round(wer(refs[c["id"]], wer_text(c["hypothesis"])), 4)
+    rtfs = sorted(c["rtf"] for c in cases if c["rtf"] is not None)
+    return {
+        "backend": run["backend"],
+        "cases": len(cases),
+        # ถ่วงตามความยาวเสียง / จำนวนคำทั้ง corpus (ไม่ใช่ค่าเฉลี่ยรายเคส)
+        "rtf": round(total_seconds / total_audio, 4) if total_audio else None,
+        "rtf_p95": rtfs[min(len(rtfs) - 1, int(len(rtfs) * 0.95))] if rtfs else None,
+        "wer": round(wer([refs[c["id"]] for c in cases], [wer_text(c["hypothesis"]) for c in cases]), 4),
+        "load_seconds": run["load_seconds"],
+        "max_rss_kb": run["max_rss_kb"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ASR backends: real-time factor + WER")
+    parser.add_argument("source", nargs="?", default=config.ANSWER_KEY_FOLDER, help="โฟลเดอร์เฉลย หรือไฟล์เฉลยไฟล์เดียว")
+    parser.add_argument("--backends", nargs="*", default=None, help="ค่าเริ่มต้น: ทุก backend (ตัวที่โหลดไม่ได้จะถูกข้าม)")
+    parser.add_argument("--size", default=config.WHISPER_MODEL_SIZE)
+    parser.add_argument("--torch-threads", type=int, default=config.INFERENCE_TORCH_THREADS)
+    parser.add_argument("--out", default=None, help="เขียนผลเป็น JSON")
+    args = parser.parse_args()
+
+    from services import asr_backend
+    backends = args.backends or list(asr_backend.BACKENDS)
+    keys = [k for k in load_keys(args.source) if k.get("audio") and k.get("reference")]
+    if not keys:
+        print(f"No answer keys with both audio and reference in {args.source}")
+        return 1
+    print(f"Benchmarking {len(backends)} backends on {len(keys)} cases (model {args.size})...")
+
+    summaries, runs = [], []
+    ctx = multiprocessing.get_context("spawn")
+    for backend in backends:
+        with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+            try:
+                run = pool.submit(run_backend, backend, keys, args.size, args.torch_threads).result()
+            except Exception as e:
+                print(f"⚠️ {backend}: {e}")
+                continue
+        runs.append(run)
+        summaries.append(summarize(keys, run))
+
+    print(f"\n{'backend':<16}{'RTF':>8}{'RTF p95':>9}{'WER':>8}{'load s':>8}{'RSS MB':>8}")
+    for s in summaries:
+        rss = f"{s['max_rss_kb'] / 1024:.0f}" if s["max_rss_kb"] else "-"
+        print(f"{s['backend']:<16}{s['rtf']:>8.3f}{s['rtf_p95']:>9.3f}{s['wer'] * 100:>7.2f}%{s['load_seconds']:>8.1f}{rss:>8}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summaries, "runs": runs}, f, indent=2, ensure_ascii=False)
+        print(f"Saved results to {args.out}")
+    return 0 if summaries else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
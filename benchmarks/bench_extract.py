@@ -0,0 +1,90 @@
+"""
+Benchmark การแยก specimen + extract_data บนคำบอกยาวหลาย specimen (10-100 KB)
+ดูว่าเวลาโตแบบ linear (us/KB คงที่) และแยกได้ครบทุก specimen
+
+    python benchmarks/bench_extract.py [--runs 10]
+
+คำบอกสังเคราะห์: เอา transcript ใน benchmarks/fixtures/corpus.json มาต่อกันเป็น "specimen 1 ... specimen N"
+แต่ละ specimen ตามด้วยรายการ section ของตัวเอง
+ตรวจผลของ CHECKS ด้วย (ข้อความที่เคยดึงผิด) exit code 1 ถ้าไม่ตรง
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.parser_service import extract_data, extract_specimens, normalize_text, split_specimens
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "corpus.json")
+
+# (คำบอก, ช่อง, ค่าที่ต้องได้) "a 25 ..." / "an area 12 ..." เคยถูกอ่านเป็นรหัส section A2-5 / A1-2
+CHECKS = [
+    ("Left mastectomy specimen measuring a 25 x 20 x 15 cm.", "specimen", ("25", "20", "15")),
+    ("Breast with an infiltrative mass measuring a 25 x 20 x 15 cm.", "mass_infiltrative", ("25", "20", "15")),
+    ("Breast with an infiltrative tumor in an area 12 x 10 x 8 cm.", "mass_infiltrative", ("12", "10", "8")),
+    ("Breast. The tumor is 0.5 cm from the superior margin and 1.2 cm from the deep margin.",
+     "margins", {"superior margin": "0.5", "deep margin": "1.2"}),
+]
+
+
+def synthetic_dictation(transcripts, size_kb):
+    """ต่อ transcript เป็นคำบอกหลาย specimen จนได้ขนาด size_kb คืนค่า (ข้อความ, จำนวน specimen)"""
+    parts, total, n = [], 0, 0
+    while total < size_kb * 1024:
+        n += 1
+        part = f"Specimen {n}: {transcripts[(n - 1) % len(transcripts)]} "
+        parts.append(part)
+        total += len(part)
+    return "".join(parts), n
+
+
+def best_of(fn, runs):
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(CORPUS) as f:
+        transcripts = [item["transcript"] for item in json.load(f)]
+
+    print(f"{'size KB':>8}{'specimens':>11}{'found':>7}{'split ms':>10}{'extract ms':>12}{'us/KB':>8}{'single-pass ms':>16}")
+    for kb in (10, 25, 50, 100):
+        raw, expected = synthetic_dictation(transcripts, kb)
+        text = normalize_text(raw)
+        # extract_data พิมพ์คำเตือนของ specimen ที่ไม่ใช่ breast ไม่ต้องแสดงตอนวัดเวลา
+        with contextlib.redirect_stdout(io.StringIO()):
+            found = len(extract_specimens(text))
+            split = best_of(lambda: split_specimens(text), args.runs)
+            total = best_of(lambda: extract_specimens(text), args.runs)
+            single = best_of(lambda: extract_data(text), args.runs)  # ทั้งข้อความเป็น specimen เดียว (แบบเดิม)
+        size_kb = len(text) / 1024
+        print(f"{size_kb:>8.0f}{expected:>11}{found:>7}{split * 1000:>10.2f}{total * 1000:>12.2f}"
+              f"{total * 1e6 / size_kb:>8.0f}{single * 1000:>16.2f}")
+
+    failed = 0
+    for text, field, expected in CHECKS:
+        value = extract_data(normalize_text(text))[field]
+        if value != expected:
+            failed += 1
+            print(f"❌ {text!r}: {field} = {value!r}, expected {expected!r}")
+    if failed:
+        return 1
+    print(f"✅ {len(CHECKS)} extraction checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+วัดเวลาเขียน PDF ต่อรายงาน: ก่อน (สแกน Template ใหม่ทุกครั้ง) vs หลัง (ใช้ Layout Index)
+และ bulk (render_bulk / render_bulk_files) หลายร้อยรายงานต่อครั้ง
+
+    python benchmarks/bench_fill_pdf.py [--runs 20] [--bulk 300]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from services import pdf_service
+
+SAMPLE_DATA = {
+    "specimen": ("18", "9", "6"),
+    "skin": ("15", "7"),
+    "mass_infiltrative": ("3.6", "3", "2.8"),
+    "mass_welldefined": None,
+    "margins": {"deep margin": "0.7", "superior margin": "3.5", "inferior margin": "1",
+                "medial margin": "8", "lateral margin": "5", "skin": "0.4"},
+    "checks": ["modified radical mastectomy", "appears normal", "is everted",
+               "infiltrative", "is unremarkable", "in ( upper / lower"],
+    "circles": ["right", "is a", "lower", "outer"],
+    "sections": {"nipple": "A1-1", "mass": "A2-1 to A4-1", "deep": "A5-1", "nearest": "A6-1 (Inferior)"},
+    "ratio": None,
+    "nipple_other": None,
+}
+
+
+def time_runs(template_path, output_path, runs, cold):
+    times = []
+    for _ in range(runs):
+        if cold:
+            pdf_service.clear_layout_cache(disk=True)
+        t0 = time.perf_counter()
+        pdf_service.fill_pdf(template_path, output_path, SAMPLE_DATA)
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return times[len(times) // 2], sum(times) / len(times)
+
+
+def time_bulk(template_path, tmp, count):
+    records = [SAMPLE_DATA] * count
+    results = {}
+    t0 = time.perf_counter()
+    pdf_service.render_bulk(template_path, records, os.path.join(tmp, "bulk.pdf"))
+    results["bulk (one combined PDF)"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    pdf_service.render_bulk_files(template_path, records, [os.path.join(tmp, f"bulk_{i}.pdf") for i in range(count)])
+    results["bulk (one file each)"] = time.perf_counter() - t0
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--bulk", type=int, default=300, help="จำนวนรายงานในโหมด bulk")
+    parser.add_argument("--template", default=os.path.join(config.ASSETS_FOLDER, config.TEMPLATE_PDF))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "bench.pdf")
+        cold_median, cold_mean = time_runs(args.template, output_path, args.runs, cold=True)
+        pdf_service.fill_pdf(args.template, output_path, SAMPLE_DATA)  # warm up
+        warm_median, warm_mean = time_runs(args.template, output_path, args.runs, cold=False)
+        bulk = time_bulk(args.template, tmp, args.bulk)
+
+    print(f"{'mode':<28}{'median ms':>12}{'mean ms':>12}")
+    print(f"{'before (rescan template)':<28}{cold_median * 1000:>12.1f}{cold_mean * 1000:>12.1f}")
+    print(f"{'after (cached layout)':<28}{warm_median * 1000:>12.1f}{warm_mean * 1000:>12.1f}")
+    print(f"speedup: {cold_median / warm_median:.1f}x")
+    print(f"\n{'bulk mode':<28}{'ms/report':>12}{'reports/s':>12}")
+    for name, seconds in bulk.items():
+        print(f"{name:<28}{seconds / args.bulk * 1000:>12.2f}{args.bulk / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
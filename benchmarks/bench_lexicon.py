@@ -0,0 +1,127 @@
+"""
+Benchmark ขั้นแก้คำผิดด้วย Lexicon (services/lexicon_service.py)
+
+    python benchmarks/bench_lexicon.py [--runs 20] [--typo-rate 0.1]
+
+วัด:
+- build: สร้าง index จากไฟล์คำศัพท์ / load: อ่าน index ที่บันทึกไว้ (cache/lexicon)
+- correct (warm): แก้ทั้งข้อความที่คำส่วนใหญ่รู้จักแล้ว (เหมือนใช้งานจริง) เป็น token/ms
+- lookup (cold): ค้นคำผิดที่ไม่เคยเห็น (ต้องค้นใน index จริงทุกคำ) เป็น token/ms
+- normalize_text ทั้งขั้น เทียบเปิด / ปิด Lexicon
+- คำทั่วไปที่ต้องไม่ถูกแก้ (KEEP_WORDS) exit code 1 ถ้ามีคำไหนถูกแก้เป็นคำศัพท์
+ข้อความ: transcript ใน benchmarks/fixtures/corpus.json + ใส่คำผิดแบบสุ่ม (ลบ / สลับ / แทนตัวอักษร)
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from services import lexicon_service
+from services.parser_service import LEXICON_EXTRA_TERMS, normalize_text
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "corpus.json")
+
+# คำที่สะกดถูกแล้วแต่ห่างจากคำศัพท์ไม่กี่ตัวอักษร (เคยถูกแก้ผิดเป็นคำทางขวา)
+KEEP_WORDS = {
+    "black": "block", "color": "colon", "cross": "gross", "among": "along",
+    "hemorrhage": "hemorrhagic", "marked": "marker", "extend": "extends",
+    # รูปผันที่ไม่อยู่ในรายการคำ
+    "stitched": "stitches", "dissecting": "dissection", "adjacently": "adjacent",
+    "hemorrhaging": "hemorrhagic", "biopsied": "biopsies",
+}
+
+
+def typo(word, rng):
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice("aeioulnrst") + word[i + 1:]
+
+
+def best_of(fn, runs):
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def load_lexicon():
+    return lexicon_service.load(config.LEXICON_PATH, LEXICON_EXTRA_TERMS, config.LEXICON_MAX_DISTANCE,
+                                config.LEXICON_MIN_LENGTH, config.LEXICON_COMMON_WORDS_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--typo-rate", type=float, default=0.1, help="สัดส่วนคำ (ยาว >= 6) ที่ใส่คำผิด")
+    parser.add_argument("--copies", type=int, default=50, help="ต่อ corpus ซ้ำกี่รอบเป็นข้อความทดสอบ")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with open(CORPUS) as f:
+        transcripts = [item["transcript"].lower() for item in json.load(f)]
+    text = " ".join(transcripts * args.copies)
+    text = re.sub(r"[a-z]{6,}", lambda m: typo(m.group(), rng) if rng.random() < args.typo_rate else m.group(), text)
+    tokens = len(re.findall(r"[a-z0-9]+", text))
+
+    # build / load
+    shutil.rmtree(config.LEXICON_CACHE_FOLDER, ignore_errors=True)
+    t0 = time.perf_counter()
+    lexicon = load_lexicon()
+    build = time.perf_counter() - t0
+    load = best_of(load_lexicon, 5)
+    print(f"lexicon: {len(lexicon.terms)} terms, {len(lexicon.deletes)} index keys, "
+          f"build {build * 1000:.1f} ms, load {load * 1000:.1f} ms")
+
+    # correct: ครั้งแรกค้นคำผิดทุกคำ ครั้งถัดไปเจอใน memo
+    lexicon.correct(text)
+    warm = best_of(lambda: lexicon.correct(text), args.runs)
+    print(f"correct (warm): {tokens} tokens in {warm * 1000:.2f} ms = {tokens / (warm * 1000):,.0f} tokens/ms")
+
+    # cold: คำผิดที่ไม่ซ้ำกันเลย (ไม่มีใน memo)
+    vocab = [t for t in lexicon.terms if len(t) >= 6]
+    misspelled = list({typo(rng.choice(vocab), rng) for _ in range(5000)} - set(lexicon.terms))
+    known = lexicon_service.read_terms(config.LEXICON_COMMON_WORDS_PATH)
+    fresh = lexicon_service.Lexicon.from_dict(lexicon.to_dict(), known)
+    t0 = time.perf_counter()
+    fixed = sum(1 for w in misspelled if fresh.lookup(w) != w)
+    cold = time.perf_counter() - t0
+    print(f"lookup (cold): {len(misspelled)} unseen misspellings in {cold * 1000:.1f} ms = "
+          f"{len(misspelled) / (cold * 1000):,.1f} tokens/ms ({fixed / len(misspelled):.0%} corrected)")
+
+    # normalize_text ทั้งขั้น
+    sample = " ".join(transcripts)
+    timings, default = {}, config.LEXICON_CORRECTION
+    for enabled in (False, True):
+        config.LEXICON_CORRECTION = enabled
+        normalize_text(sample)
+        timings[enabled] = best_of(lambda: normalize_text(text), args.runs)
+    config.LEXICON_CORRECTION = default
+    print(f"normalize_text: {timings[False] * 1000:.2f} ms without lexicon, {timings[True] * 1000:.2f} ms with "
+          f"({tokens} tokens, +{(timings[True] - timings[False]) * 1e6 / tokens:.2f} us/token)")
+
+
+    # คำทั่วไปต้องผ่านไปตามเดิม
+    wrong = {word: lexicon.lookup(word) for word in KEEP_WORDS if lexicon.lookup(word) != word}
+    for word, fixed in wrong.items():
+        print(f"❌ {word} -> {fixed}")
+    if wrong:
+        return 1
+    print(f"✅ {len(KEEP_WORDS)} common words left unchanged")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark ของ normalize_text บนคำบอกยาวหลาย KB
+เทียบกับเวอร์ชันเดิม (หลายรอบ re.sub / str.replace) เพื่อดูว่าเวลาโตแบบ linear
+
+    python benchmarks/bench_normalize.py [--runs 20]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.parser_service import normalize_text
+
+DICTATION = (
+    "The specimen consists of a modified radical mastectomy measuring eighteen by nine by six centimeters. "
+    "The skin ellipse measures fifteen by seven centimeters. The nipple is averted. "
+    "There is an infutreative firm yellow white mast measuring three point six by three by two point eight centimeters "
+    "in the lower outer quadrant. The mass is zero point seven centimeters from the deep margin, "
+    "three point five centimeters from the superior margin and one centimeter from the inferior margin. "
+    "Sections: A one dash one nipple, A two dash one to A four dash one mass, A five dash one deep receptive margin. "
+)
+
+
+def legacy_normalize_text(text):
+    """normalize_text แบบเดิม (ก่อนรวมกฎเป็น regex เดียว) ไว้เทียบเวลา"""
+    text = text.lower()
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\bpoint\b", ".", text)
+    text = re.sub(r"\bdash\b", "-", text)
+    text = re.sub(r"\bto\b", "-", text)
+    text = text.replace("equal", "=")
+    text = text.replace("mast", "mass")
+    text = text.replace("medium", "medial")
+    text = text.replace("receptive", "resected")
+    text = text.replace("recepted", "resected")
+    text = text.replace("averted", "everted")
+    text = text.replace("infutreative", "infiltrative")
+    NUM_WORDS = { "zero":"0", "one":"1", "two":"2", "three":"3", "four":"4", "five":"5", "six":"6", "seven":"7", "eight":"8", "nine":"9", "ten":"10" }
+    for k, v in NUM_WORDS.items(): text = re.sub(rf"\b{k}\b", v, text)
+    text = text.replace("centimeters", "cm").replace("millimeter", "mm")
+    while " by " in text: text = text.replace(" by ", " x ")
+    text = re.sub(r"(\d+(?:\.\d+)?)\s*(?:x)\s*(\d+(?:\.\d+)?)", r"\1 x \2", text)
+    return text
+
+
+def best_of(fn, text, runs):
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'size KB':>8}{'legacy ms':>12}{'compiled ms':>14}{'speedup':>10}{'us/KB':>10}")
+    for kb in (2, 8, 32, 128):
+        text = (DICTATION * (kb * 1024 // len(DICTATION) + 1))[:kb * 1024]
+        legacy = best_of(legacy_normalize_text, text, args.runs)
+        compiled = best_of(normalize_text, text, args.runs)
+        print(f"{kb:>8}{legacy * 1000:>12.2f}{compiled * 1000:>14.2f}{legacy / compiled:>9.1f}x{compiled * 1e6 / kb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
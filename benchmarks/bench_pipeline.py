@@ -0,0 +1,237 @@
+"""
+วัดเวลาแยกทีละขั้นของ pipeline (decode -> transcribe -> normalize -> extract -> fill -> save)
+รายงาน p50 / p95 / peak memory ต่อขั้น เก็บผลเป็น JSON และเทียบกับ baseline ที่บันทึกไว้
+
+    python benchmarks/bench_pipeline.py --stub-asr                       # CI: ไม่ต้องมีโมเดล/ffmpeg
+    python benchmarks/bench_pipeline.py --stub-asr --save-baseline       # บันทึก baseline
+    python benchmarks/bench_pipeline.py --stub-asr --baseline benchmarks/baseline.json --threshold 0.2
+
+Corpus (benchmarks/fixtures/corpus.json): list ของ {"id", "audio", "transcript"}
+- "audio" = path ของไฟล์เสียง (relative กับไฟล์ corpus) หรือ null
+- --stub-asr: ไม่ถอดเสียงจริง ใช้ "transcript" แทน (ข้ามขั้น decode / transcribe)
+- ถ้าไม่ใช้ stub รายการที่ไม่มีไฟล์เสียงจะถูกข้าม
+
+exit code 1 ถ้ามีขั้นไหนช้ากว่า baseline เกิน threshold
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from services import pdf_service
+from services.parser_service import normalize_text, extract_data
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BENCH_DIR, "fixtures", "corpus.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+STAGES = ["decode", "transcribe", "normalize", "extract", "fill", "save"]
+ASR_OPTIONS = {"language": "en", "fp16": False}
+
+
+def load_corpus(path):
+    with open(path) as f:
+        items = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for item in items:
+        if item.get("audio") and not os.path.isabs(item["audio"]):
+            item["audio"] = os.path.join(base_dir, item["audio"])
+    return items
+
+
+class StubTranscriber:
+    """แทน Whisper ด้วยข้อความใน corpus: วัดเฉพาะ parser / PDF ได้ใน CI"""
+
+    def decode(self, item):
+        return None
+
+    def transcribe(self, item, audio):
+        return item["transcript"]
+
+
+class WhisperTranscriber:
+    """ถอดเสียงจริง (ไม่ผ่าน Transcript Cache เพื่อวัดเวลาโมเดลจริงทุกรอบ)"""
+
+    def __init__(self):
+        from services import ai_service
+        self.ai_service = ai_service
+        self.model = ai_service.load_model()
+        ai_service.warm_up()
+
+    def decode(self, item):
+        with open(item["audio"], "rb") as f:
+            return self.ai_service.load_audio(f.read(), item["audio"])
+
+    def transcribe(self, item, audio):
+        options = dict(ASR_OPTIONS, initial_prompt=self.ai_service.MEDICAL_PROMPT)
+        return self.model.transcribe(audio, **options)["text"]
+
+
+def run_item(item, transcriber, template_path, output_path, measure):
+    """รัน pipeline 1 รายการ measure(stage, fn) เป็นตัวจับเวลา/หน่วยความจำ"""
+    audio = measure("decode", lambda: transcriber.decode(item))
+    raw_text = measure("transcribe", lambda: transcriber.transcribe(item, audio))
+    cleaned = measure("normalize", lambda: normalize_text(raw_text))
+    data = measure("extract", lambda: extract_data(cleaned))
+
+    def fill():
+        layout = pdf_service.get_layout(template_path)
+        doc = layout.open_copy()
+        pdf_service.fill_page(doc[0], layout, data)
+        return doc
+
+    doc = measure("fill", fill)
+    measure("save", lambda: doc.save(output_path))
+    doc.close()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def benchmark(items, transcriber, template_path, runs, warmup=1):
+    timings = {stage: [] for stage in STAGES}
+    peaks = {stage: 0 for stage in STAGES}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "bench.pdf")
+
+        def timed(stage, fn):
+            t0 = time.perf_counter()
+            result = fn()
+            timings[stage].append(time.perf_counter() - t0)
+            return result
+
+        def traced(stage, fn):
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            result = fn()
+            peaks[stage] = max(peaks[stage], tracemalloc.get_traced_memory()[1] - start)
+            return result
+
+        for item in items[:warmup]:
+            run_item(item, transcriber, template_path, output_path, lambda stage, fn: fn())
+
+        for _ in range(runs):
+            for item in items:
+                run_item(item, transcriber, template_path, output_path, timed)
+
+        # peak memory วัดแยกอีกรอบ (tracemalloc ทำให้เวลาเพี้ยน)
+        tracemalloc.start()
+        try:
+            for item in items:
+                run_item(item, transcriber, template_path, output_path, traced)
+        finally:
+            tracemalloc.stop()
+
+    stages = {}
+    for stage in STAGES:
+        values = sorted(timings[stage])
+        stages[stage] = {
+            "n": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "peak_kb": round(peaks[stage] / 1024, 1),
+        }
+    return stages
+
+
+def max_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def compare(results, baseline, threshold, metric, min_delta_ms):
+    """คืนค่า list ของขั้นที่ช้ากว่า baseline เกิน threshold (ไม่นับความต่างที่เล็กกว่า min_delta_ms)"""
+    regressions = []
+    for stage, current in results["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base or not base.get(metric):
+            continue
+        delta = current[metric] - base[metric]
+        if delta > min_delta_ms and current[metric] > base[metric] * (1 + threshold):
+            regressions.append((stage, base[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage pipeline benchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--template", default=os.path.join(config.ASSETS_FOLDER, config.TEMPLATE_PDF))
+    parser.add_argument("--runs", type=int, default=5, help="จำนวนรอบต่อรายการ")
+    parser.add_argument("--stub-asr", action="store_true", help="ใช้ transcript ใน corpus แทน Whisper")
+    parser.add_argument("--out", default=None, help="เขียนผลเป็น JSON")
+    parser.add_argument("--baseline", default=None, help="ไฟล์ baseline สำหรับเทียบ")
+    parser.add_argument("--save-baseline", action="store_true", help=f"บันทึกผลเป็น baseline ({DEFAULT_BASELINE})")
+    parser.add_argument("--threshold", type=float, default=0.20, help="ช้าลงเกินกี่เท่า (0.20 = 20%%) ถึงนับว่า regress")
+    parser.add_argument("--metric", choices=["p50_ms", "p95_ms"], default="p50_ms")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="ไม่นับความต่างที่เล็กกว่านี้ (noise)")
+    args = parser.parse_args()
+
+    items = load_corpus(args.corpus)
+    if args.stub_asr:
+        transcriber = StubTranscriber()
+    else:
+        items = [item for item in items if item.get("audio") and os.path.exists(item["audio"])]
+        if not items:
+            print("No audio files in corpus (use --stub-asr to benchmark parser/PDF only)")
+            return 1
+        transcriber = WhisperTranscriber()
+
+    print(f"Benchmarking {len(items)} items x {args.runs} runs ({'stub' if args.stub_asr else 'whisper'} ASR)...")
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "asr": "stub" if args.stub_asr else f"whisper-{config.WHISPER_MODEL_SIZE}",
+            "items": len(items),
+            "runs": args.runs,
+        },
+        "stages": benchmark(items, transcriber, args.template, args.runs),
+    }
+    results["meta"]["max_rss_kb"] = max_rss_kb()
+
+    print(f"{'stage':<12}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'peak KB':>10}")
+    for stage, s in results["stages"].items():
+        print(f"{stage:<12}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['mean_ms']:>10.2f}{s['peak_kb']:>10.1f}")
+    print(f"max RSS: {results['meta']['max_rss_kb']} KB")
+
+    for path in filter(None, [args.out, DEFAULT_BASELINE if args.save_baseline else None]):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("asr") != results["meta"]["asr"]:
+            print(f"Warning: baseline ASR ({baseline['meta'].get('asr')}) differs from this run")
+        regressions = compare(results, baseline, args.threshold, args.metric, args.min_delta_ms)
+        for stage, before, after in regressions:
+            print(f"❌ {stage}: {args.metric} {before:.2f} -> {after:.2f} (+{(after / before - 1) * 100:.0f}%)")
+        if regressions:
+            return 1
+        print(f"✅ No stage slower than baseline by more than {args.threshold * 100:.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""
+Load test: ส่งไฟล์เสียงเข้าหน้าเว็บซ้ำๆ แบบขนาน เหมือนผู้ใช้หลายคนอัปโหลดพร้อมกัน ใช้ประเมินขนาดเครื่อง
+
+    python benchmarks/loadtest.py recordings/ --url http://127.0.0.1:7860 -n 200 -c 8
+    python benchmarks/loadtest.py recordings/ --rate 2 --duration 120      # ส่งคงที่ 2 ไฟล์/วินาที
+    python benchmarks/loadtest.py --stub --stub-latency-ms 300 -n 100 -c 8 # ไม่มีโมเดล/ไม่มี network
+
+1 session = เส้นทางเดียวกับผู้ใช้ในหน้าเว็บ:
+  POST /  (upload) -> poll /jobs/<id> จนเสร็จ -> GET /?job=<id> (result) -> GET /download/<ไฟล์> (download)
+รายงานต่อ route: จำนวน, throughput, p50 / p99, error rate (+ เวลาตั้งแต่อัปโหลดจนรายงานเสร็จ = report)
+
+- -c / --concurrency: จำนวน session ที่ทำพร้อมกันได้สูงสุด
+- --rate: session ใหม่ต่อวินาที (open loop) เวลานับจากเวลาที่ควรเริ่ม ถ้า server รับไม่ทัน latency จะโตให้เห็น
+  ไม่ระบุ = closed loop (เริ่ม session ใหม่ทันทีที่มีช่องว่าง)
+- ไฟล์เสียง: โฟลเดอร์ หรือ manifest (.txt) แบบเดียวกับ batch.py ไม่ระบุ = สร้าง WAV สังเคราะห์ (--stub)
+- --stub: เปิด server เองด้วย ASR_BACKEND=stub (แทน Whisper ด้วยความหน่วงคงที่) วัดเฉพาะชั้นเว็บ / parser / PDF
+  --serve: เปิด server เองด้วยโมเดลจริง (ทั้งสองแบบปิด Transcript Cache ไม่ให้ไฟล์ซ้ำได้ผลจาก cache)
+  ถ้ายิงใส่ server ที่เปิดไว้แล้ว ควรรันด้วย TRANSCRIPT_CACHE=0 เช่นกัน
+"""
+import argparse
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import collect_inputs
+from benchmarks.bench_pipeline import percentile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ["upload", "poll", "result", "download", "report"]
+
+_JOB_RE = re.compile(r'/jobs/([0-9a-f]+)')
+_DOWNLOAD_RE = re.compile(r'href="(/download/[^"]+)"')
+
+
+# ==========================================
+# Audio corpus
+# ==========================================
+def synthetic_wav(seconds, seed, sr=16000):
+    """WAV 16 kHz mono: เสียงสุ่มเป็นช่วงๆ สลับช่วงเงียบ (ไฟล์ต่างกันได้ข้อความต่างกันใน stub mode)"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    envelope = np.repeat(rng.random(n // sr + 1) > 0.3, sr)[:n]
+    samples = (rng.standard_normal(n) * 0.1 * envelope * 32767).astype(np.int16)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+
+def load_audio_files(source, synthetic, seconds):
+    if source:
+        files = []
+        for path in collect_inputs(source):
+            with open(path, "rb") as f:
+                files.append((os.path.basename(path), f.read()))
+        return files
+    return [(f"synthetic-{i}.wav", synthetic_wav(seconds, i)) for i in range(synthetic)]
+
+
+# ==========================================
+# HTTP
+# ==========================================
+def _multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _request(url, data=None, headers=None, timeout=60):
+    """คืนค่า (status, body) ไม่ raise เมื่อได้ 4xx / 5xx (status 0 = ต่อไม่ได้ / timeout)"""
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, OSError) as e:
+        return 0, str(e).encode()
+
+
+class Recorder:
+    """เก็บ latency / status ของทุก request (thread-safe)"""
+
+    def __init__(self):
+        self.samples = {route: [] for route in ROUTES}
+        self.errors = {route: {} for route in ROUTES}
+        self._lock = threading.Lock()
+
+    def add(self, route, seconds, status):
+        with self._lock:
+            self.samples[route].append(seconds)
+            if not 200 <= status < 400:
+                self.errors[route][status] = self.errors[route].get(status, 0) + 1
+
+    def timed(self, route, fn):
+        t0 = time.perf_counter()
+        status, body = fn()
+        self.add(route, time.perf_counter() - t0, status)
+        return status, body
+
+
+def session(url, filename, audio, profile, recorder, args, scheduled):
+    """อัปโหลด 1 ไฟล์แล้วทำตามหน้าเว็บจนดาวน์โหลดรายงาน คืนค่า True ถ้าสำเร็จ"""
+    body, content_type = _multipart({"profile": profile} if profile else {}, {"audio_file": (filename, audio)})
+    status, page = recorder.timed("upload", lambda: _request(
+        url + "/", body, {"Content-Type": content_type}, args.timeout))
+    match = _JOB_RE.search(page.decode(errors="ignore")) if status == 200 else None
+    if not match:
+        recorder.add("report", time.perf_counter() - scheduled, status or 0)
+        return False
+    job_id = match.group(1)
+
+    deadline = time.perf_counter() + args.timeout
+    job_status = None
+    while time.perf_counter() < deadline:
+        status, job = recorder.timed("poll", lambda: _request(f"{url}/jobs/{job_id}", timeout=args.timeout))
+        if status == 200:
+            job_status = json.loads(job)["status"]
+            if job_status in ("done", "failed"):
+                break
+        time.sleep(args.poll)
+    # report = เวลาที่ผู้ใช้รอ ตั้งแต่ (ควร) เริ่มอัปโหลดจนงานเสร็จ
+    recorder.add("report", time.perf_counter() - scheduled, 200 if job_status == "done" else 500)
+    if job_status != "done":
+        return False
+
+    status, page = recorder.timed("result", lambda: _request(f"{url}/?job={job_id}", timeout=args.timeout))
+    links = _DOWNLOAD_RE.findall(page.decode(errors="ignore")) if status == 200 else []
+    if not links:
+        return False
+    ok = True
+    for _ in range(args.downloads):
+        status, _ = recorder.timed("download", lambda: _request(url + links[0].replace("&amp;", "&"),
+                                                               timeout=args.timeout))
+        ok = ok and status == 200
+    return ok
+
+
+# ==========================================
+# Local server (--stub / --serve)
+# ==========================================
+def start_server(port, stub, latency_ms, workers, report_db):
+    # รายงานจาก load test เก็บแยก ไม่ปนกับ Report Store จริง
+    env = dict(os.environ, PORT=str(port), TRANSCRIPT_CACHE="0", REPORT_DB=report_db)
+    if stub:
+        env.update(ASR_BACKEND="stub", STUB_ASR_LATENCY_MS=str(latency_ms))
+    if workers:
+        env["WEB_WORKERS"] = str(workers)
+    try:
+        import gunicorn  # noqa: F401  (Production ใช้ gunicorn: วัดแบบเดียวกัน)
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"]
+    except ImportError:
+        print("gunicorn not installed, using the Flask dev server (1 process)")
+        cmd = [sys.executable, "app.py"]
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return proc, log
+
+
+def wait_ready(url, proc, log, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            log.seek(0)
+            raise RuntimeError(f"Server exited:\n{log.read().decode(errors='ignore')[-2000:]}")
+        status, _ = _request(url + "/readyz", timeout=5)
+        if status == 200:
+            return
+        time.sleep(0.5)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+# ==========================================
+# Report
+# ==========================================
+def summarize(recorder, elapsed):
+    routes = {}
+    for route in ROUTES:
+        values = sorted(recorder.samples[route])
+        if not values:
+            continue
+        errors = sum(recorder.errors[route].values())
+        routes[route] = {
+            "n": len(values),
+            "per_sec": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+            "error_rate": round(errors / len(values), 4),
+            "errors": {str(k): v for k, v in sorted(recorder.errors[route].items())},
+        }
+    return routes
+
+
+def print_summary(routes):
+    print(f"{'route':<10}{'n':>7}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>9}  by status")
+    for route, r in routes.items():
+        print(f"{route:<10}{r['n']:>7}{r['per_sec']:>9.2f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+              f"{r['max_ms']:>10.1f}{r['error_rate']:>8.1%}  {r['errors'] or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay dictations against the web app")
+    parser.add_argument("source", nargs="?", help="โฟลเดอร์ไฟล์เสียง หรือ manifest (.txt) ไม่ระบุ = WAV สังเคราะห์")
+    parser.add_argument("--url", default=None, help="ค่าเริ่มต้น http://127.0.0.1:<port>")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("-n", "--requests", type=int, default=100, help="จำนวน session ทั้งหมด")
+    parser.add_argument("--duration", type=float, default=None, help="หยุดส่ง session ใหม่หลังกี่วินาที")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=None, help="session ใหม่ต่อวินาที (ไม่ระบุ = closed loop)")
+    parser.add_argument("--profile", default=None, help="Decode Profile ที่ส่งไปกับไฟล์ (fast / balanced / accurate)")
+    parser.add_argument("--downloads", type=int, default=1, help="ดาวน์โหลดรายงานกี่ครั้งต่อ session")
+    parser.add_argument("--poll", type=float, default=0.2, help="poll สถานะงานทุกกี่วินาที")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--synthetic", type=int, default=8, help="จำนวน WAV สังเคราะห์ (เมื่อไม่ระบุ source)")
+    parser.add_argument("--synthetic-seconds", type=float, default=20)
+    parser.add_argument("--stub", action="store_true", help="เปิด server เองด้วย ASR_BACKEND=stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=300)
+    parser.add_argument("--serve", action="store_true", help="เปิด server เองด้วยโมเดลจริง")
+    parser.add_argument("--web-workers", type=int, default=None, help="(--stub / --serve) จำนวน web worker")
+    parser.add_argument("--out", default=None, help="เขียนผลเป็น JSON")
+    args = parser.parse_args()
+
+    url = (args.url or f"http://127.0.0.1:{args.port}").rstrip("/")
+    files = load_audio_files(args.source, args.synthetic, args.synthetic_seconds)
+    if not files:
+        print("No audio files found")
+        return 1
+
+    server = None
+    if args.stub or args.serve:
+        print(f"Starting server on port {args.port} ({'stub ASR' if args.stub else 'Whisper'})...")
+        report_db = os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "reports.sqlite3")
+        server, log = start_server(args.port, args.stub, args.stub_latency_ms, args.web_workers, report_db)
+        try:
+            wait_ready(url, server, log, args.timeout)
+        except RuntimeError:
+            server.terminate()
+            raise
+
+    recorder = Recorder()
+    counts = {"ok": 0, "failed": 0}
+    counts_lock = threading.Lock()
+
+    def run(i, scheduled):
+        filename, audio = files[i % len(files)]
+        try:
+            ok = session(url, filename, audio, args.profile, recorder, args, scheduled)
+        except Exception as e:
+            print(f"session {i} crashed: {e}")
+            ok = False
+        with counts_lock:
+            counts["ok" if ok else "failed"] += 1
+
+    print(f"{args.requests} sessions, concurrency {args.concurrency}, "
+          f"{f'{args.rate}/s' if args.rate else 'closed loop'}, {len(files)} audio files -> {url}")
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            if args.rate:
+                # open loop: กำหนดเวลาเริ่มไว้ล่วงหน้า session ที่ต้องรอช่องว่างจะนับเวลารอด้วย
+                for i in range(args.requests):
+                    scheduled = started + i / args.rate
+                    if args.duration and scheduled - started > args.duration:
+                        break
+                    time.sleep(max(0.0, scheduled - time.perf_counter()))
+                    pool.submit(run, i, scheduled)
+            else:
+                # closed loop: ทุก thread ทำ session ต่อกันไปเรื่อยๆ
+                next_index = iter(range(args.requests))
+                index_lock = threading.Lock()
+
+                def loop():
+                    while not args.duration or time.perf_counter() - started < args.duration:
+                        with index_lock:
+                            i = next(next_index, None)
+                        if i is None:
+                            return
+                        run(i, time.perf_counter())
+
+                for _ in range(args.concurrency):
+                    pool.submit(loop)
+    except KeyboardInterrupt:
+        print("Interrupted, reporting what finished so far")
+    finally:
+        elapsed = time.perf_counter() - started
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    routes = summarize(recorder, elapsed)
+    print(f"\n{counts['ok']} ok, {counts['failed']} failed in {elapsed:.1f}s "
+          f"({counts['ok'] / elapsed:.2f} reports/s)")
+    print_summary(routes)
+
+    if args.out:
+        results = {
+            "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "url": url, "sessions": args.requests,
+                     "concurrency": args.concurrency, "rate": args.rate, "stub": args.stub,
+                     "stub_latency_ms": args.stub_latency_ms if args.stub else None,
+                     "audio_files": len(files), "elapsed_s": round(elapsed, 2)},
+            "sessions": counts,
+            "routes": routes,
+        }
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved: {args.out}")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import secrets
 
 # หา Path ปัจจุบัน
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -7,12 +8,123 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 RESULT_FOLDER = os.path.join(BASE_DIR, 'results')
 ASSETS_FOLDER = os.path.join(BASE_DIR, 'assets')
+CACHE_FOLDER = os.path.join(BASE_DIR, 'cache')
+LAYOUT_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'layouts')  # Layout Index ของ Template (ต่อ hash ไฟล์)
+OUTPUT_FOLDER = os.path.join(BASE_DIR, 'outputs')
+ANSWER_KEY_FOLDER = os.path.join(BASE_DIR, 'answer_keys')  # เฉลย (ground truth) สำหรับ evaluate.py
+METRICS_FOLDER = os.path.join(CACHE_FOLDER, 'metrics')  # ค่า /metrics ของแต่ละ worker process
 
 # *** เช็คชื่อไฟล์นี้ให้ตรงกับในโฟลเดอร์ assets ของคุณ ***
 TEMPLATE_PDF = 'RCC_Wilms_Tumor_Template.pdf' 
 
 # ตั้งค่า Model
 WHISPER_MODEL_SIZE = "small"
+# ตัวรันโมเดลบน CPU: "whisper" (fp32), "whisper-int8" (quantize ตอนโหลด), "faster-whisper" (CTranslate2 int8)
+ASR_BACKEND = os.environ.get("ASR_BACKEND", "whisper")
+# ASR_BACKEND=stub: ไม่รันโมเดลจริง รอคงที่แล้วคืนข้อความจาก corpus (benchmarks/loadtest.py --stub)
+STUB_ASR_LATENCY_MS = float(os.environ.get("STUB_ASR_LATENCY_MS", 300))
+STUB_ASR_CORPUS = os.environ.get("STUB_ASR_CORPUS", os.path.join(BASE_DIR, 'benchmarks', 'fixtures', 'corpus.json'))
+
+# Decode Profiles: ชุดค่าการถอดเสียง เลือกได้ต่องาน (ฟอร์ม / Job API: profile=fast|balanced|accurate)
+# - model: ขนาดโมเดล (None = WHISPER_MODEL_SIZE)
+# - beam_size: None = greedy (เร็วที่สุด)
+# - temperature: ค่าเดียว = ไม่มี fallback / หลายค่า = ถอดซ้ำด้วยค่าถัดไปเมื่อผลดูผิดปกติ (ช้าลงเฉพาะไฟล์ที่มีปัญหา)
+# - condition_on_previous_text: ใช้ข้อความท่อนก่อนเป็นบริบท (แม่นขึ้น แต่เสี่ยงวนซ้ำ)
+# - prompt: ใส่ MEDICAL_PROMPT
+# ทุก profile ระบุภาษา "en" (ไม่ต้องให้ Whisper ตรวจภาษาทุกไฟล์)
+DECODE_PROFILES = {
+    "fast":     {"model": None, "beam_size": None, "temperature": 0.0,
+                 "condition_on_previous_text": False, "prompt": True},
+    "balanced": {"model": None, "beam_size": 5, "temperature": (0.0, 0.2, 0.4),
+                 "condition_on_previous_text": True, "prompt": True},
+    "accurate": {"model": "medium", "beam_size": 5, "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+                 "condition_on_previous_text": True, "prompt": True},
+}
+DEFAULT_DECODE_PROFILE = "fast"  # งานปกติ ส่วนเคสที่ต้องตรวจละเอียดค่อยเลือก accurate
+
+# Long-audio mode: ไฟล์ยาวเกิน LONG_AUDIO_SECONDS จะตัดตามช่วงเงียบแล้วถอดพร้อมกันหลาย process
+LONG_AUDIO_WORKERS = int(os.environ.get("LONG_AUDIO_WORKERS", os.cpu_count() or 1))  # 1 = ปิด
+LONG_AUDIO_SECONDS = 90
+
+# ตัดช่วงเงียบหัว-ท้ายไฟล์ก่อนถอดเสียง (Whisper ไม่ต้องประมวลผลช่วงที่ไม่มีคนพูด)
+TRIM_SILENCE = True
+
+# Transcript Cache: ส่งไฟล์เสียงเดิมซ้ำ (เช่นตอนปรับ Template) ไม่ต้องรัน Whisper ใหม่
+TRANSCRIPT_CACHE_ENABLED = os.environ.get("TRANSCRIPT_CACHE", "1") != "0"  # 0 = ปิด (เช่นตอน load test ส่งไฟล์เดิมซ้ำ)
+TRANSCRIPT_CACHE_DB = os.path.join(CACHE_FOLDER, 'transcripts.sqlite3')
+TRANSCRIPT_CACHE_MAX_MB = 200
+TRANSCRIPT_CACHE_MAX_AGE_DAYS = 30
+
+# Lexicon: แก้คำที่ถอดผิด (ไม่อยู่ในรายการคำศัพท์) เป็นคำที่ใกล้ที่สุด ก่อนดึงข้อมูล (normalize_text)
+# ปิดไว้ก่อน: เปิด (LEXICON_CORRECTION=1) เมื่อวัดด้วย evaluate.py แล้วว่าความแม่นของช่องข้อมูลดีขึ้นกับเสียงจริง
+LEXICON_CORRECTION = os.environ.get("LEXICON_CORRECTION", "0") == "1"
+LEXICON_PATH = os.path.join(ASSETS_FOLDER, 'pathology_lexicon.txt')
+LEXICON_COMMON_WORDS_PATH = os.path.join(ASSETS_FOLDER, 'english_words.txt')  # คำทั่วไปที่สะกดถูกแล้ว ไม่แก้
+LEXICON_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'lexicon')  # index ที่สร้างแล้ว (ต่อ hash ของรายการคำ)
+LEXICON_MAX_DISTANCE = 2  # ตัวอักษรที่ต่างได้มากสุด (คำยาว 9 ตัวขึ้นไป / คำสั้นกว่านั้นได้ 1)
+LEXICON_MIN_LENGTH = 5    # คำที่สั้นกว่านี้ไม่แก้ (คำสั้นเดาผิดง่าย)
+
+# ตั้งค่า Web Server (gunicorn.conf.py)
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 4))
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", 0))  # thread ของ torch ต่อ worker (0 = แบ่ง CPU เท่าๆ กัน)
+
+# Inference Worker: process แยกที่ถือโมเดล Whisper รวมเสียงจากหลาย request เป็น batch เดียว
+# ปิด (INFERENCE_WORKER=0) = ถอดเสียงในตัว web process เหมือนเดิม
+INFERENCE_WORKER = os.environ.get("INFERENCE_WORKER", "1") != "0"
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", 1))
+INFERENCE_TORCH_THREADS = int(os.environ.get("INFERENCE_TORCH_THREADS", 0))  # ต่อ worker (0 = แบ่ง CPU เท่าๆ กัน)
+INFERENCE_MAX_BATCH = 8         # จำนวนท่อนเสียง (<= 30 วินาที) สูงสุดต่อ batch
+INFERENCE_MAX_WAIT_MS = 100     # รอท่อนอื่นมารวม batch ได้นานสุดกี่ ms
+INFERENCE_CONNECT_TIMEOUT = 300  # รอ worker โหลดโมเดลเสร็จได้นานสุดกี่วินาที
+INFERENCE_SOCKET = os.path.join(CACHE_FOLDER, 'inference.sock')  # + .0, .1, ... ต่อ worker
+# INFERENCE_EXTERNAL=1: web process ไม่เปิด worker เอง (รัน python -m services.inference_service แยกไว้)
+# ต้องตั้ง INFERENCE_AUTHKEY ค่าเดียวกันทั้งสองฝั่ง
+INFERENCE_EXTERNAL = os.environ.get("INFERENCE_EXTERNAL", "0") == "1"
+INFERENCE_AUTHKEY_SET = bool(os.environ.get("INFERENCE_AUTHKEY"))
+# กุญแจของ socket: ไม่ได้ตั้ง = สุ่มใหม่ทุกครั้งที่เปิด server (process ลูกได้ค่าเดียวกันผ่าน environment)
+INFERENCE_AUTHKEY = os.environ.setdefault("INFERENCE_AUTHKEY", secrets.token_hex(16)).encode()
+
+# ตั้งค่าคิวงาน (Job API)
+# มี Inference Worker: หลายงานส่งเสียงเข้า batch พร้อมกันได้ / ไม่มี: โมเดลตัวเดียวกันไม่ thread-safe ต้องทีละงาน
+JOB_WORKERS = 4 if INFERENCE_WORKER else 1
+JOB_QUEUE_SIZE = 8      # งานที่รอได้สูงสุด เกินนี้ตอบ 429
+JOB_RESULT_TTL = 3600   # เก็บผลงานที่เสร็จแล้วไว้กี่วินาที
+JOB_FOLDER = os.path.join(BASE_DIR, 'jobs')  # สถานะงาน ใช้ร่วมกันทุก web worker
+
+# Profiling ต่องาน: ส่ง header X-Profile: 1 ตอนอัปโหลด หรือ PROFILE_JOBS=1 = ทุกงาน (ปิดไว้ปกติ)
+# flamegraph / ตาราง top-N เก็บข้างไฟล์งานใน jobs/ ดูได้ที่ /jobs/<id>/profile
+PROFILE_JOBS = os.environ.get("PROFILE_JOBS", "0") == "1"
+PROFILE_HEADER = "X-Profile"
+PROFILE_INTERVAL_MS = 5   # เก็บ stack ทุกกี่ ms
+PROFILE_TOP_N = 25
+
+# Live Dictation (/live WebSocket): พูดผ่านไมโครโฟนใน browser ถอดเสียงระหว่างพูด ต้องลง flask-sock
+# ส่งเสียงเป็น PCM 16-bit 16 kHz mono ทีละ frame -> ถอดช่วงที่ยังไม่จบประโยคใหม่ทุก LIVE_STEP_SECONDS
+# เจอช่วงเงียบ (จบประโยค) = commit ข้อความช่วงนั้น ไม่ต้องถอดซ้ำอีก กด stop แล้วเหลือถอดแค่ท่อนสุดท้าย
+# gunicorn: 1 session ใช้ 1 thread ตลอดที่พูด (threads ใน gunicorn.conf.py)
+LIVE_DICTATION = os.environ.get("LIVE_DICTATION", "1") != "0"
+LIVE_DECODE_PROFILE = "fast"
+LIVE_STEP_SECONDS = 1.5       # เสียงใหม่ครบเท่านี้ถึงถอดช่วงที่ยังไม่ commit อีกรอบ
+LIVE_MIN_SILENCE_MS = 500     # เงียบนานเท่านี้ = จบประโยค commit ได้
+LIVE_WINDOW_SECONDS = 25      # ช่วงที่ยังไม่ commit ยาวสุด (หน้าต่าง Whisper 30 วินาที) เกินนี้ตัดที่ช่วงเงียบ
+LIVE_MAX_SECONDS = 900        # session ยาวสุด (เสียงทั้งหมด)
+LIVE_PROMPT_CHARS = 200       # ต่อท้ายข้อความที่ commit แล้วเข้า prompt ให้ท่อนถัดไปต่อเนื่อง
+
+# Output Store: PDF ที่สร้างแล้ว (outputs/) ตั้งชื่อตาม hash ของเนื้อหา
+OUTPUT_MAX_MB = 500                 # ขนาดรวมสูงสุด เกินนี้ลบไฟล์ที่ไม่ได้เปิดนานที่สุดก่อน
+OUTPUT_MAX_AGE_DAYS = 7             # ลบรายงานที่เก่ากว่านี้
+OUTPUT_MEMORY_MB = 32               # เก็บรายงานล่าสุดไว้ใน RAM ต่อ worker (ดาวน์โหลดไม่ต้องอ่านดิสก์)
+OUTPUT_BROWSER_CACHE_SECONDS = 3600  # ให้ browser เก็บไว้เปิดซ้ำ (เนื้อหาไม่เปลี่ยนตามชื่อไฟล์)
+
+# Report Store: ทุกรายงาน (ข้อความ + ข้อมูลที่ดึงได้ + เวลาแต่ละขั้น) เก็บใน SQLite ค้นผ่าน /reports
+# ไม่อยู่ใน cache/ เพราะเป็นข้อมูลถาวร ลบทิ้งแล้วสร้างใหม่ไม่ได้
+REPORT_DB = os.environ.get("REPORT_DB", os.path.join(BASE_DIR, 'reports.sqlite3'))
+
+# Preview: รูป PNG ของหน้ารายงาน (/preview/<ไฟล์>) ไว้ตรวจเร็วๆ บนเครื่องที่ช้า
+PREVIEW_FOLDER = os.path.join(CACHE_FOLDER, 'previews')
+PREVIEW_DPI = 60          # ค่าเริ่มต้น (A4 ~500 x 700 px)
+PREVIEW_MAX_DPI = 150     # ขอ ?dpi= ได้ไม่เกินนี้
+PREVIEW_CACHE_MB = 100    # ขนาดรวมของรูปที่ cache ไว้ เกินนี้ลบรูปที่ไม่ได้เปิดนานที่สุดก่อน
 
 # ตั้งค่า Path
 os.environ["PATH"] += os.pathsep + BASE_DIR
\ No newline at end of file
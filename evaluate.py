@@ -1,11 +1,218 @@
-from jiwer import wer
+"""
+วัดความแม่นยำทั้ง corpus: WER ของการถอดเสียง + ความถูกต้องรายช่องของ extract_data เทียบกับเฉลย
 
-# Ground Truth (สิ่งที่มนุษย์ถอดความไว้ถูกต้อง)
-reference = "the specimen consists of a mastectomy with a mass measuring five centimeters"
+    python evaluate.py                              # ใช้เฉลยใน answer_keys/
+    python evaluate.py my_corpus/ --workers 8 --out eval_report.json
+    python evaluate.py my_corpus/ --ids case-01 case-07
+    python evaluate.py my_corpus/ --profile accurate   # Decode Profile เดียวกับที่หน้าเว็บใช้ (ค่าเริ่มต้น = DEFAULT_DECODE_PROFILE)
 
-# Hypothesis (สิ่งที่ AI Whisper ถอดความได้)
-hypothesis = "the specimen consists of a mastectomy with a mass measuring 5 cm"
+เฉลย 1 ไฟล์ JSON ต่อ 1 เคส:
+    {"id": ..., "audio": "case-01.m4a", "reference": "ข้อความที่คนถอดไว้", "fields": {...}}
+- "audio" = path ไฟล์เสียง (relative กับไฟล์เฉลย) ถ้าไม่มีเสียง ใส่ "hypothesis" (ข้อความที่ถอดไว้แล้ว) แทนได้
+- "reference" ใช้คิด WER (ไม่ใส่ก็ได้)
+- "fields" รูปแบบเดียวกับผลของ extract_data (ใส่เฉพาะช่องที่ต้องการตรวจ)
+เคสที่ไม่มีทั้ง "audio" และ "hypothesis" ถูกข้าม (เช่น master_v13 ที่มีแต่เฉลยรายช่อง)
+ไม่เหลือเคสให้ประเมินเลย = ใช้งานผิด (exit 2)
 
-# คำนวณค่า WER
-error_rate = wer(reference, hypothesis)
-print(f"Word Error Rate (WER): {error_rate * 100:.2f}%")
\ No newline at end of file
+ถอดเสียงผ่าน Transcript Cache: แก้แค่ parser แล้วรันใหม่ ไม่ต้องรัน Whisper ซ้ำ
+(ใช้ options ของ Decode Profile เหมือน pipeline ของเว็บ -> key ตรงกับ transcript ที่งานบนเว็บ cache ไว้)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import config
+
+DIM_FIELDS = ["specimen", "skin", "mass_infiltrative", "mass_welldefined", "ratio", "nipple_other"]
+DICT_FIELDS = ["margins", "sections"]
+SET_FIELDS = ["checks", "circles"]
+
+# ชื่อใน answer key (make_answer_key.py) ที่ต่างจากผลของ extract_data
+CHECK_ALIASES = {"infiltrative firm": "infiltrative", "well-defined firm": "well-defined"}
+
+
+# ==========================================
+# Answer keys
+# ==========================================
+def load_keys(source, ids=None):
+    paths = [source] if os.path.isfile(source) else [
+        os.path.join(root, f) for root, _, files in os.walk(source) for f in files if f.endswith(".json")]
+    keys = []
+    for path in sorted(paths):
+        with open(path) as f:
+            key = json.load(f)
+        key.setdefault("id", os.path.splitext(os.path.basename(path))[0])
+        if key.get("audio") and not os.path.isabs(key["audio"]):
+            key["audio"] = os.path.join(os.path.dirname(os.path.abspath(path)), key["audio"])
+        if ids and key["id"] not in ids:
+            continue
+        keys.append(key)
+    return keys
+
+
+def canonical(fields):
+    """ทำให้เฉลยกับผล extract_data อยู่ในรูปเดียวกันก่อนเทียบ"""
+    out = {}
+    for name, value in fields.items():
+        if name in DIM_FIELDS:
+            value = list(value) if isinstance(value, (list, tuple)) else value
+        elif name == "margins":
+            value = {k[:-len(" margin")] if k.endswith(" margin") else k: v for k, v in (value or {}).items()}
+        elif name in SET_FIELDS:
+            value = {CHECK_ALIASES.get(v, v) for v in (value or [])}
+        elif name in DICT_FIELDS:
+            value = {k: v for k, v in (value or {}).items() if v is not None}
+        out[name] = value
+    return out
+
+
+def score_fields(expected, actual):
+    """คืนค่า {field: [ถูก, ทั้งหมด]} เฉพาะช่องที่มีในเฉลย"""
+    expected, actual = canonical(expected), canonical(actual)
+    scores = {}
+    for name, want in expected.items():
+        got = actual.get(name)
+        if name in DICT_FIELDS:
+            got = got or {}
+            names = set(want) | set(got)
+            scores[name] = [sum(1 for k in names if want.get(k) == got.get(k)), len(names)]
+        elif name in SET_FIELDS:
+            got = got or set()
+            scores[name] = [len(want & got), len(want | got)]
+        else:
+            scores[name] = [int(want == got), 1]
+    return scores
+
+
+def wer_text(text):
+    return " ".join(re.sub(r"[^\w\s.-]", " ", text.lower()).split())
+
+
+# ==========================================
+# Worker (รันใน process pool)
+# ==========================================
+def _init_worker():
+    # ขนานกันระดับเคสอยู่แล้ว ไม่ต้องแตกไฟล์ยาวเป็นท่อนซ้อนอีกชั้น
+    config.LONG_AUDIO_WORKERS = 1
+    config.INFERENCE_WORKER = False  # แต่ละ process ถือโมเดลของตัวเอง
+
+
+def evaluate_one(key, profile=None):
+    from services.parser_service import normalize_text, extract_data
+    t0 = time.time()
+    try:
+        if key.get("audio"):
+            from services import ai_service  # โหลดโมเดลเฉพาะตอน cache miss
+            options, size = ai_service.profile_options(profile)
+            hypothesis = ai_service.transcribe_audio(key["audio"], options, size)["text"]
+        else:
+            hypothesis = key["hypothesis"]
+        data = extract_data(normalize_text(hypothesis))
+    except Exception as e:
+        return {"id": key["id"], "error": str(e)}
+    scores = score_fields(key.get("fields", {}), data)
+    return {
+        "id": key["id"],
+        "hypothesis": hypothesis,
+        "scores": scores,
+        "mismatches": sorted(f for f, (ok, total) in scores.items() if ok != total),
+        "seconds": round(time.time() - t0, 3),
+    }
+
+
+# ==========================================
+# Report
+# ==========================================
+def summarize(keys, results):
+    summary = {"cases": len(results), "errors": sum(1 for r in results if "error" in r), "fields": {}}
+    totals = {}
+    for r in results:
+        for name, (ok, total) in r.get("scores", {}).items():
+            t = totals.setdefault(name, {"correct": 0, "total": 0, "exact": 0, "cases": 0})
+            t["correct"] += ok; t["total"] += total
+            t["exact"] += int(ok == total); t["cases"] += 1
+    for name, t in totals.items():
+        summary["fields"][name] = {
+            "accuracy": t["correct"] / t["total"] if t["total"] else 1.0,
+            "exact_match": t["exact"] / t["cases"],
+            "cases": t["cases"],
+        }
+    scored = [r for r in results if r.get("scores")]
+    summary["exact_match"] = (sum(1 for r in scored if not r["mismatches"]) / len(scored)) if scored else None
+
+    by_id = {r["id"]: r for r in results}
+    pairs = [(by_id[k["id"]], wer_text(k["reference"]), wer_text(by_id[k["id"]]["hypothesis"]))
+             for k in keys if k.get("reference") and "hypothesis" in by_id[k["id"]]]
+    summary["wer"] = None
+    if pairs:
+        from jiwer import wer
+        for r, ref, hyp in pairs:
+            r["wer"] = round(wer(ref, hyp), 4)
+        # WER รวมทั้ง corpus (ถ่วงตามจำนวนคำ ไม่ใช่ค่าเฉลี่ยรายเคส)
+        summary["wer"] = wer([ref for _, ref, _ in pairs], [hyp for _, _, hyp in pairs])
+    summary["wer_cases"] = len(pairs)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Corpus evaluation: WER + field accuracy")
+    parser.add_argument("source", nargs="?", default=config.ANSWER_KEY_FOLDER, help="โฟลเดอร์เฉลย หรือไฟล์เฉลยไฟล์เดียว")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--ids", nargs="*", help="ประเมินเฉพาะเคสเหล่านี้")
+    parser.add_argument("--out", default=None, help="เขียนรายงานละเอียดเป็น JSON")
+    parser.add_argument("--profile", choices=list(config.DECODE_PROFILES), default=config.DEFAULT_DECODE_PROFILE,
+                        help="Decode Profile ที่ใช้ถอดเสียง (ค่าเริ่มต้นเหมือนหน้าเว็บ)")
+    args = parser.parse_args()
+
+    all_keys = load_keys(args.source, args.ids)
+    keys = [k for k in all_keys if k.get("audio") or k.get("hypothesis")]
+    skipped = [k["id"] for k in all_keys if k not in keys]
+    if skipped:
+        print(f"Skipping {len(skipped)} case(s) without audio or hypothesis: {', '.join(skipped)}")
+    if not keys:
+        parser.error(f"no answer keys with \"audio\" or \"hypothesis\" in {args.source}")
+    print(f"Evaluating {len(keys)} cases with {args.workers} workers (profile: {args.profile})...")
+    evaluate = partial(evaluate_one, profile=args.profile)
+
+    started = time.time()
+    if args.workers > 1 and len(keys) > 1:
+        # spawn: ไม่ fork process ที่ import torch ไปแล้ว
+        with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker) as pool:
+            results = list(pool.map(evaluate, keys, chunksize=max(1, len(keys) // (args.workers * 4))))
+    else:
+        _init_worker()
+        results = [evaluate(k) for k in keys]
+    summary = summarize(keys, results)
+    summary["profile"] = args.profile
+
+    if summary["fields"]:
+        print(f"\n{'field':<20}{'accuracy':>10}{'exact':>10}{'cases':>8}")
+    for name, f in sorted(summary["fields"].items()):
+        print(f"{name:<20}{f['accuracy'] * 100:>9.1f}%{f['exact_match'] * 100:>9.1f}%{f['cases']:>8}")
+    if summary["wer"] is not None:
+        print(f"\nWord Error Rate (WER): {summary['wer'] * 100:.2f}% over {summary['wer_cases']} cases")
+    if summary["exact_match"] is not None:
+        print(f"All fields correct: {summary['exact_match'] * 100:.1f}% of cases")
+    for r in results:
+        if "error" in r:
+            print(f"❌ {r['id']}: {r['error']}")
+        elif r["mismatches"]:
+            print(f"⚠️ {r['id']}: {', '.join(r['mismatches'])}")
+    print(f"Done in {time.time() - started:.1f}s")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "cases": results}, f, indent=2, ensure_ascii=False)
+        print(f"Saved report to {args.out}")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
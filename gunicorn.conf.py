@@ -0,0 +1,50 @@
+# รัน Production: gunicorn -c gunicorn.conf.py app:app
+#
+# preload_app = True -> import app.py (และโหลดโมเดล Whisper) ครั้งเดียวใน master
+# แล้ว fork ออกไปเป็น worker ทุกตัวใช้ weight ชุดเดียวกันแบบ copy-on-write
+# (4 worker ไม่ต้องใช้ RAM 4 เท่า และไม่ต้องรอโหลดโมเดลทุก worker)
+import gc
+import os
+import config
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 7860)}"
+workers = config.WEB_WORKERS
+threads = 4
+preload_app = True
+timeout = 600  # เผื่อเส้นทางเก่าที่ทำงานใน request
+
+
+def on_starting(server):
+    # ล้างค่า /metrics ของรอบก่อน (ไฟล์ของ worker process ที่ไม่มีแล้ว)
+    from services import metrics_service
+    metrics_service.reset()
+    if config.INFERENCE_WORKER:
+        # โมเดลอยู่ใน Inference Worker ตัวเดียว ทุก web worker ส่งเสียงไปถอดที่นั่น
+        from services import inference_service
+        inference_service.start_workers()
+
+
+def on_exit(server):
+    if config.INFERENCE_WORKER:
+        from services import inference_service
+        inference_service.stop_workers()
+
+
+def pre_fork(server, worker):
+    # ย้าย object ที่มีอยู่แล้วออกจาก GC ไม่ให้ GC ไปแตะ (เขียน) หน้าหน่วยความจำที่แชร์ไว้
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if config.INFERENCE_WORKER:
+        return  # web worker ไม่รัน inference เอง
+
+    import torch
+    from services import ai_service
+
+    # แบ่ง CPU ให้แต่ละ worker ไม่ให้ thread ของ torch แย่งกันเอง
+    threads_per_worker = config.TORCH_THREADS or max(1, (os.cpu_count() or 1) // config.WEB_WORKERS)
+    torch.set_num_threads(threads_per_worker)
+
+    # warm-up หลัง fork เท่านั้น (/readyz จะตอบ 503 จนกว่าจะเสร็จ)
+    ai_service.warm_up_async()
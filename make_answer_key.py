@@ -1,5 +1,8 @@
+import json
 import fitz # PyMuPDF
 
+ANSWER_KEY_PATH = "answer_keys/master_v13.json"
+
 def create_master_answer_key():
     template_path = "assets/RCC_Wilms_Tumor_Template.pdf"
     output_path = "ANSWER_KEY_MASTER_V13.pdf"
@@ -90,16 +93,9 @@ def create_master_answer_key():
     # =======================================================
     # 3. DATA & EXECUTION
     # =======================================================
-    answer_data = {
-        "specimen": ["18", "9", "6"],
-        "skin": ["15", "7"],
-        "mass_infiltrative": ["3.6", "3", "2.8"],
-        "mass_welldefined": None,
-        "margins": {"deep": "0.7", "superior": "3.5", "inferior": "1", "medial": "8", "lateral": "5", "skin": "0.4"},
-        "checks": ["modified radical mastectomy", "appears normal", "is everted", "infiltrative firm", "is unremarkable", "in ( upper / lower"],
-        "circles": ["right", "is a", "lower", "outer"], # เพิ่ม "is a" ตรงนี้
-        "sections": {"nipple": "A1-1", "mass": "A2-1 to A4-1", "deep": "A5-1", "nearest": "A6-1 (Inferior)"}
-    }
+    # เฉลยเก็บเป็น JSON (answer_keys/) ใช้ร่วมกับ evaluate.py
+    with open(ANSWER_KEY_PATH) as f:
+        answer_data = json.load(f)["fields"]
 
     mapping_config = {
         "specimen": ("Measuring", "after"),
@@ -1,7 +1,23 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import whisper
 import config
+from services import asr_backend, audio_service, transcript_cache
+from services.profiling_service import span
 
-model = None
+# Model Registry: โหลดโมเดลครั้งเดียวต่อ process (key = ขนาดโมเดล, ตัวรันตาม config.ASR_BACKEND)
+# ถ้ารันผ่าน gunicorn (preload_app) จะโหลดใน master ครั้งเดียว แล้ว fork ให้ทุก worker ใช้ร่วมกันแบบ copy-on-write
+_models = {}
+_warm = set()
+_lock = threading.Lock()
+# โมเดลใน process นี้ไม่ thread-safe (Whisper ติด kv-cache hook ไว้กับตัวโมเดลระหว่างถอด)
+# warm-up thread หลัง fork / งานแรกในคิว / Live Dictation เรียกพร้อมกันได้ จึงต้องผลัดกันใช้
+# (ทุกที่ที่เรียก .transcribe() ของโมเดลใน process นี้ต้องถือ lock นี้ รวมถึง warm_up)
+_infer_lock = threading.Lock()
+_chunk_pool = None  # process pool สำหรับถอดเสียงยาวเป็นท่อนๆ (สร้างครั้งแรกที่ใช้)
 
 # เพิ่มตัวเลขที่มักจะผิดบ่อยๆ ลงไปใน Prompt
 MEDICAL_PROMPT = (
@@ -13,15 +29,169 @@ MEDICAL_PROMPT = (
     "nipple is everted, lower outer quadrant."
 )
 
-def load_model():
-    global model
-    if model is None:
-        print(f"Loading Whisper Model ({config.WHISPER_MODEL_SIZE})...")
-        model = whisper.load_model(config.WHISPER_MODEL_SIZE)
-    return model
-
-def transcribe(audio_path):
-    ai = load_model()
-    # ใส่ initial_prompt เพื่อไกด์ให้ AI รู้ว่าต้องเจอเลขพวกนี้
-    result = ai.transcribe(audio_path, language="en", initial_prompt=MEDICAL_PROMPT)
-    return result["text"]
\ No newline at end of file
+def load_model(size=None):
+    size = size or config.WHISPER_MODEL_SIZE
+    if size not in _models:
+        with _lock:
+            if size not in _models:
+                _models[size] = asr_backend.load(size)
+    return _models[size]
+
+def warm_up(size=None):
+    """
+    ถอดเสียงเงียบ 1 วินาที ให้ torch จัดเตรียม kernel/หน่วยความจำให้เรียบร้อย
+    request แรกจะได้ไม่ช้า (เรียกหลัง fork เท่านั้น ห้ามรัน inference ใน master ก่อน fork)
+    """
+    size = size or config.WHISPER_MODEL_SIZE
+    ai = load_model(size)
+    with _infer_lock:
+        ai.transcribe(np.zeros(whisper.audio.SAMPLE_RATE, dtype=np.float32), language="en")
+    _warm.add(size)
+    print(f"Whisper Model ({size}) is warm")
+
+def warm_up_async(size=None):
+    t = threading.Thread(target=warm_up, args=(size,), name="model-warm-up", daemon=True)
+    t.start()
+    return t
+
+def model_status(size=None):
+    if config.INFERENCE_WORKER:
+        from services import inference_service
+        return inference_service.status()
+    size = size or config.WHISPER_MODEL_SIZE
+    return {"model": size, "loaded": size in _models, "warm": size in _warm}
+
+def profile_options(profile=None):
+    """ชื่อ Decode Profile (config.DECODE_PROFILES) -> (options ของ transcribe, ขนาดโมเดล)"""
+    profile = profile or config.DEFAULT_DECODE_PROFILE
+    if profile not in config.DECODE_PROFILES:
+        raise ValueError(f"Unknown decode profile {profile!r} (choose from {', '.join(config.DECODE_PROFILES)})")
+    p = config.DECODE_PROFILES[profile]
+    options = {
+        "language": p.get("language", "en"),
+        "temperature": p["temperature"],
+        "condition_on_previous_text": p["condition_on_previous_text"],
+    }
+    if p.get("beam_size"):
+        options["beam_size"] = p["beam_size"]
+    if p.get("prompt"):
+        options["initial_prompt"] = MEDICAL_PROMPT
+    return options, p.get("model") or config.WHISPER_MODEL_SIZE
+
+def _segments(result, offset=0.0):
+    return [{"start": round(seg["start"] + offset, 2), "end": round(seg["end"] + offset, 2), "text": seg["text"]}
+            for seg in result.get("segments", [])]
+
+def load_audio(audio, filename=""):
+    """
+    ไฟล์เสียง (path หรือ bytes) -> float32 16 kHz mono พร้อมส่งเข้า Whisper
+    ถอดรหัสในหน่วยความจำรอบเดียว แล้วตัดช่วงเงียบหัว-ท้ายทิ้ง
+    """
+    samples = audio_service.decode_audio(audio, filename)
+    if config.TRIM_SILENCE:
+        samples = audio_service.trim_silence(samples)
+    return samples
+
+def transcribe_audio(audio, options=None, size=None, filename=""):
+    """
+    ถอดเสียงพร้อม Transcript Cache คืนค่า {"text": ..., "segments": [...]}
+    audio เป็นได้ทั้ง path หรือ bytes ของไฟล์ที่อัปโหลด (ไม่ต้องเขียนลงดิสก์ก่อน)
+    ไฟล์เสียงเดิม + โมเดลเดิม + options เดิม -> ดึงจาก cache ไม่ต้องรัน Whisper
+    """
+    if isinstance(audio, str):
+        filename = filename or audio
+        with open(audio, "rb") as f:
+            audio = f.read()
+    size = size or config.WHISPER_MODEL_SIZE
+    options = dict(options or {})
+    key = None
+    if config.TRANSCRIPT_CACHE_ENABLED:
+        # การตัดช่วงเงียบเปลี่ยนเสียงที่เข้าโมเดล จึงต้องอยู่ใน key ด้วย
+        key_options = dict(options, trim_silence=config.TRIM_SILENCE)
+        if config.ASR_BACKEND != "whisper":
+            key_options["backend"] = config.ASR_BACKEND  # backend อื่นได้ข้อความต่างกันเล็กน้อย
+        with span("asr.cache"):
+            key = transcript_cache.make_key(transcript_cache.audio_hash(audio), size, key_options)
+            cached = transcript_cache.get_cache().get(key)
+        if cached is not None:
+            print("Transcript cache hit")
+            return dict(cached, cached=True)
+
+    with span("asr.decode_audio"):
+        samples = load_audio(audio, filename)
+    result = transcribe_samples(samples, options, size)
+
+    if key:
+        with span("asr.cache"):
+            transcript_cache.get_cache().put(key, result)
+    return result
+
+def transcribe_samples(samples, options=None, size=None):
+    """
+    ถอดเสียงที่ถอดรหัสแล้ว (float32 16 kHz) ไม่ผ่าน cache คืนค่า {"text", "segments", "duration"}
+    ใช้ตัวรันเดียวกับ transcribe_audio: Inference Worker / long-audio pool / โมเดลใน process นี้
+    """
+    size = size or config.WHISPER_MODEL_SIZE
+    options = dict(options or {})
+    if config.INFERENCE_WORKER:
+        # ส่งให้ Inference Worker (ตัดท่อน + รวม batch กับ request อื่นที่นั่น)
+        from services import inference_service
+        with span("asr.inference_worker"):
+            result = inference_service.transcribe(samples, options, size)
+    elif config.LONG_AUDIO_WORKERS > 1 and len(samples) > config.LONG_AUDIO_SECONDS * whisper.audio.SAMPLE_RATE:
+        with span("asr.long_audio"):
+            result = transcribe_long(samples, options, size)
+    else:
+        with span("asr.model"), _infer_lock:
+            raw = load_model(size).transcribe(samples, **options)
+        result = {"text": raw["text"], "segments": _segments(raw)}
+    result["duration"] = round(len(samples) / whisper.audio.SAMPLE_RATE, 2)
+    return result
+
+def transcribe(audio_path, profile=None):
+    # ใส่ initial_prompt เพื่อไกด์ให้ AI รู้ว่าต้องเจอเลขพวกนี้ (ทุก profile ที่ตั้ง prompt=True)
+    options, size = profile_options(profile)
+    result = transcribe_audio(audio_path, options, size)
+    return result["text"]
+
+# ==========================================
+# Long-audio mode: ตัดตามช่วงเงียบ (VAD) แล้วถอดเสียงหลายท่อนพร้อมกัน
+# ==========================================
+def _init_chunk_worker(torch_threads):
+    import torch
+    torch.set_num_threads(torch_threads)
+    load_model()
+
+def _transcribe_chunk(args):
+    chunk, offset, options, size = args
+    ai = load_model(size)
+    # ถอดพร้อมกัน จึงใช้ข้อความท่อนก่อนหน้าเป็น prompt ไม่ได้ ทุกท่อนได้ initial_prompt (MEDICAL_PROMPT) เหมือนกัน
+    result = ai.transcribe(chunk, **dict(options, condition_on_previous_text=False))
+    return result["text"].strip(), _segments(result, offset)
+
+def _get_chunk_pool():
+    global _chunk_pool
+    if _chunk_pool is None:
+        workers = config.LONG_AUDIO_WORKERS
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        _chunk_pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                          initializer=_init_chunk_worker, initargs=(torch_threads,))
+    return _chunk_pool
+
+def transcribe_long(audio, options=None, size=None):
+    """
+    ถอดเสียงยาว (เช่น gross description 10 นาที): แบ่งท่อนตามช่วงเงียบ ให้แต่ละ worker ถอดพร้อมกัน
+    แล้วต่อข้อความกลับตามลำดับเวลา -> เวลาที่ใช้ลดลงตามจำนวน core
+    """
+    if isinstance(audio, str):
+        audio = load_audio(audio, audio)
+    if options is None:
+        options = {"language": "en", "initial_prompt": MEDICAL_PROMPT}
+    sr = whisper.audio.SAMPLE_RATE
+    jobs = [(audio[s:e], s / sr, options, size) for s, e in audio_service.split_on_silence(audio, sr)]
+    print(f"Long audio: {len(audio) / sr:.0f}s -> {len(jobs)} chunks")
+    texts, segments = [], []
+    for text, segs in _get_chunk_pool().map(_transcribe_chunk, jobs):  # map คืนผลตามลำดับท่อนเสมอ
+        if text: texts.append(text)
+        segments += segs
+    return {"text": " ".join(texts), "segments": segments}
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import time
+import whisper
+import config
+
+# ==========================================
+# ASR Backend: ตัวรันโมเดลถอดเสียงบน CPU (เลือกใน config.ASR_BACKEND)
+#   "whisper"         openai-whisper fp32 (ค่าเดิม)
+#   "whisper-int8"    openai-whisper + dynamic int8 quantization ของชั้น Linear (torch) ไม่ต้องลงอะไรเพิ่ม
+#   "faster-whisper"  CTranslate2 int8 (pip install faster-whisper)
+#   "stub"            ไม่มีโมเดล: รอ STUB_ASR_LATENCY_MS แล้วคืนข้อความจาก corpus (load test ชั้นเว็บ / parser / PDF)
+# ทุกตัวมี transcribe(audio, **options) คืนค่าแบบเดียวกับ whisper: {"text": ..., "segments": [{start, end, text}]}
+# และ decode_batch(audios, options) สำหรับ Inference Worker (ท่อนละ <= 30 วินาที คืนค่า list ของข้อความ)
+# ==========================================
+
+BACKENDS = ("whisper", "whisper-int8", "faster-whisper", "stub")
+
+# options ของ transcribe() ที่แปลงเป็น DecodingOptions ได้ (temperature แยกไปทำ fallback เอง)
+_DECODE_KEYS = ("task", "language", "beam_size", "best_of", "patience")
+
+
+def _decode_options(options, temperature):
+    """DecodingOptions ของรอบ temperature นี้ (beam search เฉพาะ 0 / สุ่มหลายตัวเลือกเฉพาะ > 0 เหมือน transcribe())"""
+    options = {k: options[k] for k in _DECODE_KEYS if options.get(k) is not None}
+    if temperature > 0:
+        options.pop("beam_size", None)
+        options.pop("patience", None)
+    else:
+        options.pop("best_of", None)
+    return dict(options, temperature=temperature)
+
+
+def _temperatures(options):
+    temperature = options.get("temperature")
+    if isinstance(temperature, (list, tuple)):
+        return tuple(temperature)
+    return (0.0 if temperature is None else temperature,)
+
+
+def _needs_fallback(result, options):
+    """เกณฑ์เดียวกับ whisper.transcribe(): ข้อความวนซ้ำ / ความมั่นใจต่ำ -> ถอดใหม่ด้วย temperature ถัดไป"""
+    compression_ratio = options.get("compression_ratio_threshold", 2.4)
+    logprob = options.get("logprob_threshold", -1.0)
+    no_speech = options.get("no_speech_threshold", 0.6)
+    if no_speech is not None and logprob is not None and \
+            result.no_speech_prob > no_speech and result.avg_logprob < logprob:
+        return False  # ช่วงเงียบ: ถอดใหม่ก็ไม่ได้อะไร
+    return (compression_ratio is not None and result.compression_ratio > compression_ratio) or \
+        (logprob is not None and result.avg_logprob < logprob)
+
+
+def quantize_int8(model):
+    """
+    dynamic int8 quantization ของชั้น Linear ทั้งหมดใน Whisper
+    Whisper ใช้ whisper.model.Linear (subclass ของ nn.Linear) แต่ quantize_dynamic แทนเฉพาะ type ที่ตรงกันพอดี
+    -> ต้องเปลี่ยนเป็น nn.Linear ธรรมดาก่อน (ใช้ weight ชุดเดิม) ไม่เช่นนั้นไม่มีชั้นไหนถูก quantize เลย
+    """
+    import torch
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                plain.weight, plain.bias = child.weight, child.bias
+                setattr(parent, name, plain)
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    quantized = sum(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in model.modules())
+    if not quantized:
+        raise RuntimeError("whisper-int8: no Linear layer was quantized (model would silently run in fp32)")
+    print(f"whisper-int8: {quantized} Linear layers quantized")
+    return model
+
+
+class WhisperBackend:
+    """openai-whisper (quantize=True: แปลง nn.Linear เป็น int8 ตอนโหลด เร็วขึ้นบน CPU ความแม่นยำลดลงเล็กน้อย)"""
+
+    def __init__(self, size, quantize=False):
+        self.model = whisper.load_model(size, device="cpu")
+        if quantize:
+            self.model = quantize_int8(self.model)
+
+    def transcribe(self, audio, **options):
+        # CPU ไม่รองรับ fp16 (ไม่ต้องให้ whisper เตือนทุกไฟล์)
+        return self.model.transcribe(audio, **dict(options, fp16=False))
+
+    def decode_batch(self, audios, options):
+        """
+        ถอดทั้ง batch ด้วย temperature แรก แล้วถอดใหม่เฉพาะท่อนที่ต้อง fallback ด้วย temperature ถัดไป
+        (เหมือน transcribe() แต่ท่อนที่ผ่านแล้วไม่ต้องรอ / ไม่ต้องถอดซ้ำ)
+        encoder รันครั้งเดียวทั้ง batch แล้วใช้ผลเดิมทุกรอบ temperature
+        """
+        import torch
+        n_mels = getattr(self.model.dims, "n_mels", 80)
+        mels = torch.stack([whisper.log_mel_spectrogram(whisper.pad_or_trim(a), n_mels) for a in audios])
+        with torch.no_grad():
+            features = self.model.embed_audio(mels.to(self.model.device))
+        results = [None] * len(audios)
+        todo = list(range(len(audios)))
+        for temperature in _temperatures(options):
+            decode_options = whisper.DecodingOptions(
+                **_decode_options(options, temperature),
+                prompt=options.get("initial_prompt"),
+                without_timestamps=True,
+                fp16=False,
+            )
+            with torch.no_grad():
+                if (decode_options.beam_size or decode_options.best_of or 1) > 1:
+                    # beam search / best_of ของ whisper.decode พังเมื่อ batch > 1 (ไม่ได้ขยาย audio features ตามจำนวน beam)
+                    decoded = [whisper.decode(self.model, features[i:i + 1], decode_options)[0] for i in todo]
+                else:
+                    decoded = whisper.decode(self.model, features[todo], decode_options)
+            for i, result in zip(todo, decoded):
+                results[i] = result
+            todo = [i for i, result in zip(todo, decoded) if _needs_fallback(result, options)]
+            if not todo:
+                break
+        return [r.text.strip() for r in results]
+
+
+class FasterWhisperBackend:
+    """CTranslate2 (faster-whisper) compute_type int8"""
+
+    def __init__(self, size):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("ASR_BACKEND = 'faster-whisper' needs: pip install faster-whisper")
+        self.model = WhisperModel(size, device="cpu", compute_type="int8",
+                                  cpu_threads=config.INFERENCE_TORCH_THREADS or 0)
+
+    def transcribe(self, audio, **options):
+        kwargs = {k: options[k] for k in ("task", "language", "initial_prompt", "beam_size", "best_of",
+                                          "patience", "temperature", "condition_on_previous_text")
+                  if options.get(k) is not None}
+        segments, _ = self.model.transcribe(audio, **kwargs)
+        segments = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]  # generator: ถอดจริงตรงนี้
+        return {"text": "".join(s["text"] for s in segments), "segments": segments}
+
+    def decode_batch(self, audios, options):
+        # CTranslate2 ใช้ thread ภายในของตัวเองอยู่แล้ว ถอดทีละท่อนตามลำดับ (temperature fallback ทำในตัว)
+        # ท่อนละ <= 30 วินาที: การต่อข้อความจากท่อนก่อนหน้า inference_service ใส่มาใน initial_prompt แล้ว
+        options = dict(options, condition_on_previous_text=False)
+        return [self.transcribe(a, **options)["text"].strip() for a in audios]
+
+
+class StubBackend:
+    """
+    แทน Whisper ด้วยความหน่วงคงที่ (ไม่โหลด weight ไม่ต้องใช้ network)
+    ข้อความเลือกจาก config.STUB_ASR_CORPUS ตาม hash ของเสียง: ไฟล์เดิมได้ข้อความเดิมทุกครั้ง
+    """
+
+    def __init__(self, latency_ms=None, corpus=None):
+        self.latency = (config.STUB_ASR_LATENCY_MS if latency_ms is None else latency_ms) / 1000
+        with open(corpus or config.STUB_ASR_CORPUS) as f:
+            self.transcripts = [item["transcript"] for item in json.load(f)]
+
+    def _text(self, audio):
+        digest = hashlib.blake2b(audio.tobytes(), digest_size=8).digest()
+        return self.transcripts[int.from_bytes(digest, "big") % len(self.transcripts)]
+
+    def transcribe(self, audio, **options):
+        time.sleep(self.latency)
+        text = self._text(audio)
+        duration = len(audio) / whisper.audio.SAMPLE_RATE
+        return {"text": text, "segments": [{"start": 0.0, "end": duration, "text": text}]}
+
+    def decode_batch(self, audios, options):
+        time.sleep(self.latency)  # 1 batch = 1 รอบ (เหมือนรัน encoder/decoder ทีเดียวทั้ง batch)
+        return [self._text(a) for a in audios]
+
+
+def load(size, backend=None):
+    backend = backend or config.ASR_BACKEND
+    print(f"Loading Whisper Model ({size}, backend={backend})...")
+    if backend == "whisper":
+        return WhisperBackend(size)
+    if backend == "whisper-int8":
+        return WhisperBackend(size, quantize=True)
+    if backend == "faster-whisper":
+        return FasterWhisperBackend(size)
+    if backend == "stub":
+        return StubBackend()
+    raise ValueError(f"Unknown ASR_BACKEND {backend!r} (choose from {', '.join(BACKENDS)})")
@@ -1,13 +1,129 @@
+import contextlib
 import os
-from pydub import AudioSegment
+import subprocess
+import tempfile
+import numpy as np
 
-def convert_to_wav(input_path):
-    """แปลงไฟล์เสียงใดๆ เป็น WAV มาตรฐาน"""
+SAMPLE_RATE = 16000  # Whisper ใช้ 16 kHz mono
+
+# ffmpeg อ่าน container เหล่านี้จาก pipe ไม่ได้ (ข้อมูล index อยู่ท้ายไฟล์ ต้อง seek) -> เขียนลง workspace ก่อน
+SEEKABLE_EXTENSIONS = (".m4a", ".mp4", ".mov", ".3gp", ".aac")
+
+
+@contextlib.contextmanager
+def request_workspace():
+    """
+    โฟลเดอร์ชั่วคราวของ 1 request (อยู่บน tmpfs /dev/shm ถ้ามี = อยู่ใน RAM)
+    ชื่อไม่ชนกันแม้อัปโหลดไฟล์ชื่อเดียวกันพร้อมกัน และถูกลบทิ้งเองเมื่อออกจาก with
+    """
+    base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+    with tempfile.TemporaryDirectory(prefix="pathology-", dir=base) as path:
+        yield path
+
+
+def _ffmpeg_decode(source, data=None, sr=SAMPLE_RATE):
+    # ถอดรหัสครั้งเดียวเป็น float32 mono ตรงๆ (ไม่ผ่าน int16 / ไฟล์ WAV กลางทาง)
+    cmd = ["ffmpeg", "-loglevel", "error", "-threads", "0", "-i", source,
+           "-f", "f32le", "-ac", "1", "-acodec", "pcm_f32le", "-ar", str(sr), "-"]
+    if data is None:
+        cmd.insert(1, "-nostdin")
     try:
-        sound = AudioSegment.from_file(input_path)
-        output_path = os.path.splitext(input_path)[0] + "_converted.wav"
-        sound.export(output_path, format="wav")
-        return output_path
-    except Exception as e:
-        print(f"Audio Error: {e}")
-        return None
\ No newline at end of file
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg not found")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore').strip()}") from e
+    return np.frombuffer(out, np.float32)
+
+
+def decode_audio(data, filename="", sr=SAMPLE_RATE):
+    """
+    bytes ของไฟล์เสียง (ชนิดใดก็ได้ที่ ffmpeg อ่านได้) -> numpy float32 16 kHz mono
+    ส่งเข้า ffmpeg ทาง stdin เลย ไม่ต้องเขียนไฟล์ ยกเว้น container ที่ต้อง seek
+    """
+    if isinstance(data, str):
+        return _ffmpeg_decode(data, sr=sr)
+    if not filename.lower().endswith(SEEKABLE_EXTENSIONS):
+        try:
+            return _ffmpeg_decode("pipe:0", data, sr)
+        except RuntimeError as e:
+            print(f"Pipe decode failed, retrying from workspace: {e}")
+    with request_workspace() as workspace:
+        path = os.path.join(workspace, "input" + os.path.splitext(filename)[1].lower())
+        with open(path, "wb") as f:
+            f.write(data)
+        return _ffmpeg_decode(path, sr=sr)
+
+
+def trim_silence(audio, sr=SAMPLE_RATE, pad_ms=200):
+    """ตัดช่วงเงียบหัว-ท้ายออกก่อนส่งเข้า Whisper (ตรงกลางไม่แตะ)"""
+    regions = speech_regions(audio, sr)
+    if not regions:
+        return audio
+    pad = int(pad_ms * sr / 1000)
+    return audio[max(0, regions[0][0] - pad):min(len(audio), regions[-1][1] + pad)]
+
+
+def speech_regions(audio, sr=SAMPLE_RATE, frame_ms=30, min_silence_ms=400, threshold_ratio=2.5):
+    """
+    VAD แบบพลังงานเสียง (ไม่ต้องลง library เพิ่ม)
+    คืนค่า list ของ (start, end) เป็นตำแหน่ง sample ของช่วงที่มีเสียงพูด
+    """
+    frame = int(sr * frame_ms / 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+    # ระดับเสียงพื้นหลัง = ช่วงที่เบาที่สุด 10% -> เกณฑ์ = พื้นหลัง x threshold_ratio
+    # (แต่ไม่เกินครึ่งหนึ่งของระดับเสียงพูด กรณีพูดต่อเนื่องไม่มีช่วงเงียบเลย)
+    noise_floor, speech_level = np.percentile(rms, [10, 95])
+    threshold = max(min(noise_floor * threshold_ratio, speech_level * 0.5), 1e-3)
+    voiced = rms > threshold
+
+    # รวมช่วงพูดที่เว้นเงียบสั้นกว่า min_silence_ms เข้าด้วยกัน
+    min_gap = max(1, min_silence_ms // frame_ms)
+    regions = []
+    start = None; silent = 0
+    for i, v in enumerate(voiced):
+        if v:
+            if start is None: start = i
+            silent = 0
+        elif start is not None:
+            silent += 1
+            if silent >= min_gap:
+                regions.append((start * frame, (i - silent + 1) * frame))
+                start = None; silent = 0
+    if start is not None:
+        regions.append((start * frame, len(audio)))
+    return regions
+
+
+def split_on_silence(audio, sr=SAMPLE_RATE, max_chunk_s=28, pad_ms=200):
+    """
+    ตัดเสียงยาวเป็นท่อนๆ ตรงช่วงเงียบ ให้แต่ละท่อนไม่เกิน max_chunk_s (หน้าต่างของ Whisper = 30 วินาที)
+    คืนค่า list ของ (start, end) เรียงตามเวลา
+    """
+    max_len = int(max_chunk_s * sr)
+    pad = int(pad_ms * sr / 1000)
+    chunks = []
+    cur_start = cur_end = None
+    for start, end in speech_regions(audio, sr):
+        # ช่วงพูดยาวเกินหน้าต่าง (ไม่มีช่วงเงียบเลย) -> ตัดตรงๆ
+        while end - start > max_len:
+            if cur_start is not None:
+                chunks.append((cur_start, cur_end)); cur_start = None
+            chunks.append((start, start + max_len))
+            start += max_len
+        if cur_start is None:
+            cur_start, cur_end = start, end
+        elif end - cur_start <= max_len:
+            cur_end = end
+        else:
+            chunks.append((cur_start, cur_end))
+            cur_start, cur_end = start, end
+    if cur_start is not None:
+        chunks.append((cur_start, cur_end))
+    # เผื่อขอบเล็กน้อย ไม่ให้คำแรก/คำสุดท้ายโดนตัด
+    return [(max(0, s - pad), min(len(audio), e + pad)) for s, e in chunks]
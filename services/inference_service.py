@@ -0,0 +1,301 @@
+"""
+Inference Worker: process แยกที่ถือโมเดล Whisper ไว้ตัวเดียว รับงานจาก web process ผ่าน local socket
+
+ปกติ app.py / gunicorn.conf.py เปิดให้เอง (กุญแจของ socket สุ่มใหม่แล้วส่งต่อผ่าน environment)
+รันแยกเอง: ตั้ง INFERENCE_AUTHKEY ค่าเดียวกันทั้งสองฝั่ง + INFERENCE_EXTERNAL=1 ให้ web process ไม่เปิด worker ซ้ำ
+
+    INFERENCE_AUTHKEY=<secret> python -m services.inference_service --socket cache/inference.sock.0 --threads 8
+    INFERENCE_AUTHKEY=<secret> INFERENCE_EXTERNAL=1 gunicorn -c gunicorn.conf.py app:app
+
+- web process ถอดรหัสเสียง (decode/trim) เอง แล้วส่ง numpy array มาให้ worker
+- worker ตัดเสียงเป็นท่อน <= 30 วินาที (หน้าต่างของ Whisper) แล้วรวมท่อนจากทุก request ที่รออยู่
+  เป็น batch เดียว (dynamic batching): รอได้ไม่เกิน INFERENCE_MAX_WAIT_MS หรือจนครบ INFERENCE_MAX_BATCH
+  แล้วรัน encoder/decoder ทีเดียวทั้ง batch -> อัปโหลดพร้อมกันหลายไฟล์ไม่ต้องรอคิวทีละไฟล์
+- จำนวน thread ของ torch ถูกกำหนดตายตัวต่อ worker (ไม่แย่ง CPU กับ web process)
+"""
+import argparse
+import atexit
+import collections
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+import config
+from services import audio_service, metrics_service
+
+def worker_addresses():
+    return [f"{config.INFERENCE_SOCKET}.{i}" for i in range(config.INFERENCE_PROCESSES)]
+
+
+# ==========================================
+# Server (รันใน Inference Worker process)
+# ==========================================
+class _Item:
+    __slots__ = ("audio", "key", "options", "size", "enqueued", "done", "text", "error")
+
+    def __init__(self, audio, key, options, size):
+        self.audio = audio
+        self.key = key
+        self.options = options
+        self.size = size
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.text = None
+        self.error = None
+
+
+class Batcher:
+    """
+    รวมท่อนเสียงที่รออยู่เป็น batch (โมเดล + options เดียวกันเท่านั้น เพราะ DecodingOptions ใช้ทั้ง batch)
+    load_model(size) คืนค่า backend ของโมเดลขนาดนั้น (โหลดครั้งแรกที่มี profile ขอใช้)
+    """
+
+    def __init__(self, load_model, max_batch, max_wait):
+        self.load_model = load_model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = collections.deque()
+        self.cond = threading.Condition()
+        self.stats = {"batches": 0, "chunks": 0, "busy_seconds": 0.0}
+
+    def submit(self, audio, options, size):
+        key = repr((size, sorted(options.items())))
+        item = _Item(audio, key, options, size)
+        with self.cond:
+            self.pending.append(item)
+            self.cond.notify()
+        return item
+
+    def _next_batch(self):
+        with self.cond:
+            while not self.pending:
+                self.cond.wait()
+            # รอให้ได้ batch ใหญ่ขึ้น แต่ไม่เกิน max_wait นับจากท่อนแรกที่รออยู่
+            deadline = self.pending[0].enqueued + self.max_wait
+            while len(self.pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            key = self.pending[0].key
+            batch, rest = [], collections.deque()
+            while self.pending:
+                item = self.pending.popleft()
+                if item.key == key and len(batch) < self.max_batch:
+                    batch.append(item)
+                else:
+                    rest.append(item)
+            self.pending = rest
+            return batch
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            t0 = time.perf_counter()
+            try:
+                texts = self.decode(batch)
+                for item, text in zip(batch, texts):
+                    item.text = text
+            except Exception as e:
+                print(f"Inference batch failed: {e}")
+                for item in batch:
+                    item.error = str(e)
+            self.stats["batches"] += 1
+            self.stats["chunks"] += len(batch)
+            self.stats["busy_seconds"] += time.perf_counter() - t0
+            for item in batch:
+                item.done.set()
+
+    def decode(self, batch):
+        model = self.load_model(batch[0].size)
+        return model.decode_batch([item.audio for item in batch], batch[0].options)
+
+
+def _handle(conn, batcher, status):
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                return
+            if request.get("op") == "status":
+                conn.send(status())
+                continue
+            try:
+                conn.send({"ok": True, "result": _transcribe(batcher, request["audio"], request.get("options") or {},
+                                                           request.get("size") or config.WHISPER_MODEL_SIZE)})
+            except Exception as e:
+                conn.send({"ok": False, "error": str(e)})
+    finally:
+        conn.close()
+
+
+def _transcribe(batcher, audio, options, size):
+    sr = audio_service.SAMPLE_RATE
+    if len(audio) <= 30 * sr:
+        spans = [(0, len(audio))]
+    else:
+        spans = audio_service.split_on_silence(audio, sr)
+    texts, segments = [], []
+
+    def collect(s, e, item):
+        item.done.wait()
+        if item.error:
+            raise RuntimeError(item.error)
+        if item.text:
+            texts.append(item.text)
+            segments.append({"start": round(s / sr, 2), "end": round(e / sr, 2), "text": " " + item.text})
+
+    if options.get("condition_on_previous_text") and len(spans) > 1:
+        # ต่อข้อความของท่อนก่อนหน้าใน prompt (เหมือน transcribe()) -> ต้องถอดทีละท่อนตามลำดับ
+        # (ยังไปอยู่ใน batch เดียวกับท่อนของ request อื่นที่ options ตรงกันได้)
+        for s, e in spans:
+            chunk_options = dict(options)
+            if texts:
+                chunk_options["initial_prompt"] = f"{options.get('initial_prompt') or ''} {' '.join(texts)}".strip()
+            collect(s, e, batcher.submit(audio[s:e], chunk_options, size))
+    else:
+        # ทุกท่อนของไฟล์นี้เข้าคิวพร้อมกัน -> ไปอยู่ใน batch เดียวกับท่อนของ request อื่นได้
+        for s, e, item in [(s, e, batcher.submit(audio[s:e], options, size)) for s, e in spans]:
+            collect(s, e, item)
+    return {"text": " ".join(texts), "segments": segments}
+
+
+def serve(address, torch_threads=0):
+    """main ของ Inference Worker: โหลดโมเดล -> warm-up -> รับงานจาก socket"""
+    import torch
+    from services import asr_backend
+    torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // config.INFERENCE_PROCESSES)
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+    if os.path.exists(address):
+        os.remove(address)
+    listener = Listener(address, family="AF_UNIX", authkey=config.INFERENCE_AUTHKEY)
+
+    print(f"Inference worker {os.getpid()}: {torch_threads} torch threads")
+    models = {}
+
+    def load_model(size):
+        # เรียกจาก thread ของ batcher เท่านั้น (ไม่ต้องใช้ lock)
+        if size not in models:
+            models[size] = asr_backend.load(size)
+        return models[size]
+
+    batcher = Batcher(load_model, config.INFERENCE_MAX_BATCH, config.INFERENCE_MAX_WAIT_MS / 1000)
+    silence = np.zeros(audio_service.SAMPLE_RATE, dtype=np.float32)
+    batcher.decode([_Item(silence, "", {"language": "en"}, config.WHISPER_MODEL_SIZE)])  # warm-up
+    threading.Thread(target=batcher.run, name="inference-batcher", daemon=True).start()
+    # ให้ /metrics ของ web process เห็นหน่วยความจำของ process นี้ (โมเดลอยู่ที่นี่ ไม่ใช่ใน web worker)
+    metrics_service.announce("inference")
+    print(f"Inference worker {os.getpid()} ready on {address}")
+
+    def status():
+        with batcher.cond:
+            pending = len(batcher.pending)
+        stats = dict(batcher.stats)
+        stats.update(model=config.WHISPER_MODEL_SIZE, loaded_models=sorted(models), backend=config.ASR_BACKEND, loaded=True, warm=True, pending=pending,
+                     pid=os.getpid(), rss=metrics_service.process_rss(os.getpid()), torch_threads=torch_threads,
+                     avg_batch=(stats["chunks"] / stats["batches"]) if stats["batches"] else None)
+        return stats
+
+    while True:
+        conn = listener.accept()
+        threading.Thread(target=_handle, args=(conn, batcher, status), daemon=True).start()
+
+
+_processes = []
+
+
+def start_workers():
+    """
+    เปิด Inference Worker ตาม INFERENCE_PROCESSES เป็น process ใหม่ (ไม่ fork process ที่มี torch/thread อยู่แล้ว
+    และไม่ import app.py ซ้ำใน worker) ปิดตามเมื่อ process ที่เปิดจบ
+    """
+    if config.INFERENCE_EXTERNAL:
+        if not config.INFERENCE_AUTHKEY_SET:
+            raise RuntimeError("INFERENCE_EXTERNAL=1 needs INFERENCE_AUTHKEY set to the worker's key")
+        print("Using external inference workers at " + ", ".join(worker_addresses()))
+        return _processes
+    os.makedirs(os.path.dirname(config.INFERENCE_SOCKET), exist_ok=True)
+    for address in worker_addresses():
+        cmd = [sys.executable, "-m", "services.inference_service", "--socket", address,
+               "--threads", str(config.INFERENCE_TORCH_THREADS)]
+        _processes.append(subprocess.Popen(cmd, cwd=config.BASE_DIR))
+    atexit.register(stop_workers)
+    return _processes
+
+
+def stop_workers():
+    for p in _processes:
+        if p.poll() is None:
+            p.terminate()
+    for p in _processes:
+        try: p.wait(timeout=10)
+        except subprocess.TimeoutExpired: p.kill()
+    _processes.clear()
+
+
+# ==========================================
+# Client (ใช้ใน web process)
+# ==========================================
+_rr = 0
+
+
+def _connect(timeout=None):
+    global _rr
+    addresses = worker_addresses()
+    _rr = (_rr + 1) % len(addresses)
+    address = addresses[_rr]
+    deadline = time.monotonic() + (config.INFERENCE_CONNECT_TIMEOUT if timeout is None else timeout)
+    while True:
+        try:
+            return Client(address, family="AF_UNIX", authkey=config.INFERENCE_AUTHKEY)
+        except (FileNotFoundError, ConnectionRefusedError):
+            # worker อาจยังโหลดโมเดลไม่เสร็จ
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Inference worker is not available at {address}")
+            time.sleep(0.5)
+
+
+def transcribe(samples, options=None, size=None):
+    """ส่งเสียง (float32 16 kHz) ไปถอดที่ Inference Worker คืนค่า {"text": ..., "segments": [...]}"""
+    conn = _connect()
+    try:
+        conn.send({"op": "transcribe", "audio": np.asarray(samples, dtype=np.float32), "options": dict(options or {}),
+                   "size": size})
+        response = conn.recv()
+    finally:
+        conn.close()
+    if not response["ok"]:
+        raise RuntimeError(f"Inference worker error: {response['error']}")
+    return response["result"]
+
+
+def status():
+    """สถานะของ Inference Worker (ใช้กับ /readyz) ถ้ายังไม่พร้อมคืนค่า loaded/warm = False"""
+    try:
+        conn = _connect(timeout=0)
+    except RuntimeError:
+        return {"model": config.WHISPER_MODEL_SIZE, "loaded": False, "warm": False}
+    try:
+        conn.send({"op": "status"})
+        return conn.recv()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Whisper inference worker (dynamic batching)")
+    parser.add_argument("--socket", default=worker_addresses()[0])
+    parser.add_argument("--threads", type=int, default=config.INFERENCE_TORCH_THREADS, help="thread ของ torch (0 = แบ่ง CPU ตาม INFERENCE_PROCESSES)")
+    args = parser.parse_args()
+    if not config.INFERENCE_AUTHKEY_SET:
+        # กุญแจสุ่มของ process นี้ไม่ตรงกับของ web process -> ทุก connection จะ authenticate ไม่ผ่าน
+        parser.error("set INFERENCE_AUTHKEY (same value as the web process) to run the worker standalone")
+    os.makedirs(os.path.dirname(os.path.abspath(args.socket)), exist_ok=True)
+    serve(args.socket, args.threads)
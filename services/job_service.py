@@ -0,0 +1,218 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    """คิวเต็ม ให้ client ส่งมาใหม่ภายหลัง (HTTP 429)"""
+
+
+class JobQueue:
+    """
+    คิวงานแบบจำกัดขนาด + Worker จำนวนคงที่
+    รับงานแล้วคืน job id ทันที ส่วนงานหนัก (ถอดเสียง/เขียน PDF) ทำใน Worker
+
+    ถ้ากำหนด store_dir สถานะงานจะถูกเขียนลงไฟล์ด้วย ทำให้ web worker ทุก process
+    (gunicorn หลาย worker) ตอบสถานะงานของกันและกันได้
+    """
+
+    def __init__(self, handler, workers=1, max_pending=8, result_ttl=3600, store_dir=None):
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.store_dir = store_dir
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+        self._pid = None
+
+    def _ensure_started(self):
+        # Thread ไม่ติดไปกับ fork: สร้าง Worker ใหม่ใน process ที่ใช้งานจริงเท่านั้น
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.pending = queue.Queue(maxsize=self.max_pending)
+        self.threads = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def submit(self, *args, job_id=None, **kwargs):
+        self._ensure_started()
+        job_id = job_id or uuid.uuid4().hex
+        job = {
+            "id": job_id, "status": "queued", "pid": os.getpid(),  # process ที่ถืองานนี้ในคิว
+            "submitted_at": time.time(), "started_at": None, "finished_at": None,
+            "result": None, "error": None,
+        }
+        with self.lock:
+            self._expire_old()
+            self.jobs[job_id] = job
+        self._persist(job)
+        try:
+            self.pending.put_nowait((job_id, args, kwargs))
+        except queue.Full:
+            with self.lock:
+                self.jobs.pop(job_id, None)
+            self._remove(job_id)
+            raise QueueFull(f"Job queue is full ({self.max_pending} pending)")
+        return job_id
+
+    def get(self, job_id):
+        self._ensure_started()
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job and not (self.store_dir and job["finished_at"]):
+                return dict(job)
+        # งานที่เสร็จแล้ว: ไฟล์เป็นตัวจริง (ผลอาจถูกแก้จาก process อื่นผ่าน update_result)
+        return self._load(job_id) or (dict(job) if job else None)
+
+    def update_result(self, job_id, result):
+        """แทนที่ผลของงานที่เสร็จแล้ว (เช่นแก้ transcript แล้วสร้าง PDF ใหม่) คืนค่า False ถ้าไม่มีงานนี้"""
+        self._ensure_started()
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job["result"] = result
+        if job is None:
+            job = self._load(job_id)
+            if job is None:
+                return False
+            job["result"] = result
+        self._persist(job)
+        return True
+
+    def depth(self):
+        self._ensure_started()
+        return self.pending.qsize()
+
+    def in_flight(self):
+        self._ensure_started()
+        with self.lock:
+            return sum(1 for j in self.jobs.values() if j["status"] == "running")
+
+    def stats(self):
+        """
+        จำนวนงานแยกตามสถานะ (ถ้ามี store_dir นับจากไฟล์ = รวมทุก worker process)
+        ไฟล์ของงานที่หมดอายุแล้วถูกลบทิ้งตรงนี้ด้วย (_expire_old ลบได้แค่งานใน process ตัวเอง)
+        จำนวนไฟล์ที่ต้องอ่านจึงไม่เกินงานในช่วง result_ttl
+        """
+        self._ensure_started()
+        if self.store_dir:
+            cutoff = time.time() - self.result_ttl
+            jobs = []
+            for name in os.listdir(self.store_dir):
+                if not name.endswith(".json"):
+                    continue
+                job = self._load(name[:-len(".json")])
+                if job is None:
+                    continue
+                if job["finished_at"] and job["finished_at"] < cutoff:
+                    self._remove(job["id"])
+                    continue
+                jobs.append(job)
+        else:
+            with self.lock:
+                jobs = list(self.jobs.values())
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in jobs:
+            counts[job["status"]] += 1
+        return counts
+
+    def _worker(self):
+        while True:
+            job_id, args, kwargs = self.pending.get()
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    self.pending.task_done()
+                    continue
+                job["status"] = "running"
+                job["started_at"] = time.time()
+            self._persist(job)
+            try:
+                result = self.handler(job_id, *args, **kwargs)
+                status, error = "done", None
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                result, status, error = None, "failed", str(e)
+            with self.lock:
+                job["status"] = status
+                job["result"] = result
+                job["error"] = error
+                job["finished_at"] = time.time()
+            self._persist(job)
+            self.pending.task_done()
+
+    def _expire_old(self):
+        # ลบงานที่เสร็จนานแล้ว ไม่ให้ dict โตไม่มีที่สิ้นสุด
+        cutoff = time.time() - self.result_ttl
+        expired = [k for k, j in self.jobs.items() if j["finished_at"] and j["finished_at"] < cutoff]
+        for k in expired:
+            del self.jobs[k]
+            self._remove(k)
+
+    def _job_path(self, job_id):
+        return os.path.join(self.store_dir, f"{job_id}.json")
+
+    def _persist(self, job):
+        if not self.store_dir:
+            return
+        path = self._job_path(job["id"])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _remove(self, job_id):
+        if not self.store_dir:
+            return
+        # ไฟล์งาน + ไฟล์ประกอบที่เก็บข้างกัน (<job_id>.profile.svg ฯลฯ)
+        for path in [self._job_path(job_id)] + glob.glob(os.path.join(self.store_dir, f"{job_id}.*.*")):
+            try: os.remove(path)
+            except OSError: pass
+
+    def _load(self, job_id):
+        if not self.store_dir or not job_id.isalnum():
+            return None
+        try:
+            with open(self._job_path(job_id)) as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return self._reconcile(job)
+
+    def _reconcile(self, job):
+        """
+        งานที่ค้าง queued / running ของ process ที่ตายไปแล้ว (worker ถูก restart) ไม่มีวันเสร็จ
+        -> บันทึกเป็น failed ไม่ให้ client poll ค้าง และไม่ให้ gauge queued/running โตไปเรื่อยๆ
+        """
+        if job["status"] not in ("queued", "running"):
+            return job
+        pid = job.get("pid")
+        if pid:
+            if pid == os.getpid() or _pid_alive(pid):
+                return job
+        elif (job["submitted_at"] or 0) > time.time() - self.result_ttl:
+            return job  # ไฟล์รุ่นก่อนที่ไม่มี pid: ถือว่าค้างเมื่อเก่ากว่า result_ttl
+        job.update(status="failed", error=f"Worker process {pid or '?'} exited before the job finished",
+                   finished_at=time.time())
+        self._persist(job)
+        return job
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # มี process นี้อยู่ (ของ user อื่น)
+    return True
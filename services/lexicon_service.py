@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import config
+
+# ==========================================
+# Lexicon: แก้คำที่ ASR ถอดผิดให้เป็นคำศัพท์ที่ใกล้ที่สุดใน config.LEXICON_PATH
+# ใช้ index แบบ symmetric delete (SymSpell): เก็บทุกรูปของคำศัพท์ที่ลบตัวอักษรออก <= max_distance ตัว
+# ตอนค้นก็ลบตัวอักษรของคำที่ถอดได้แบบเดียวกัน แล้วดูว่าชนกับรูปไหนใน index -> ได้ผู้สมัครทันที
+# ไม่ต้องเทียบกับคำศัพท์ทุกคำ (เวลาค้นไม่ขึ้นกับขนาด lexicon)
+# - คำสั้นกว่า LEXICON_MIN_LENGTH / มีตัวเลขปน: ไม่แตะ
+# - คำภาษาอังกฤษทั่วไป (config.LEXICON_COMMON_WORDS_PATH): ไม่แตะ แม้จะใกล้คำศัพท์ (black ไม่ใช่ block ที่ถอดผิด)
+# - รูปผันของคำที่รู้จัก (stitch -> stitched / stitching, adjacent -> adjacently): ไม่แตะ เพราะรายการคำไม่มีทุกรูป
+# - ระยะที่ยอมให้แก้: 1 ตัวอักษร (คำยาว < 9) / max_distance (คำยาวกว่านั้น)
+# - มีผู้สมัครที่ใกล้เท่ากันมากกว่า 1 คำ: ไม่แก้ (ไม่เดา)
+# index เก็บเป็น JSON ใน cache/lexicon ตาม hash ของไฟล์คำศัพท์ (เปิดครั้งถัดไปไม่ต้องสร้างใหม่)
+# ==========================================
+
+INDEX_VERSION = 2
+LONG_WORD = 9  # คำยาวตั้งแต่นี้ขึ้นไปยอมให้แก้ได้ถึง max_distance
+
+_TOKEN_RE = re.compile(r"(?<![a-z0-9])[a-z]+(?![a-z0-9])")
+
+# (suffix, สิ่งที่ต่อท้าย stem แทน) ลองตัด suffix แล้วดูว่าเหลือคำที่รู้จักไหม
+_SUFFIXES = [
+    ("ies", "y"), ("ied", "y"), ("ier", "y"), ("iest", "y"), ("ily", "y"), ("ally", ""),
+    ("ing", ""), ("ing", "e"), ("ed", ""), ("ed", "e"), ("es", ""), ("s", ""),
+    ("er", ""), ("er", "e"), ("est", ""), ("est", "e"), ("ly", ""), ("ness", ""), ("ment", ""),
+]
+
+
+def _stems(word):
+    """stem ที่เป็นไปได้ของ word ตามกฎรูปผันภาษาอังกฤษ (stitched -> stitch, stopped -> stop, noted -> note)"""
+    for suffix, repl in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stem = word[:-len(suffix)]
+            if suffix == "s" and stem.endswith("s"):
+                continue  # คำที่ลงท้าย s เติม es ไม่ใช่ s ("extendss" = พิมพ์เกิน ไม่ใช่รูปผัน)
+            yield stem + repl
+            if not repl and len(stem) >= 4 and stem[-1] == stem[-2] and stem[-1] not in "aeiouls":
+                yield stem[:-1]  # ตัวสะกดซ้ำ: stopped -> stop
+
+
+def _deletes(word, max_distance):
+    """ทุกรูปของ word ที่ลบตัวอักษรออก 1..max_distance ตัว"""
+    found, frontier = set(), {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def _distance1(a, b):
+    """distance(a, b, 1) แบบไม่ต้องสร้างตาราง: เทียบตัวอักษรตัวแรกที่ต่างกันแล้วดูส่วนที่เหลือ"""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    i = 0
+    while i < len(b) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        if a[i + 1:] == b[i + 1:]:
+            return 1  # แทน 1 ตัว
+        if a[i + 1:i + 2] == b[i:i + 1] and a[i:i + 1] == b[i + 1:i + 2] and a[i + 2:] == b[i + 2:]:
+            return 1  # สลับ 2 ตัวติดกัน
+        return 2
+    if len(a) == len(b) + 1 and a[i + 1:] == b[i:]:
+        return 1  # เกิน / ขาด 1 ตัว
+    return 2
+
+
+def distance(a, b, limit):
+    """
+    Damerau-Levenshtein (optimal string alignment) คืนค่า limit + 1 ถ้าเกิน limit
+    (คำยาวไม่กี่สิบตัวอักษร คิดทั้งตารางก็เร็วพอ)
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if limit == 1:
+        return _distance1(a, b)
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = ca != cb
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+class Lexicon:
+
+    def __init__(self, terms, max_distance=2, min_length=5, deletes=None, known=()):
+        self.terms = list(dict.fromkeys(terms))
+        self.max_distance = max_distance
+        self.min_length = min_length
+        if deletes is None:
+            deletes = {}
+            for i, term in enumerate(self.terms):
+                for d in _deletes(term, max_distance) | {term}:  # รวมตัวคำเอง: คำที่ถอดเกินมา 1 ตัวก็เจอ
+                    deletes.setdefault(d, []).append(i)
+        self.deletes = deletes
+        # คำที่รู้จักแล้ว (คำศัพท์ + known) / เคยค้นแล้ว -> คำที่ถูกต้อง (ค้นซ้ำ = dict lookup ครั้งเดียว)
+        # known = คำทั่วไปที่สะกดถูกอยู่แล้ว: ผ่านไปตามเดิม แต่ไม่ใช่เป้าหมายของการแก้ (ไม่อยู่ใน index)
+        self._known = {word: word for word in known}
+        self._known.update((term, term) for term in self.terms)
+        self._memo = dict(self._known)
+        self._memo_limit = len(self._memo) + 50000
+
+    # ---------- ค้น ----------
+    def lookup(self, word):
+        """คำศัพท์ที่ใกล้ word ที่สุด (ตัวมันเองถ้ารู้จักอยู่แล้ว / ไม่มีคำที่ใกล้พอ)"""
+        fixed = self._memo.get(word)
+        if fixed is None:
+            fixed = self._lookup(word)
+            if len(self._memo) >= self._memo_limit:
+                self._memo = dict(self._known)
+            self._memo[word] = fixed
+        return fixed
+
+    def _lookup(self, word):
+        if len(word) < self.min_length:
+            return word
+        if any(stem in self._known for stem in _stems(word)):
+            return word  # รูปผันของคำที่รู้จัก สะกดถูกแล้ว
+        limit = self.max_distance if len(word) >= LONG_WORD else 1
+        candidates = set()
+        for d in _deletes(word, limit) | {word}:
+            candidates.update(self.deletes.get(d, ()))
+        best, best_distance, tie = None, limit + 1, False
+        for i in candidates:
+            term = self.terms[i]
+            dist = distance(word, term, limit)
+            if dist < best_distance:
+                best, best_distance, tie = term, dist, False
+            elif dist == best_distance:
+                tie = True
+        if best is None or tie:
+            return word
+        return best
+
+    def correct(self, text):
+        """แก้ทุกคำใน text (ตัวพิมพ์เล็ก) ที่ไม่อยู่ใน lexicon และไม่ใช่คำทั่วไป"""
+        memo = self._memo
+        return _TOKEN_RE.sub(lambda m: memo.get(m.group()) or self.lookup(m.group()), text)
+
+    # ---------- index บน disk ----------
+    def to_dict(self, file_hash=None):
+        return {"version": INDEX_VERSION, "hash": file_hash, "max_distance": self.max_distance,
+                "min_length": self.min_length, "terms": self.terms, "deletes": self.deletes}
+
+    @classmethod
+    def from_dict(cls, entries, known=()):
+        return cls(entries["terms"], entries["max_distance"], entries["min_length"], entries["deletes"], known)
+
+
+def read_terms(path):
+    with open(path) as f:
+        return [line.strip().lower() for line in f if line.strip() and not line.startswith("#")]
+
+
+def _index_path(file_hash):
+    return os.path.join(config.LEXICON_CACHE_FOLDER, f"{file_hash}.json")
+
+
+def load(path, extra_terms=(), max_distance=2, min_length=5, common_path=None):
+    """
+    Lexicon จากไฟล์คำศัพท์ + extra_terms (เช่นคำใน WORD_RULES ที่ parser แก้เองอยู่แล้ว)
+    common_path: รายการคำทั่วไปที่ไม่แก้ (ไม่อยู่ใน index จึงไม่มีผลกับ cache)
+    ใช้ index ที่บันทึกไว้ถ้าไฟล์ / คำเพิ่ม / ค่าตั้งไม่เปลี่ยน ไม่เช่นนั้นสร้างใหม่แล้วบันทึก
+    """
+    known = read_terms(common_path) if common_path else ()
+    terms = read_terms(path) + [t for t in extra_terms if t.isalpha()]
+    file_hash = hashlib.sha256(json.dumps([INDEX_VERSION, terms, max_distance, min_length]).encode()).hexdigest()[:32]
+    index_path = _index_path(file_hash)
+    try:
+        with open(index_path) as f:
+            entries = json.load(f)
+        if entries.get("version") == INDEX_VERSION and entries.get("hash") == file_hash:
+            return Lexicon.from_dict(entries, known)
+    except (OSError, ValueError):
+        pass
+
+    lexicon = Lexicon(terms, max_distance, min_length, known=known)
+    try:
+        os.makedirs(config.LEXICON_CACHE_FOLDER, exist_ok=True)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(lexicon.to_dict(file_hash), f, separators=(",", ":"))
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"Lexicon index write failed: {e}")
+    return lexicon
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon(extra_terms=()):
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                _lexicon = load(config.LEXICON_PATH, extra_terms,
+                                config.LEXICON_MAX_DISTANCE, config.LEXICON_MIN_LENGTH,
+                                config.LEXICON_COMMON_WORDS_PATH)
+    return _lexicon
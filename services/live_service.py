@@ -0,0 +1,176 @@
+import re
+import time
+import numpy as np
+import config
+from services import ai_service, audio_service, metrics_service
+from services.parser_service import extract_specimens, normalize_text
+from services.pipeline_service import diff_specimens, render_report
+
+# ==========================================
+# Live Dictation: ถอดเสียงระหว่างพูด (ไม่ต้องรอพูดจบแล้วอัปโหลดทั้งไฟล์)
+# - เสียงที่ยังไม่ commit (pending) ถอดใหม่ทุก LIVE_STEP_SECONDS = ข้อความชั่วคราว (partial)
+# - เจอช่วงเงียบหลังช่วงพูด = จบประโยค: ถอดช่วงนั้นครั้งสุดท้าย commit แล้วตัดเสียงทิ้ง ไม่ต้องถอดซ้ำ
+# - normalize_text เฉพาะส่วนท้าย (ตั้งแต่ประโยคที่ยังไม่จบ + partial) ประโยคที่จบแล้ว normalize ครั้งเดียวเก็บไว้
+# - extract ใหม่เฉพาะเมื่อข้อความเปลี่ยน ส่งกลับเฉพาะช่องที่ค่าเปลี่ยน (diff)
+# กด stop: เหลือถอดแค่เสียงหลังจุด commit ล่าสุด (ไม่กี่วินาที) แล้วเขียน PDF ได้เลย
+# ไม่ผูกกับ WebSocket (app.py เป็นคนรับ/ส่ง frame) ทดสอบ / ใช้จากที่อื่นได้
+# ==========================================
+
+SAMPLE_RATE = audio_service.SAMPLE_RATE
+COMMIT_PAD_MS = 200  # เผื่อท้ายประโยคตอนตัด ไม่ให้เสียงท้ายคำสุดท้ายหาย
+
+# จุดจบประโยคในข้อความจาก Whisper ("cm. The") ไม่นับจุดทศนิยม ("3.5")
+_SENTENCE_END_RE = re.compile(r"[.!?](?=\s|$)")
+
+
+class LiveSession:
+    """
+    1 session = การพูด 1 ครั้ง
+        session = LiveSession("fast")
+        session.add(frame)            # bytes PCM 16-bit little-endian 16 kHz mono
+        if session.due(): session.step()   -> {"type": "update", "changes": [...], ...}
+        result = session.finish(template_path)  # หลังกด stop (รูปแบบเดียวกับ run_pipeline)
+    """
+
+    def __init__(self, profile=None):
+        self.profile = profile or config.LIVE_DECODE_PROFILE
+        self.options, self.size = ai_service.profile_options(self.profile)  # ชื่อผิด -> ValueError
+        self.pending = np.zeros(0, np.float32)  # เสียงหลังจุด commit ล่าสุด
+        self._frames = []        # frame ที่รับมาแล้วแต่ยังไม่รวมเข้า pending
+        self._new_samples = 0    # เสียงใหม่ตั้งแต่ถอดรอบล่าสุด
+        self.total_samples = 0
+        self.raw_text = ""       # ข้อความที่ commit แล้ว (ยังไม่ normalize)
+        self.partial = ""        # ข้อความชั่วคราวของ pending
+        self._stable = 0         # raw_text[:_stable] จบประโยคแล้ว normalize เก็บไว้ใน _stable_clean
+        self._stable_clean = ""
+        self.transcription = ""
+        self.specimens = []
+        self.timings = {"transcribe": 0.0, "normalize": 0.0, "extract": 0.0}
+
+    # ---------- รับเสียง ----------
+    def add(self, data):
+        if len(data) % 2:
+            raise ValueError("Audio frames must be 16-bit PCM (16 kHz mono)")
+        samples = np.frombuffer(data, "<i2")
+        if self.total_samples + len(samples) > config.LIVE_MAX_SECONDS * SAMPLE_RATE:
+            raise ValueError(f"Dictation is longer than {config.LIVE_MAX_SECONDS} seconds")
+        self._frames.append(samples)
+        self._new_samples += len(samples)
+        self.total_samples += len(samples)
+
+    def due(self):
+        """เสียงใหม่ครบ LIVE_STEP_SECONDS แล้ว ถึงรอบถอด"""
+        return self._new_samples >= config.LIVE_STEP_SECONDS * SAMPLE_RATE
+
+    def step(self):
+        """ถอดเสียงที่ยังไม่ commit คืนค่าข้อความ update ที่ส่งกลับ client"""
+        self._advance(final=False)
+        changes = self._update()
+        return {
+            "type": "update",
+            "committed": self.raw_text,
+            "partial": self.partial,
+            "transcription": self.transcription,
+            "changes": changes,
+            "audio_seconds": round(self.total_samples / SAMPLE_RATE, 2),
+        }
+
+    def finish(self, template_path):
+        """
+        หลังกด stop: ถอดเสียงที่เหลือ -> ดึงข้อมูลครั้งสุดท้าย -> เขียน PDF
+        คืนค่าแบบเดียวกับ run_pipeline (raw_text, transcription, specimens, pdf_bytes, regions, timings ...)
+        """
+        metrics = metrics_service.get_metrics()
+        t0 = time.perf_counter()
+        self._advance(final=True)
+        self._update()
+        if not self.specimens:
+            self.specimens = extract_specimens(self.transcription)
+        t1 = time.perf_counter()
+        with metrics.timer("fill"):
+            pdf_bytes, regions = render_report(template_path, self.specimens)
+        timings = dict(self.timings, fill=time.perf_counter() - t1)
+        timings["finish"] = time.perf_counter() - t0  # กด stop -> PDF พร้อม
+        return {
+            "raw_text": self.raw_text,
+            "transcription": self.transcription,
+            "profile": self.profile,
+            "data": self.specimens[0]["data"],
+            "specimens": self.specimens,
+            "pdf_bytes": pdf_bytes,
+            "regions": regions,
+            "duration": round(self.total_samples / SAMPLE_RATE, 2),
+            "timings": {stage: round(t, 4) for stage, t in timings.items()},
+        }
+
+    # ---------- ถอดเสียง ----------
+    def _advance(self, final):
+        if self._frames:
+            frames = np.concatenate(self._frames).astype(np.float32) / 32768
+            self.pending = np.concatenate([self.pending, frames])
+            self._frames = []
+        self._new_samples = 0
+        n = len(self.pending)
+        regions = audio_service.speech_regions(self.pending, SAMPLE_RATE, min_silence_ms=config.LIVE_MIN_SILENCE_MS)
+        if not regions:
+            # เงียบทั้งหมด: ไม่ต้องถอด เก็บไว้แค่ท้ายๆ เผื่อเสียงคำแรกที่เพิ่งเริ่ม
+            self.pending = self.pending[-int(config.LIVE_MIN_SILENCE_MS * SAMPLE_RATE / 1000):]
+            self.partial = ""
+            return
+
+        if final:
+            cut = n
+        else:
+            # ช่วงพูดที่มีช่วงเงียบตามหลังแล้ว (ช่วงที่ยังพูดอยู่จะจบที่ท้าย buffer พอดี)
+            closed = [end for _, end in regions if end < n]
+            cut = min(closed[-1] + int(COMMIT_PAD_MS * SAMPLE_RATE / 1000), n) if closed else 0
+            if not cut and n > config.LIVE_WINDOW_SECONDS * SAMPLE_RATE:
+                # พูดยาวเกินหน้าต่างโดยไม่หยุดเลย: ตัดที่ช่วงเงียบที่สั้นกว่านั้น (ไม่มีก็ตัดตรงๆ)
+                cut = audio_service.split_on_silence(self.pending, SAMPLE_RATE, config.LIVE_WINDOW_SECONDS, pad_ms=0)[0][1]
+
+        if cut:
+            text = self._transcribe(self.pending[:cut]).strip()
+            if text:
+                self.raw_text = f"{self.raw_text} {text}".strip()
+            self.pending = self.pending[cut:]
+        # ข้อความชั่วคราว: ถอดเฉพาะถ้ายังมีเสียงพูดหลังจุดตัด
+        if not final and any(end > cut for _, end in regions):
+            self.partial = self._transcribe(self.pending).strip()
+        else:
+            self.partial = ""
+
+    def _transcribe(self, samples):
+        options = dict(self.options)
+        if self.raw_text:
+            # ต่อท้ายข้อความที่ commit แล้วใน prompt: ท่อนถัดไปสะกด/เว้นวรรคต่อเนื่องกัน
+            prompt = f"{options.get('initial_prompt', '')} {self.raw_text[-config.LIVE_PROMPT_CHARS:]}"
+            options["initial_prompt"] = prompt.strip()
+        t0 = time.perf_counter()
+        with metrics_service.get_metrics().timer("live_transcribe"):
+            result = ai_service.transcribe_samples(samples, options, self.size)
+        self.timings["transcribe"] += time.perf_counter() - t0
+        return result["text"]
+
+    # ---------- ข้อความ -> ข้อมูล ----------
+    def _update(self):
+        """normalize เฉพาะส่วนท้ายที่เปลี่ยน แล้ว extract ใหม่ถ้าข้อความเปลี่ยน คืนค่า diff รายช่อง"""
+        t0 = time.perf_counter()
+        end = self._stable
+        for m in _SENTENCE_END_RE.finditer(self.raw_text, self._stable):
+            end = m.end()
+        if end > self._stable:
+            # ประโยคที่เพิ่งจบ: normalize ครั้งสุดท้าย (กฎของ normalize_text ไม่ข้ามจุดจบประโยค)
+            self._stable_clean = f"{self._stable_clean} {normalize_text(self.raw_text[self._stable:end]).strip()}".strip()
+            self._stable = end
+        tail = normalize_text(f"{self.raw_text[self._stable:]} {self.partial}").strip()
+        text = f"{self._stable_clean} {tail}".strip()
+        t1 = time.perf_counter()
+        self.timings["normalize"] += t1 - t0
+        if text == self.transcription and self.specimens:
+            return []
+
+        specimens = extract_specimens(text)
+        self.timings["extract"] += time.perf_counter() - t1
+        changes = diff_specimens(self.specimens, specimens)
+        self.transcription, self.specimens = text, specimens
+        return changes
@@ -0,0 +1,186 @@
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+import config
+
+# ==========================================
+# Metrics (Prometheus text format) สำหรับ /metrics
+# gunicorn มีหลาย worker process: แต่ละ process เขียนค่าของตัวเองลงไฟล์ <pid>.json
+# ตอน scrape จะรวมทุกไฟล์ ไม่ว่า request จะไปตกที่ worker ตัวไหนก็ได้ตัวเลขรวมเหมือนกัน
+# ==========================================
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+AUDIO_BUCKETS = (5, 10, 30, 60, 120, 300, 600, 1200)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    "pathology_stage_duration_seconds": ("Latency of each pipeline stage (upload, transcribe, normalize, extract, fill, live_transcribe, live_finish)", STAGE_BUCKETS),
+    "pathology_audio_duration_seconds": ("Duration of transcribed audio", AUDIO_BUCKETS),
+    "pathology_realtime_factor": ("Transcription time divided by audio duration (lower is faster)", RTF_BUCKETS),
+}
+# name -> help
+COUNTERS = {
+    "pathology_jobs_total": "Finished jobs by status",
+    "pathology_audio_seconds_total": "Total seconds of audio transcribed by Whisper (cache misses)",
+    "pathology_transcribe_seconds_total": "Total seconds spent in Whisper transcription (cache misses)",
+}
+
+
+def _label_key(labels):
+    return ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+class Metrics:
+
+    def __init__(self, store_dir, role="web"):
+        self.store_dir = store_dir
+        self.role = role  # web = web worker / inference = Inference Worker (ถือโมเดล Whisper)
+        self.path = os.path.join(store_dir, f"{os.getpid()}.json")
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def observe(self, name, value, **labels):
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            series = self.histograms.setdefault(name, {}).setdefault(
+                _label_key(labels), {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+            self._flush()
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+            self._flush()
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("pathology_stage_duration_seconds", time.perf_counter() - t0, stage=stage)
+
+    def _flush(self):
+        # เขียนทั้งก้อนแบบ atomic (ไฟล์เล็ก เขียนไม่กี่ครั้งต่องาน)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"pid": os.getpid(), "role": self.role, "histograms": self.histograms,
+                       "counters": self.counters}, f)
+        os.replace(tmp_path, self.path)
+
+
+_metrics = None
+_metrics_pid = None
+
+
+def get_metrics():
+    """Metrics ของ process นี้ (สร้างใหม่หลัง fork แต่ละ worker เขียนไฟล์ของตัวเอง)"""
+    global _metrics, _metrics_pid
+    if _metrics is None or _metrics_pid != os.getpid():
+        _metrics = Metrics(config.METRICS_FOLDER)
+        _metrics_pid = os.getpid()
+    return _metrics
+
+
+def announce(role):
+    """
+    เขียน snapshot ของ process นี้ทันที (ยังไม่มีค่าอะไร) ให้ /metrics เห็น process นี้ด้วย
+    ใช้กับ Inference Worker: ไม่มี counter ของตัวเอง แต่เป็น process ที่ถือโมเดล (หน่วยความจำส่วนใหญ่)
+    """
+    metrics = get_metrics()
+    with metrics._lock:
+        metrics.role = role
+        metrics._flush()
+
+
+def reset():
+    """ลบค่าของรอบก่อน (เรียกครั้งเดียวตอนเริ่ม server ก่อน fork worker)"""
+    for path in glob.glob(os.path.join(config.METRICS_FOLDER, "*.json")):
+        try: os.remove(path)
+        except OSError: pass
+
+
+def process_rss(pid):
+    """Resident memory (bytes) ของ process จาก /proc (Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def _load_snapshots():
+    snapshots = []
+    for path in glob.glob(os.path.join(config.METRICS_FOLDER, "*.json")):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def render(gauges=None):
+    """
+    รวมค่าจากทุก process แล้วคืนค่าเป็น Prometheus text format
+    counter / histogram ของ worker ที่ตายไปแล้วยังนับรวม (ค่าสะสมต้องไม่ลดลง)
+    gauges = {name: (help, value)} ค่าปัจจุบันที่ผู้เรียกคำนวณตอน scrape
+    """
+    histograms, counters, pids = {}, {}, {os.getpid(): "web"}  # pid -> role
+    for snap in _load_snapshots():
+        pids[snap["pid"]] = snap.get("role", "web")
+        for name, series in snap.get("histograms", {}).items():
+            for key, s in series.items():
+                total = histograms.setdefault(name, {}).setdefault(
+                    key, {"buckets": [0] * len(s["buckets"]), "sum": 0.0, "count": 0})
+                total["buckets"] = [a + b for a, b in zip(total["buckets"], s["buckets"])]
+                total["sum"] += s["sum"]
+                total["count"] += s["count"]
+        for name, series in snap.get("counters", {}).items():
+            for key, value in series.items():
+                counters.setdefault(name, {})
+                counters[name][key] = counters[name].get(key, 0) + value
+
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for key, s in sorted(histograms.get(name, {}).items()):
+            prefix = f"{key}," if key else ""
+            for bound, count in zip(buckets, s["buckets"]):
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {s["count"]}')
+            labels = f"{{{key}}}" if key else ""
+            lines.append(f"{name}_sum{labels} {s['sum']}")
+            lines.append(f"{name}_count{labels} {s['count']}")
+
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for key, value in sorted(counters.get(name, {}).items()):
+            lines.append(f"{name}{{{key}}} {value}" if key else f"{name} {value}")
+
+    for name, (help_text, value) in (gauges or {}).items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+
+    # หน่วยความจำของทุก process ที่ยังมีชีวิต (โมเดล Whisper อยู่ใน role="inference" ถ้าเปิด Inference Worker)
+    lines += ["# HELP process_resident_memory_bytes Resident memory of each live server process",
+              "# TYPE process_resident_memory_bytes gauge"]
+    for pid, role in sorted(pids.items()):
+        rss = process_rss(pid)
+        if rss is not None:
+            lines.append(f'process_resident_memory_bytes{{pid="{pid}",role="{role}"}} {rss}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,153 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+import config
+
+# ==========================================
+# Output Store: เก็บ PDF ที่สร้างแล้ว ตั้งชื่อตาม hash ของเนื้อหา (รายงานเหมือนกัน = ไฟล์เดียวกัน)
+# - ไฟล์ล่าสุดเก็บไว้ใน RAM ด้วย ตอนดาวน์โหลดไม่ต้องอ่านดิสก์
+# - ลบไฟล์เก่าตามอายุ และตามขนาดรวม (ไฟล์ที่ไม่ได้ใช้นานที่สุดออกก่อน)
+# - ข้อมูลประกอบของรายงาน (เช่นตำแหน่งที่เขียนสำหรับ preview) เก็บคู่กันเป็น <hash>.json
+# ==========================================
+
+
+class OutputStore:
+
+    def __init__(self, folder, max_bytes, max_age, memory_bytes, evict_interval=60):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.memory_bytes = memory_bytes
+        self.evict_interval = evict_interval
+        self._memory = collections.OrderedDict()  # name -> (bytes, mtime)
+        self._memory_size = 0
+        self._last_evict = 0
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def put(self, pdf_bytes, meta=None):
+        """เก็บ PDF (และ meta ถ้าส่งมา) คืนค่าชื่อไฟล์ (<sha256>.pdf)"""
+        name = hashlib.sha256(pdf_bytes).hexdigest()[:32] + ".pdf"
+        path = self.path(name)
+        if os.path.exists(path):
+            os.utime(path)  # เนื้อหาเดิม: แค่ต่ออายุ
+        else:
+            self._write(path, pdf_bytes)
+        if meta is not None and not os.path.exists(self._meta_path(name)):
+            self._write(self._meta_path(name), json.dumps(meta).encode("utf-8"))
+        self._remember(name, pdf_bytes, time.time())
+        self._maybe_evict()
+        return name
+
+    def get(self, name):
+        """คืนค่า (bytes หรือ None, path, mtime) ถ้าไม่มีไฟล์คืนค่า None"""
+        with self._lock:
+            cached = self._memory.get(name)
+            if cached:
+                self._memory.move_to_end(name)
+        path = self.path(name)
+        if cached:
+            return cached[0], path, cached[1]
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        return None, path, mtime
+
+    def get_meta(self, name):
+        """meta ที่เก็บคู่กับรายงาน (None ถ้าไม่มี)"""
+        try:
+            with open(self._meta_path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def touch(self, name):
+        # ใช้งานอยู่ -> ยังไม่ให้ถูกลบตามอายุ / LRU
+        try: os.utime(self.path(name))
+        except OSError: pass
+
+    def path(self, name):
+        return os.path.join(self.folder, os.path.basename(name))
+
+    def _meta_path(self, name):
+        return os.path.splitext(self.path(name))[0] + ".json"
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _remember(self, name, pdf_bytes, mtime):
+        if len(pdf_bytes) > self.memory_bytes:
+            return
+        with self._lock:
+            if name in self._memory:
+                self._memory.move_to_end(name)
+                return
+            self._memory[name] = (pdf_bytes, mtime)
+            self._memory_size += len(pdf_bytes)
+            while self._memory_size > self.memory_bytes:
+                _, (old, _) = self._memory.popitem(last=False)
+                self._memory_size -= len(old)
+
+    def _forget(self, name):
+        with self._lock:
+            cached = self._memory.pop(name, None)
+            if cached:
+                self._memory_size -= len(cached[0])
+
+    def _maybe_evict(self):
+        # สแกนโฟลเดอร์ไม่เกินนาทีละครั้ง
+        now = time.time()
+        if now - self._last_evict < self.evict_interval:
+            return
+        self._last_evict = now
+        self.evict()
+
+    def evict(self):
+        """ลบไฟล์ที่หมดอายุ แล้วลบไฟล์ที่ไม่ได้ใช้นานที่สุดจนขนาดรวมไม่เกิน max_bytes"""
+        files = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and entry.name.endswith(".pdf"):
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.name))
+        files.sort()
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, name in files:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                continue
+            try: os.remove(self._meta_path(name))
+            except OSError: pass
+            self._forget(name)
+            total -= size
+            removed += 1
+        if removed:
+            print(f"Output store: removed {removed} old reports")
+        return removed
+
+
+_store = None
+_store_pid = None
+
+
+def get_store():
+    """Store ของ process นี้ (สร้างใหม่หลัง fork ให้แต่ละ worker มี RAM cache ของตัวเอง)"""
+    global _store, _store_pid
+    if _store is None or _store_pid != os.getpid():
+        _store = OutputStore(config.OUTPUT_FOLDER,
+                             max_bytes=config.OUTPUT_MAX_MB * 1024 * 1024,
+                             max_age=config.OUTPUT_MAX_AGE_DAYS * 86400,
+                             memory_bytes=config.OUTPUT_MEMORY_MB * 1024 * 1024)
+        _store_pid = os.getpid()
+    return _store
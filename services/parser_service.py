@@ -1,62 +1,304 @@
+import bisect
 import re
+import config
+from services import lexicon_service
 
-def normalize_text(text):
-    text = text.lower()
-    text = re.sub(r"\s+", " ", text)
-    
+# ==========================================
+# 📖 ตารางกฎสำหรับ normalize_text (compile ครั้งเดียวตอน import)
+# ==========================================
+NUM_WORDS = { "zero":"0", "one":"1", "two":"2", "three":"3", "four":"4", "five":"5", "six":"6", "seven":"7", "eight":"8", "nine":"9", "ten":"10" }
+
+# แทนเฉพาะ "ทั้งคำ" เท่านั้น (เดิมใช้ str.replace ทำให้ "mastectomy" กลายเป็น "massectomy")
+WORD_RULES = {
     # Standardize formatting
-    text = re.sub(r"\bpoint\b", ".", text)
-    text = re.sub(r"\bdash\b", "-", text)
-    text = re.sub(r"\bto\b", "-", text) 
-    text = text.replace("equal", "=")
-    
+    "point": ".", "dash": "-", "to": "-", "equal": "=", "equals": "=",
     # Fix ASR Errors common in pathology
-    text = text.replace("mast", "mass")
-    text = text.replace("medium", "medial")
-    text = text.replace("receptive", "resected")
-    text = text.replace("recepted", "resected")
-    text = text.replace("averted", "everted")
-    text = text.replace("infutreative", "infiltrative")
-    
+    "mast": "mass",
+    "medium": "medial",
+    "receptive": "resected",
+    "recepted": "resected",
+    "averted": "everted",
+    "infutreative": "infiltrative",
     # Word to Number
-    NUM_WORDS = { "zero":"0", "one":"1", "two":"2", "three":"3", "four":"4", "five":"5", "six":"6", "seven":"7", "eight":"8", "nine":"9", "ten":"10" }
-    for k, v in NUM_WORDS.items(): text = re.sub(rf"\b{k}\b", v, text)
-    
-    text = text.replace("centimeters", "cm").replace("millimeter", "mm")
-    
-    # Fix Dimensions format (3 by 4 -> 3 x 4)
-    while " by " in text: text = text.replace(" by ", " x ")
-    text = re.sub(r"(\d+(?:\.\d+)?)\s*(?:x)\s*(\d+(?:\.\d+)?)", r"\1 x \2", text)
-    
-    return text
+    **NUM_WORDS,
+}
+
+# หน่วยวัด: ยอมให้ติดกับตัวเลขได้ ("5centimeters" -> "5cm")
+UNIT_RULES = {"centimeters": "cm", "centimeter": "cm", "millimeters": "mm", "millimeter": "mm"}
+
+_NUMBER = r"(?<!\d)\d+(?:\.\d+)?|\b(?:" + "|".join(NUM_WORDS) + r")\b"
+
+# รวมทุกกฎเป็น regex เดียว แล้ววิ่งผ่านข้อความรอบเดียว (linear time)
+#   dim  : "3 by 4", "three x four", "3x4" -> "3 x 4"
+#   word : คำในตาราง WORD_RULES
+#   unit : หน่วยในตาราง UNIT_RULES
+#   by   : " by " ที่เหลือ -> " x "
+#   ws   : ช่องว่างหลายตัว/tab/newline -> " " (เว้นวรรคเดียวไม่ต้องแก้ ไม่ต้องเรียก callback)
+_REWRITE_RE = re.compile(
+    rf"(?P<dim_a>{_NUMBER})(?:\s*x\s*|\s+by\s+)(?P<dim_b>{_NUMBER})"
+    r"|\b(?P<word>" + "|".join(sorted(WORD_RULES, key=len, reverse=True)) + r")\b"
+    r"|(?<![a-z])(?P<unit>" + "|".join(sorted(UNIT_RULES, key=len, reverse=True)) + r")\b"
+    r"|(?P<by>(?<=\s)by(?=\s))"
+    r"|(?P<ws> \s+|[^\S ]\s*)"
+)
+
+
+def _rewrite(m):
+    kind = m.lastgroup
+    if kind == "dim_b":
+        a, b = m.group("dim_a"), m.group("dim_b")
+        return f"{NUM_WORDS.get(a, a)} x {NUM_WORDS.get(b, b)}"
+    if kind == "word":
+        return WORD_RULES[m.group("word")]
+    if kind == "unit":
+        return UNIT_RULES[m.group("unit")]
+    if kind == "by":
+        return "x"
+    return " "
+
+
+# คำที่กฎด้านบนจัดการเองอยู่แล้ว: Lexicon ต้องรู้จัก (ไม่อย่างนั้น "recepted" อาจถูกแก้เป็นคำอื่นก่อนถึงกฎ)
+LEXICON_EXTRA_TERMS = sorted({w for rules in (WORD_RULES, UNIT_RULES) for pair in rules.items() for w in pair})
+
+
+def normalize_text(text):
+    text = text.lower()
+    if config.LEXICON_CORRECTION:
+        text = lexicon_service.get_lexicon(LEXICON_EXTRA_TERMS).correct(text)
+    return _REWRITE_RE.sub(_rewrite, text)
+
+# ==========================================
+# 📋 ตารางกฎสำหรับ extract_data (compile ครั้งเดียวตอน import)
+# ==========================================
+# ถ้าไม่มีคำศัพท์เกี่ยวกับเต้านมเลย ให้คืนค่าว่างทันที (แก้ปัญหาเรื่องไต)
+REQUIRED_KEYWORDS = ["breast", "mastectomy", "nipple", "skin ellipse"]
+
+# (list ปลายทาง, ค่าที่ใส่, เจอคำใดคำหนึ่ง, กลุ่ม)
+# กฎที่อยู่กลุ่มเดียวกันจะเลือกแค่กฎแรกที่เจอ (เหมือน if / elif)
+FLAG_RULES = [
+    # 🔴 กฎเหล็ก: ต้องมีคำว่า "infiltrative" / "well-defined" เท่านั้น
+    ("checks", "infiltrative", ["infiltrative"], None),
+    ("checks", "well-defined", ["well-defined", "well defined"], None),
+    # --- Circles ---
+    ("circles", "right", ["right"], "side"),
+    ("circles", "left", ["left"], "side"),
+    ("circles", "lower", ["lower"], None),
+    ("circles", "upper", ["upper"], None),
+    ("circles", "outer", ["outer"], None),
+    ("circles", "inner", ["inner"], None),
+    ("checks", "in ( upper / lower", ["lower outer", "upper outer", "lower inner", "upper inner"], None),
+    ("circles", "is a", ["is a", "is an"], "count"),
+    ("circles", "are", ["there are"], "count"),
+    ("circles", "two", ["two"], "count"),
+    ("circles", "are multiple", ["multiple"], "count"),
+    # --- Checkboxes ---
+    ("checks", "modified radical mastectomy", ["modified radical"], None),
+    ("checks", "simple mastectomy", ["simple mastectomy"], None),
+    # --- Nipple ---
+    ("checks", "shows inverted", ["inverted", "retracted"], None),
+    ("checks", "is everted", ["everted", "protruding"], None),
+    ("checks", "shows ulceration", ["ulceration", "eroded"], None),
+    ("checks", "appears normal", ["appears normal"], None),
+    ("checks", "is unremarkable", ["unremarkable"], None),
+]
+NIPPLE_CHECKS = ["shows inverted", "is everted", "shows ulceration"]
+
+# (field, เจอคำใดคำหนึ่ง, คำที่ใช้หาตำแหน่งตัวเลข)
+DIMENSION_RULES = [
+    ("mass_infiltrative", ["infiltrative"], "infiltrative"),
+    ("mass_welldefined", ["well-defined", "well defined"], "well"),  # หาใกล้ๆ คำว่า well
+]
+
+# (ชื่อช่องใน PDF, คำที่ใช้หา (ลองตามลำดับ), ต้องมีคำว่า from ไหม)
+MARGIN_RULES = [
+    ("deep margin", ["deep"], False),
+    ("superior margin", ["superior"], False),
+    ("inferior margin", ["inferior"], False),
+    ("medial margin", ["medial", "media", "medium"], False),
+    ("lateral margin", ["lateral"], False),
+    ("skin", ["skin"], True),  # Skin margin pattern is tricky
+]
+
+# (ชื่อ section, คำที่ใช้หา, ห้ามมีคำเหล่านี้ใน 30 ตัวอักษรก่อนหน้า, รูปแบบผลลัพธ์)
+SECTION_RULES = [
+    ("nipple", ["nipple"], [], "{}"),
+    ("deep", ["resected margin"], ["inferior", "superior", "nearest"], "{}"),
+    ("nearest", ["inferior", "nearest"], [], "{} (Inferior)"),
+]
+MASS_SECTION_KEYWORDS = ["mass", "mast"]
+
+_KEYWORDS = sorted({
+    kw
+    for kws in (
+        REQUIRED_KEYWORDS,
+        ["specimen", "measuring", "skin", "ellipse", "excis", "measure", "well", "ratio", "approximately"],
+        [kw for _, _, kws, _ in FLAG_RULES for kw in kws],
+        [kw for _, kws, _ in DIMENSION_RULES for kw in kws],
+        [kw for _, _, kw in DIMENSION_RULES],
+        [kw for _, kws, _ in MARGIN_RULES for kw in kws],
+        [kw for _, kws, bad, _ in SECTION_RULES for kw in kws + bad],
+        MASS_SECTION_KEYWORDS,
+    )
+    for kw in kws
+}, key=len, reverse=True)
+
+# คำที่ขึ้นต้นตำแหน่งเดียวกัน (เช่น "lower" กับ "lower outer") regex จับได้แค่คำยาวสุด
+# จึงเก็บไว้ว่าคำยาวแต่ละคำครอบคำสั้นคำไหนบ้าง
+_KEYWORD_PREFIXES = {kw: [k for k in _KEYWORDS if kw.startswith(k)] for kw in _KEYWORDS}
+
+_DIM = r"(\d+(?:\.\d+)?)"
+
+# ตัวเลขขนาด (3D/2D), รหัส section (A1-1) และตำแหน่งของทุก keyword: ผ่านข้อความชนิดละรอบ
+# แยกกันเพราะรวมเป็น regex เดียวแล้วตัวที่เจอก่อนกินข้อความของอีกชนิด
+# ("measuring a 25 x 20 x 15" -> รหัส A2-5 แล้วเหลือขนาดแค่ 20 x 15)
+_DIMS_RE = re.compile(rf"{_DIM}\s*x\s*{_DIM}(?:\s*x\s*{_DIM})?")
+_CODE_RE = re.compile(r"a\s*(\d+)[-\s]*(\d+)")
+_KEYWORD_RE = re.compile(r"(?=(" + "|".join(re.escape(k) for k in _KEYWORDS) + r"))")
+
+# ค่า margin หน้าคำว่า deep/superior/... (คำละ pattern) ใช้ตัวที่เจอหลังสุดในข้อความ
+_MARGIN_PATTERNS = {
+    term: re.compile(r"([xX\d]*\.?\d+|[xX])\s*(?:cm)?\s*" + (r"from" if needs_from else r"(?:from)?")
+                     + r"\s*[a-z\s]{0,25}\s*" + re.escape(term))
+    for _, terms, needs_from in MARGIN_RULES for term in terms
+}
+
+_NIPPLE_PHRASE_RE = re.compile(r"nipple\s*(?:is|shows|appears)?\s*([a-z\s]+)")
+_RATIO_RE = re.compile(r"ratio.*?approximately.*?(\d+).*?(\d+)")
+_RANGE_SEP_RE = re.compile(r"\s*(?:-|to)\s*")
+
+
+class TextIndex:
+    """
+    ตำแหน่งของ keyword / ตัวเลขขนาด / รหัส section ทั้งหมดในข้อความ
+    สร้างครั้งเดียวต่อ transcript แล้วกฎทุกข้อใช้ร่วมกัน (ไม่ต้องสแกนข้อความซ้ำ)
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.positions = {}   # keyword -> [start, ...] (เรียงจากน้อยไปมาก)
+        self.dims = []        # (start, end, ('3', '4', '5') หรือ ('3', '4'))
+        self.codes = []       # (start, end, 'A1-1')
+        for m in _KEYWORD_RE.finditer(text):
+            for k in _KEYWORD_PREFIXES[m.group(1)]:
+                self.positions.setdefault(k, []).append(m.start())
+        for m in _DIMS_RE.finditer(text):
+            self.dims.append((m.start(), m.end(), m.groups() if m.group(3) else m.group(1, 2)))
+        for m in _CODE_RE.finditer(text):
+            self.codes.append((m.start(), m.end(), f"A{m.group(1)}-{m.group(2)}"))
+        self._code_ends = [end for _, end, _ in self.codes]
+
+    def has(self, *keywords):
+        return any(k in self.positions for k in keywords)
+
+    def find(self, keyword):
+        return self.positions.get(keyword, [])
+
+    def first(self, keyword, start=0):
+        positions = self.find(keyword)
+        i = bisect.bisect_left(positions, start)
+        return positions[i] if i < len(positions) else None
+
+    def first_dims(self, start, end, size=None):
+        """ตัวเลขขนาดชุดแรกในช่วง [start, end) (เหมือน findall บน text[start:end])"""
+        i = bisect.bisect_left(self.dims, (start,))
+        while i < len(self.dims) and self.dims[i][0] < end:
+            d_start, d_end, dims = self.dims[i]
+            if d_end > end:
+                # ชุดที่คร่อมท้ายช่วง: เหลือเท่าที่อยู่ในช่วง ("4 x 3.7" ตัดที่ "4 x 3")
+                m = _DIMS_RE.match(self.text, d_start, end)
+                dims = (m.groups() if m.group(3) else m.group(1, 2)) if m else ()
+            if dims and (size is None or len(dims) == size):
+                return dims
+            i += 1
+        return None
+
+    def dims_near(self, keyword, search_range=100):
+        start_idx = self.first(keyword)
+        if start_idx is None:
+            return None
+        end_idx = start_idx + search_range
+        dims = self.first_dims(start_idx, end_idx, 3)
+        if dims:
+            return dims  # คืนค่าเป็น tuple ('3', '4', '5')
+        dims = self.first_dims(start_idx, end_idx)
+        if dims:
+            return (dims[0], dims[1], "")  # คืนค่า ('3', '4', '')
+        return None
+
+    def last_code_before(self, pos, range_chars):
+        """รหัส section ตัวสุดท้ายที่อยู่ก่อนตำแหน่ง pos ไม่เกิน range_chars ตัวอักษร"""
+        i = bisect.bisect_right(self._code_ends, pos) - 1
+        if i >= 0 and self.codes[i][0] >= pos - range_chars:
+            return self.codes[i][2]
+        return None
+
+    def find_code(self, keywords, range_chars=150, forbidden_pre=()):
+        matches_found = []
+        for kw in keywords:
+            for pos in self.find(kw):
+                if any(self._occurs_within(bad, pos - 30, pos) for bad in forbidden_pre): continue
+                code = self.last_code_before(pos, range_chars)
+                if code:
+                    matches_found.append(code)
+        return matches_found[-1] if matches_found else None
+
+    def _occurs_within(self, keyword, start, end):
+        p = self.first(keyword, max(0, start))
+        return p is not None and p + len(keyword) <= end
+
 
 def extract_dimensions_near(keyword, text, search_range=100):
     """
     ฟังก์ชันค้นหาตัวเลขขนาด (Dimensions) ที่อยู่ใกล้กับ Keyword ที่กำหนดเท่านั้น
     """
-    if keyword not in text:
-        return None
-    
-    # หาตำแหน่งของ keyword
-    match = re.search(keyword, text)
-    if not match: return None
-    
-    start_idx = match.start()
-    # ตัดข้อความมาดูเฉพาะช่วงใกล้ๆ (หน้า-หลัง 100 ตัวอักษร)
-    snippet = text[start_idx : start_idx + search_range]
-    
-    # หา 3D (A x B x C)
-    dims_3d = re.findall(r"(\d+(?:\.\d+)?)\s*x\s*(\d+(?:\.\d+)?)\s*x\s*(\d+(?:\.\d+)?)", snippet)
-    if dims_3d:
-        return dims_3d[0] # คืนค่าเป็น tuple ('3', '4', '5')
-        
-    # หา 2D (A x B)
-    dims_2d = re.findall(r"(\d+(?:\.\d+)?)\s*x\s*(\d+(?:\.\d+)?)", snippet)
-    if dims_2d:
-        return (dims_2d[0][0], dims_2d[0][1], "") # คืนค่า ('3', '4', '')
-        
+    index = TextIndex(text)
+    if keyword not in index.positions:
+        # keyword ที่ไม่อยู่ในตารางกฎ
+        match = re.search(keyword, text)
+        if not match: return None
+        index.positions[keyword] = [match.start()]
+    return index.dims_near(keyword, search_range)
+
+
+def _last_match(pattern, text, pos=0, endpos=None):
+    m = None
+    for m in pattern.finditer(text, pos, len(text) if endpos is None else endpos):
+        pass
+    return m
+
+
+def _extract_margin(index, search_terms):
+    text = index.text
+    for term in search_terms:
+        positions = index.find(term)
+        if not positions: continue
+        # ", " / ". " อยู่ในค่า margin ไม่ได้ -> match ไม่คร่อมจุดนี้ สแกนจากตรงนี้ได้ผลเหมือนสแกนทั้งข้อความ
+        # (ไม่เจอค่อยสแกนส่วนที่เหลือด้านหน้า)
+        cut = max(text.rfind(". ", 0, positions[-1]), text.rfind(", ", 0, positions[-1])) + 1
+        m = _last_match(_MARGIN_PATTERNS[term], text, cut)
+        if m is None and cut:
+            m = _last_match(_MARGIN_PATTERNS[term], text, 0, cut)
+        if m:
+            val = m.group(1)
+            if val.replace('.','',1).isdigit() and val.startswith("."): val = "0" + val
+            return val
+    return None
+
+
+def _mass_section_range(index):
+    # "A2-1 to A4-1 ... mass" -> รหัสสองตัวติดกันคั่นด้วย - / to และมีคำว่า mass ตามหลัง
+    text = index.text
+
+    def label(start, end, code):
+        # รหัสที่ตัวเลขติดกัน ("a 15") แยกเป็น A1-5 ไม่ได้แน่ชัด: แสดงตามที่พูดเหมือนเดิม
+        return code if len(re.findall(r"\d+", text[start:end])) >= 2 else text[start:end]
+
+    for (start_a, end_a, code_a), (start_b, end_b, code_b) in zip(index.codes, index.codes[1:]):
+        if _RANGE_SEP_RE.fullmatch(text, end_a, start_b) and index.first("mass", end_b) is not None:
+            return f"{label(start_a, end_a, code_a)} to {label(start_b, end_b, code_b)}"
     return None
 
+
 def extract_data(text):
     data = { 
         "circles": [], "checks": [], "margins": {}, "sections": {},
@@ -65,13 +307,12 @@ def extract_data(text):
         "ratio": None,
         "nipple_other": None
     }
+    index = TextIndex(text)
 
     # ==========================================
     # 🛡️ 1. SAFETY CHECK: เช็คก่อนว่าเป็นเรื่องเต้านมไหม?
     # ==========================================
-    # ถ้าไม่มีคำศัพท์เกี่ยวกับเต้านมเลย ให้คืนค่าว่างทันที (แก้ปัญหาเรื่องไต)
-    required_keywords = ["breast", "mastectomy", "nipple", "skin ellipse"]
-    if not any(k in text for k in required_keywords):
+    if not index.has(*REQUIRED_KEYWORDS):
         print("⚠️ Warning: ข้อความดูเหมือนไม่ใช่เรื่อง Breast Cancer (ข้ามการสกัดข้อมูล)")
         return data # คืนค่าว่างๆ ไปเลย
 
@@ -80,141 +321,115 @@ def extract_data(text):
     # ==========================================
 
     # --- Specimen ---
-    # หาเลขที่อยู่ใกล้คำว่า "specimen" หรือ "measuring" หรือ "mastectomy"
-    # แต่ต้องอยู่ช่วงต้นๆ ของประโยค
-    if "specimen" in text or "measuring" in text:
-        # ใช้ regex หาเลขชุดแรกของเอกสาร (มักจะเป็น Specimen)
-        # แต่ต้องระวังไม่ให้ไปเอาเลขของ mass
-        first_part = text[:150] # ดูแค่ 150 ตัวแรก
-        dims = re.findall(r"(\d+(?:\.\d+)?)\s*x\s*(\d+(?:\.\d+)?)\s*x\s*(\d+(?:\.\d+)?)", first_part)
-        if dims:
-            data["specimen"] = dims[0]
+    # ใช้เลขชุดแรกของเอกสาร (มักจะเป็น Specimen) ดูแค่ 150 ตัวแรก กันไปเอาเลขของ mass
+    if index.has("specimen", "measuring"):
+        data["specimen"] = index.first_dims(0, 150, 3)
 
     # --- Skin Ellipse ---
-    if "skin" in text and ("ellipse" in text or "excis" in text):
-        # หาคำว่า skin ellipse แล้วมองหาเลขต่อท้าย
-        match = re.search(r"skin.*?(?:ellipse|measure).*?(\d+(?:\.\d+)?)\s*x\s*(\d+(?:\.\d+)?)", text)
-        if match:
-            data["skin"] = match.groups()
-
-    # --- Infiltrative Mass ---
-    # 🔴 กฎเหล็ก: ต้องมีคำว่า "infiltrative" เท่านั้น ถึงจะดึงเลขใส่ช่องนี้
-    if "infiltrative" in text:
-        data["checks"].append("infiltrative")
-        # ค้นหาตัวเลขที่ตามหลังคำว่า infiltrative
-        data["mass_infiltrative"] = extract_dimensions_near("infiltrative", text)
-
-    # --- Well-defined Mass ---
-    # 🔴 กฎเหล็ก: ต้องมีคำว่า "well-defined" เท่านั้น
-    if "well-defined" in text or "well defined" in text:
-        data["checks"].append("well-defined")
-        data["mass_welldefined"] = extract_dimensions_near("well", text) # หาใกล้ๆ คำว่า well
+    # หาคำว่า skin ellipse แล้วมองหาเลขต่อท้าย
+    if index.has("skin") and index.has("ellipse", "excis"):
+        skin_pos = index.first("skin")
+        after = [p + len(k) for k in ("ellipse", "measure")
+                 for p in [index.first(k, skin_pos + len("skin"))] if p is not None]
+        if after:
+            dims = index.first_dims(min(after), len(text))
+            if dims:
+                data["skin"] = dims[:2]
+
+    # --- Mass dimensions ---
+    for field, keywords, anchor in DIMENSION_RULES:
+        if index.has(*keywords):
+            data[field] = index.dims_near(anchor)
 
     # ==========================================
-    # 🧩 3. LOGIC อื่นๆ (เหมือนเดิม)
+    # 🧩 3. FLAGS (circles / checkboxes)
     # ==========================================
+    groups_done = set()
+    for target, value, keywords, group in FLAG_RULES:
+        if group in groups_done: continue
+        if index.has(*keywords):
+            data[target].append(value)
+            if group: groups_done.add(group)
 
-    # --- Circles ---
-    if "right" in text: data["circles"].append("right")
-    elif "left" in text: data["circles"].append("left")
-    
-    if "lower" in text: data["circles"].append("lower")
-    if "upper" in text: data["circles"].append("upper")
-    if "outer" in text: data["circles"].append("outer")
-    if "inner" in text: data["circles"].append("inner")
-    
-    if "lower outer" in text or "upper outer" in text or "lower inner" in text or "upper inner" in text:
-        data["checks"].append("in ( upper / lower")
-
-    if "is a" in text or "is an" in text: data["circles"].append("is a")
-    elif "there are" in text: data["circles"].append("are")
-    elif "two" in text: data["circles"].append("two")
-    elif "multiple" in text: data["circles"].append("are multiple")
-
-    # --- Checkboxes ---
-    if "modified radical" in text: data["checks"].append("modified radical mastectomy")
-    if "simple mastectomy" in text: data["checks"].append("simple mastectomy")
-    
     # --- Nipple Logic ---
-    nipple_checked = False
-    if "inverted" in text or "retracted" in text:
-        data["checks"].append("shows inverted")
-        nipple_checked = True
-    if "everted" in text or "protruding" in text:
-        data["checks"].append("is everted")
-        nipple_checked = True
-    if "ulceration" in text or "eroded" in text:
-        data["checks"].append("shows ulceration")
-        nipple_checked = True
-    
-    if not nipple_checked:
-        nipple_phrase = re.search(r"nipple\s*(?:is|shows|appears)?\s*([a-z\s]+)", text)
-        if nipple_phrase:
-            desc = nipple_phrase.group(1).replace("is ", "").replace("shows ", "").strip()
-            if len(desc) > 2 and "margin" not in desc and "cm" not in desc:
-                data["nipple_other"] = desc
-
-    if "appears normal" in text: data["checks"].append("appears normal") 
-    if "unremarkable" in text: data["checks"].append("is unremarkable")
+    if not any(c in data["checks"] for c in NIPPLE_CHECKS):
+        for pos in index.find("nipple"):
+            nipple_phrase = _NIPPLE_PHRASE_RE.match(text, pos)
+            if nipple_phrase:
+                desc = nipple_phrase.group(1).replace("is ", "").replace("shows ", "").strip()
+                if len(desc) > 2 and "margin" not in desc and "cm" not in desc:
+                    data["nipple_other"] = desc
+                break
 
     # --- Margins ---
-    margin_map = {
-        "deep": ["deep"], "superior": ["superior"], "inferior": ["inferior"],
-        "medial": ["medial", "media", "medium"], "lateral": ["lateral"], "skin": ["skin"]
-    }
-
-    for key, search_terms in margin_map.items():
-        for term in search_terms:
-            pattern = rf"([xX\d]*\.?\d+|[xX])\s*(?:cm)?\s*(?:from)?\s*[a-z\s]{{0,25}}\s*{term}"
-            if key == "skin": # Skin margin pattern is tricky
-                 pattern = rf"([xX\d]*\.?\d+|[xX])\s*(?:cm)?\s*from\s*[a-z\s]{{0,25}}\s*{term}"
-
-            matches = list(re.finditer(pattern, text))
-            if matches:
-                val = matches[-1].group(1)
-                if val.replace('.','',1).isdigit() and val.startswith("."): val = "0" + val
-                
-                pdf_key = key if "margin" in key or key == "skin" else f"{key} margin"
-                if key == "skin": pdf_key = "skin"
-                data["margins"][pdf_key] = val
-                break
+    for pdf_key, search_terms, _ in MARGIN_RULES:
+        val = _extract_margin(index, search_terms)
+        if val is not None:
+            data["margins"][pdf_key] = val
 
     # --- Sections ---
-    def find_code(keywords, context_text, range_chars=150, forbidden_pre=[]):
-        if isinstance(keywords, str): keywords = [keywords]
-        matches_found = []
-        for kw in keywords:
-            for m in re.finditer(kw, context_text):
-                start_chk = max(0, m.start() - 30)
-                prefix = context_text[start_chk:m.start()]
-                if any(bad in prefix for bad in forbidden_pre): continue
-                
-                start_snip = max(0, m.start() - range_chars)
-                snippet = context_text[start_snip:m.start()]
-                codes = re.findall(r"a\s*(\d+)[-\s]*(\d+)", snippet)
-                if codes:
-                    c = codes[-1]
-                    matches_found.append(f"A{c[0]}-{c[1]}")
-        return matches_found[-1] if matches_found else None
-
-    data["sections"]["nipple"] = find_code("nipple", text)
-    data["sections"]["deep"] = find_code(["resected margin"], text, forbidden_pre=["inferior", "superior", "nearest"])
-    
-    nearest = find_code(["inferior", "nearest"], text)
-    if nearest: data["sections"]["nearest"] = f"{nearest} (Inferior)"
+    for name, keywords, forbidden_pre, fmt in SECTION_RULES:
+        code = index.find_code(keywords, forbidden_pre=forbidden_pre)
+        if code or name != "nearest":
+            data["sections"][name] = fmt.format(code) if code else None
 
     # Mass Logic
-    mass_range = re.search(r"(a\s*\d+[-\s]*\d+)\s*(?:-|to)\s*(a\s*\d+[-\s]*\d+).*?mass", text)
-    if mass_range:
-        def clean(c):
-            nums = re.findall(r"\d+", c)
-            if len(nums) >= 2: return f"A{nums[0]}-{nums[1]}"
-            return c
-        data["sections"]["mass"] = f"{clean(mass_range.group(1))} to {clean(mass_range.group(2))}"
-    else:
-        data["sections"]["mass"] = find_code(["mass", "mast"], text)
-
-    ratio = re.search(r"ratio.*?approximately.*?(\d+).*?(\d+)", text)
-    if ratio: data["ratio"] = (ratio.group(1), ratio.group(2))
-
-    return data
\ No newline at end of file
+    data["sections"]["mass"] = _mass_section_range(index) or index.find_code(MASS_SECTION_KEYWORDS)
+
+    ratio_pos = index.first("ratio")
+    if ratio_pos is not None:
+        ratio = _RATIO_RE.search(text, ratio_pos)
+        if ratio: data["ratio"] = (ratio.group(1), ratio.group(2))
+
+    return data
+
+
+# ==========================================
+# ✂️ แยกคำบอกที่มีหลาย specimen (specimen 1 / part a ...) เป็นก้อนละ specimen
+# ==========================================
+_LABEL = r"(?:number|no\.?|#)?\s*(\d+\b(?!\s*(?:\.\d|x\b|cm|mm))|[a-h]\b(?=\s*(?:[:.,-]|is\b|consists\b|labell?ed\b)))"
+
+# ผ่านข้อความรอบเดียว: จุดเริ่ม specimen กับจุดเริ่มรายการ section
+# - "specimen 2" / "part b:" = เริ่ม specimen ใหม่
+# - "sections ..." ที่มีรหัส (a1-1) ตามมาใน 40 ตัวอักษร = รายการ section ("serial sections show" ไม่นับ)
+#   ถ้าบอกว่าเป็นของ specimen ไหน ("sections of specimen 2") จะไปอยู่กับ specimen นั้น
+_SEGMENT_RE = re.compile(
+    r"(?P<sec>\bsections\b(?=[^.]{0,40}?\ba\s*\d)"
+    r"(?:\s+(?:are\s+)?(?:submitted\s+)?(?:of|from|for)\s+(?:specimen|part)\s*" + _LABEL + r")?)"
+    r"|(?P<spec>\b(?:specimen|part)\s*" + _LABEL + r")"
+)
+
+
+def split_specimens(text):
+    """
+    แบ่งข้อความเป็นก้อนละ specimen ในรอบเดียว คืนค่า [(label, ข้อความของ specimen นั้น)]
+    ข้อความก่อน specimen แรกรวมไว้กับ specimen แรก / รายการ section ที่ไม่ระบุ specimen อยู่กับ specimen ก่อนหน้า
+    มี specimen เดียว (หรือไม่ได้ระบุ) -> [(None, ข้อความทั้งหมด)] เหมือนเดิม
+    """
+    blocks = {}      # label -> [(start, end), ...] (dict เรียงตามลำดับที่เจอ)
+    current = None   # label ของก้อนที่กำลังเก็บข้อความ
+    start = 0
+    for m in _SEGMENT_RE.finditer(text):
+        if m.lastgroup == "spec":
+            target = m.group(4)
+        else:
+            target = m.group(2) if m.group(2) in blocks else current
+        if target == current:
+            continue
+        if current is not None:
+            blocks[current].append((start, m.start()))
+        blocks.setdefault(target, [])
+        if current is None and len(blocks) == 1:
+            start = 0  # ข้อความนำหน้า (ก่อน specimen แรก) รวมกับ specimen แรก
+        else:
+            start = m.start()
+        current = target
+    if len(blocks) < 2:
+        return [(None, text)]
+    blocks[current].append((start, len(text)))
+    return [(label, " ".join(text[s:e].strip() for s, e in spans)) for label, spans in blocks.items()]
+
+
+def extract_specimens(text):
+    """extract_data ทีละ specimen คืนค่า [{"label": ..., "data": ...}] (คำบอกทั่วไปได้ 1 รายการ)"""
+    return [{"label": label, "data": extract_data(block)} for label, block in split_specimens(text)]
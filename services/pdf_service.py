@@ -1,50 +1,341 @@
-import fitz 
+import hashlib
+import json
+import os
+import threading
+import fitz
+import config
+from services.profiling_service import span
 
 # Measuring: [20, 60, 100]
 FORCE_MAPPING = {
-    "Measuring": [20, 60, 100], 
+    "Measuring": [20, 60, 100],
     "The skin ellipse": [25, 75],
     "infiltrative firm yellow white mass": [20, 70, 120],
     "well-defined firm white mass": [20, 70, 120]
 }
 
-def fill_pdf(template_path, output_path, data):
-    doc = fitz.open(template_path)
-    page = doc[0]
+MAPPING_CONFIG = {
+    "specimen": ("Measuring", "after"),
+    "skin": ("The skin ellipse", "after"),
+    "mass_infiltrative": ("infiltrative firm yellow white mass", "after"),
+    "mass_welldefined": ("well-defined firm white mass", "after")
+}
+
+MARGIN_LABELS = ["deep margin", "superior margin", "inferior margin", "medial margin", "lateral margin", "skin"]
+
+CIRCLE_TARGETS = {
+    "right": "( right / left )", "left": "( right / left )",
+    "lower": "in ( upper / lower", "outer": "in ( upper / lower",
+    "upper": "in ( upper / lower", "inner": "in ( upper / lower",
+    "is a": "( is a / are / two / are multiple )", "are": "( is a / are / two / are multiple )",
+    "two": "( is a / are / two / are multiple )", "are multiple": "( is a / are / two / are multiple )",
+}
+
+MAPPING_CONFIG_ANCHORS = [pdf_keyword for pdf_keyword, _ in MAPPING_CONFIG.values()]
+
+# ข้อความทุกตัวที่ fill_pdf ต้องหาตำแหน่ง -> ค้นครั้งเดียวตอนสร้าง Layout Index
+KNOWN_ANCHORS = (
+    MAPPING_CONFIG_ANCHORS
+    + ["infiltrative firm", "well-defined firm", "ratio of approximately",
+       "The nipple", "shows inverted", "shows ulceration", "infiltrative", "well-defined",
+       "remaining of breast tissue", "modified radical mastectomy", "simple mastectomy",
+       "appears normal", "= nipple", "= mass", "nearest resected", "resected margin"]
+    + [f"cm. from {label}" for label in MARGIN_LABELS]
+    + sorted(set(CIRCLE_TARGETS.values())) + list(CIRCLE_TARGETS)
+)
+
+# คำที่ต้องตรงทั้งคำ (เช่น 'are' ห้ามไปเจอใน 'square')
+EXACT_WORDS = ["are"]
+
+# เปลี่ยนเลขนี้เมื่อโครงสร้าง Layout เปลี่ยน (ไฟล์ cache เก่าจะถูกสร้างใหม่)
+LAYOUT_VERSION = 1
+
+_layouts = {}        # file hash -> TemplateLayout
+_file_hashes = {}    # (path, mtime, size) -> file hash
+_cache_lock = threading.Lock()
+
+
+def _rect_to_list(r):
+    return [r.x0, r.y0, r.x1, r.y1]
+
+
+def merge_dot_slots(anchor_rect, dots, placement='after'):
+    """รวมจุด (....) ที่อยู่บรรทัดเดียวกับ anchor ให้เป็นช่องว่างสำหรับเขียน"""
+    ref_y = (anchor_rect.y0 + anchor_rect.y1) / 2
+    valid_dots = []
+    for d in dots:
+        if abs((d.y0+d.y1)/2 - ref_y) < 5:
+            if placement == 'after' and d.x0 > anchor_rect.x0: valid_dots.append(d)
+            elif placement == 'before' and d.x1 < anchor_rect.x1: valid_dots.append(d)
+    valid_dots.sort(key=lambda r: r.x0)
+
+    slots = []
+    if valid_dots:
+        curr = valid_dots[0]
+        for next_d in valid_dots[1:]:
+            if next_d.x0 < curr.x1 + 15:
+                curr = fitz.Rect(curr.x0, min(curr.y0, next_d.y0), max(next_d.x1, curr.x1), max(next_d.y1, curr.y1))
+            else:
+                slots.append(curr); curr = next_d
+        slots.append(curr)
+
+    slots.sort(key=lambda r: r.x0)
+    if placement == 'before': slots.reverse()
+    return slots
+
+
+class TemplateLayout:
+    """
+    ตำแหน่งทุกอย่างบนหน้า Template (anchor, ช่องจุดไข่ปลา, ☐) ที่หาไว้ล่วงหน้า
+    สร้างครั้งเดียวต่อไฟล์ (key = hash ของไฟล์) แล้วใช้ซ้ำทุกรายงาน
+    """
+
+    def __init__(self, file_hash, template_bytes, entries=None):
+        self.file_hash = file_hash
+        self.template_bytes = template_bytes
+        self._page_doc = None
+        self._prepared_bytes = None
+        self._clip_cache = {}  # (ชนิด, ข้อความ, clip) -> ผลลัพธ์ (ตำแหน่งบน Template ไม่เปลี่ยน)
+        self._lock = threading.RLock()  # fitz Document ไม่ thread-safe
+        if entries is None:
+            entries = self._scan()
+        self.dots = [fitz.Rect(r) for r in entries["dots"]]
+        self.boxes = [fitz.Rect(r) for r in entries["boxes"]]
+        self.anchors = {k: [fitz.Rect(r) for r in v] for k, v in entries["anchors"].items()}
+        self.exact = {k: [fitz.Rect(r) for r in v] for k, v in entries["exact"].items()}
+        self.slot_cache = {k: [fitz.Rect(r) for r in v] for k, v in entries["slots"].items()}
+        self.dirty = False
+
+    def _template_page(self):
+        # เปิด Template ไว้สำหรับค้นหาข้อความที่ไม่อยู่ใน Index (เปิดครั้งเดียว)
+        if self._page_doc is None:
+            self._page_doc = fitz.open("pdf", self.template_bytes)
+        return self._page_doc[0]
+
+    def _scan(self):
+        page = self._template_page()
+        anchors = {a: page.search_for(a) for a in dict.fromkeys(KNOWN_ANCHORS)}
+        dots = page.search_for(".")
+        exact = {w: [r for r in anchors[w] if page.get_text("text", clip=r).strip() == w] for w in EXACT_WORDS}
+        slots = {}
+        for anchor, placement in [(a, 'after') for a in MAPPING_CONFIG_ANCHORS] + [(f"cm. from {l}", 'before') for l in MARGIN_LABELS]:
+            if anchors[anchor]:
+                slots[f"{placement}:{anchor}"] = merge_dot_slots(anchors[anchor][0], dots, placement)
+        return {
+            "dots": [_rect_to_list(r) for r in dots],
+            "boxes": [_rect_to_list(r) for r in page.search_for("☐")],
+            "anchors": {k: [_rect_to_list(r) for r in v] for k, v in anchors.items()},
+            "exact": {k: [_rect_to_list(r) for r in v] for k, v in exact.items()},
+            "slots": {k: [_rect_to_list(r) for r in v] for k, v in slots.items()},
+        }
+
+    def to_dict(self):
+        return {
+            "version": LAYOUT_VERSION,
+            "hash": self.file_hash,
+            "dots": [_rect_to_list(r) for r in self.dots],
+            "boxes": [_rect_to_list(r) for r in self.boxes],
+            "anchors": {k: [_rect_to_list(r) for r in v] for k, v in self.anchors.items()},
+            "exact": {k: [_rect_to_list(r) for r in v] for k, v in self.exact.items()},
+            "slots": {k: [_rect_to_list(r) for r in v] for k, v in self.slot_cache.items()},
+        }
+
+    def hits(self, text):
+        """เทียบเท่า page.search_for(text) บน Template"""
+        if text not in self.anchors:
+            with self._lock:
+                self.anchors[text] = self._template_page().search_for(text)
+                self.dirty = True
+        return self.anchors[text]
+
+    def hits_in(self, text, clip):
+        """เทียบเท่า page.search_for(text, clip=clip)"""
+        key = ("hits", text, tuple(clip))
+        if key not in self._clip_cache:
+            self._clip_cache[key] = [r for r in self.hits(text) if r.intersects(clip)]
+        return self._clip_cache[key]
+
+    def boxes_in(self, clip):
+        """☐ ที่อยู่ในพื้นที่ clip"""
+        key = ("boxes", None, tuple(clip))
+        if key not in self._clip_cache:
+            self._clip_cache[key] = [b for b in self.boxes if b.intersects(clip)]
+        return self._clip_cache[key]
+
+    def exact_in(self, word, clip):
+        if word not in self.exact:
+            with self._lock:
+                page = self._template_page()
+                self.exact[word] = [r for r in self.hits(word) if page.get_text("text", clip=r).strip() == word]
+                self.dirty = True
+        key = ("exact", word, tuple(clip))
+        if key not in self._clip_cache:
+            self._clip_cache[key] = [r for r in self.exact[word] if r.intersects(clip)]
+        return self._clip_cache[key]
+
+    def slots(self, anchor_text, placement='after'):
+        key = f"{placement}:{anchor_text}"
+        if key not in self.slot_cache:
+            hits = self.hits(anchor_text)
+            self.slot_cache[key] = merge_dot_slots(hits[0], self.dots, placement) if hits else []
+            self.dirty = True
+        return self.slot_cache[key]
+
+    def _prepared(self):
+        # Template ที่ wrap q/Q ให้ครบคู่ไว้ล่วงหน้า: ตอน commit ไม่ต้องนับ q/Q ทั้งหน้าใหม่ทุกฉบับ
+        if self._prepared_bytes is None:
+            with self._lock:
+                doc = fitz.open("pdf", self.template_bytes)
+                for page in doc:
+                    page.wrap_contents()
+                    page.insert_font(fontname="helv")  # ฟอนต์ที่ใช้เขียนค่า ใส่ไว้ใน resource ของ Template เลย
+                self._prepared_bytes = doc.tobytes(no_new_id=True)
+                doc.close()
+        return self._prepared_bytes
+
+    def open_copy(self):
+        """สำเนา Template ใหม่ในหน่วยความจำ สำหรับเขียนรายงาน 1 ฉบับ"""
+        return fitz.open("pdf", self._prepared())
+
+
+def _layout_cache_path(file_hash):
+    return os.path.join(config.LAYOUT_CACHE_FOLDER, f"{file_hash}.json")
+
+
+def _save_layout(layout):
+    try:
+        os.makedirs(config.LAYOUT_CACHE_FOLDER, exist_ok=True)
+        path = _layout_cache_path(layout.file_hash)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(layout.to_dict(), f)
+        os.replace(tmp_path, path)
+        layout.dirty = False
+    except OSError as e:
+        print(f"Layout cache write failed: {e}")
+
+
+def _load_layout(file_hash, template_bytes):
+    path = _layout_cache_path(file_hash)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Layout cache read failed: {e}")
+        return None
+    if entries.get("version") != LAYOUT_VERSION or entries.get("hash") != file_hash:
+        return None
+    return TemplateLayout(file_hash, template_bytes, entries)
+
+
+def get_layout(template_path):
+    """คืน Layout Index ของ Template (memory -> disk -> สร้างใหม่)"""
+    st = os.stat(template_path)
+    stat_key = (os.path.abspath(template_path), st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        file_hash = _file_hashes.get(stat_key)
+        if file_hash and file_hash in _layouts:
+            return _layouts[file_hash]
+
+        with open(template_path, "rb") as f:
+            template_bytes = f.read()
+        file_hash = hashlib.sha256(template_bytes).hexdigest()
+        _file_hashes[stat_key] = file_hash
+        if file_hash not in _layouts:
+            layout = _load_layout(file_hash, template_bytes)
+            if layout is None:
+                layout = TemplateLayout(file_hash, template_bytes)
+                _save_layout(layout)
+            _layouts[file_hash] = layout
+        return _layouts[file_hash]
+
+
+def clear_layout_cache(disk=False):
+    """ล้าง cache ใน memory (และบน disk ถ้า disk=True) ใช้ตอน benchmark/เปลี่ยน Template"""
+    with _cache_lock:
+        if disk:
+            for file_hash in _layouts:
+                try: os.remove(_layout_cache_path(file_hash))
+                except OSError: pass
+        _layouts.clear()
+        _file_hashes.clear()
+
 
+class _PageWriter:
+    """
+    เขียนค่าทั้งหน้าด้วย Shape เดียวแล้ว commit ครั้งเดียว และจำตำแหน่งที่เขียนไว้ (regions)
+    Shape วาดบนหน้าร่างขนาดเท่ากันที่มีแค่ฟอนต์ helv แล้วค่อยต่อ content stream ที่ได้ท้ายหน้าจริง
+    - shape.insert_text เรียก page.insert_font ทุกข้อความ ซึ่งสแกน font ของหน้า (หน้า Template ~1 ms ต่อครั้ง,
+      หน้าร่างแทบไม่มีค่าใช้จ่าย)
+    - shape.commit() นับ q/Q ของหน้าทั้งหน้า: หน้าร่างว่าง ส่วนหน้าจริงมาจาก layout.open_copy() ที่ q/Q ครบคู่แล้ว
+    หน้าจริงต้องมีฟอนต์ helv ใน resource อยู่แล้ว (layout.open_copy() ใส่ไว้ให้)
+    """
+
+    def __init__(self, page, draft):
+        self.page = page
+        self.regions = []
+        if draft.page_count == 0:
+            draft.new_page().insert_font(fontname="helv")
+        self._draft_page = draft[0]
+        self._draft_page.set_mediabox(page.mediabox)
+        self.shape = self._draft_page.new_shape()
+
+    def insert_text(self, point, text, fontsize=11, **kwargs):
+        # กล่องของข้อความ 1 บรรทัด: baseline ที่ point สูงเท่า fontsize
+        width = fitz.get_text_length(text, fontsize=fontsize)
+        self.regions.append({"kind": "text", "rect": _rect_to_list(
+            fitz.Rect(point.x, point.y - fontsize * 0.8, point.x + width, point.y + fontsize * 0.2))})
+        return self.shape.insert_text(point, text, fontsize=fontsize, **kwargs)
+
+    def draw_oval(self, rect):
+        self.regions.append({"kind": "circle", "rect": _rect_to_list(rect)})
+        return self.shape.draw_oval(rect)
+
+    def finish(self, **kwargs):
+        self.shape.finish(**kwargs)
+
+    def commit(self):
+        self.shape.commit()
+        content = self._draft_page.read_contents()
+        # ล้าง content ของหน้าร่าง ให้หน้าถัดไปใช้หน้าร่างเดิมต่อได้
+        self._draft_page.parent.xref_set_key(self._draft_page.xref, "Contents", "null")
+        if not content.strip():
+            return
+        doc = self.page.parent
+        xref = doc.get_new_xref()
+        doc.update_object(xref, "<<>>")
+        doc.update_stream(xref, content)
+        refs = " ".join(f"{x} 0 R" for x in self.page.get_contents() + [xref])
+        doc.xref_set_key(self.page.xref, "Contents", f"[{refs}]")
+
+
+def fill_page(page, layout, data, draft=None):
+    """
+    เขียนข้อมูลลงหน้า page (จาก layout.open_copy()) โดยใช้ตำแหน่งจาก layout (ไม่มีการค้นข้อความบนหน้า)
+    คืนค่าตำแหน่งที่เขียนลงไป [{"kind": "text" / "circle", "rect": [x0, y0, x1, y1]}] (ใช้ไฮไลต์ใน preview)
+    draft: เอกสารเปล่าสำหรับหน้าร่างของ _PageWriter เขียนหลายหน้าให้ส่งฉบับเดียวกันมา (ตั้งค่าฟอนต์ครั้งเดียว)
+    """
+    own_draft = draft is None
+    if own_draft:
+        draft = fitz.open()
+    writer = _PageWriter(page, draft)
+    _fill_shape(writer, layout, data)
+    if own_draft:
+        draft.close()
+    return writer.regions
+
+
+def _fill_shape(shape, layout, data):
     def draw_centered_at(x_center, y_base, text):
         text_str = str(text)
-        estimated_width = len(text_str) * 5 
+        estimated_width = len(text_str) * 5
         start_x = x_center - (estimated_width / 2)
-        page.insert_text(fitz.Point(start_x, y_base), text_str, fontsize=10, color=(0, 0, 0))
+        shape.insert_text(fitz.Point(start_x, y_base), text_str, fontsize=10, color=(0, 0, 0))
 
     def fill_auto(anchor_text, values, placement='after'):
-        hits = page.search_for(anchor_text)
-        if not hits: return
-        anchor_rect = hits[0]
-        ref_y = (anchor_rect.y0 + anchor_rect.y1) / 2
-        
-        raw_dots = page.search_for(".")
-        valid_dots = []
-        for d in raw_dots:
-            if abs((d.y0+d.y1)/2 - ref_y) < 5:
-                if placement == 'after' and d.x0 > anchor_rect.x0: valid_dots.append(d)
-                elif placement == 'before' and d.x1 < anchor_rect.x1: valid_dots.append(d)
-        valid_dots.sort(key=lambda r: r.x0)
-        
-        slots = []
-        if valid_dots:
-            curr = valid_dots[0]
-            for next_d in valid_dots[1:]:
-                if next_d.x0 < curr.x1 + 15:
-                    curr = fitz.Rect(curr.x0, min(curr.y0, next_d.y0), max(next_d.x1, curr.x1), max(next_d.y1, curr.y1))
-                else:
-                    slots.append(curr); curr = next_d
-            slots.append(curr)
-        
-        slots.sort(key=lambda r: r.x0)
-        if placement == 'before': slots.reverse()
-        
+        slots = layout.slots(anchor_text, placement)
         for i, val in enumerate(values):
             if i < len(slots):
                 t = slots[i]
@@ -52,40 +343,33 @@ def fill_pdf(template_path, output_path, data):
                 draw_centered_at(center_x, t.y1 - 2, val)
 
     def fill_force(anchor_text, values, offsets):
-        hits = page.search_for(anchor_text)
+        hits = layout.hits(anchor_text)
         # Fallback search if exact phrase not found
         if not hits:
-            if "infiltrative" in anchor_text: hits = page.search_for("infiltrative firm")
-            elif "well-defined" in anchor_text: hits = page.search_for("well-defined firm")
+            if "infiltrative" in anchor_text: hits = layout.hits("infiltrative firm")
+            elif "well-defined" in anchor_text: hits = layout.hits("well-defined firm")
             if not hits: return
-        
+
         target_rect = hits[0]
-        
+
         # Try to find the checkbox associated with this mass line
         # This is for anchor positioning purposes
         if "infiltrative" in anchor_text or "well-defined" in anchor_text:
              for h in hits:
-                 if page.search_for("☐", clip=fitz.Rect(0, h.y0, h.x0, h.y1)):
+                 if layout.boxes_in(fitz.Rect(0, h.y0, h.x0, h.y1)):
                      target_rect = h; break
-        
+
         base_x = target_rect.x1
         base_y = target_rect.y1 - 2
         extra_offset = 90 if anchor_text == "infiltrative firm yellow white mass" and hits[0].x1 < 200 else 0
-        
+
         for i, val in enumerate(values):
             if i < len(offsets):
                 final_x = base_x + offsets[i] + extra_offset
                 draw_centered_at(final_x, base_y, val)
 
-    mapping_config = {
-        "specimen": ("Measuring", "after"),
-        "skin": ("The skin ellipse", "after"),
-        "mass_infiltrative": ("infiltrative firm yellow white mass", "after"),
-        "mass_welldefined": ("well-defined firm white mass", "after")
-    }
-
     # Main Filling Logic
-    for data_key, (pdf_keyword, placement) in mapping_config.items():
+    for data_key, (pdf_keyword, placement) in MAPPING_CONFIG.items():
         if data_key in data and data[data_key]:
             is_forced = False
             for force_key, offsets in FORCE_MAPPING.items():
@@ -99,18 +383,18 @@ def fill_pdf(template_path, output_path, data):
     for k, v in data["margins"].items():
         label = k if "margin" in k or k == "skin" else f"{k} margin"
         fill_auto(f"cm. from {label}", [v], 'before')
-        
+
     # Ratio
     if data.get("ratio"):
-        hits = page.search_for("ratio of approximately")
+        hits = layout.hits("ratio of approximately")
         if hits:
             r = hits[0]
-            page.insert_text(fitz.Point(r.x1 + 20, r.y1 - 2), str(data["ratio"][0]), fontsize=10)
-            page.insert_text(fitz.Point(r.x1 + 60, r.y1 - 2), str(data["ratio"][1]), fontsize=10)
+            shape.insert_text(fitz.Point(r.x1 + 20, r.y1 - 2), str(data["ratio"][0]), fontsize=10)
+            shape.insert_text(fitz.Point(r.x1 + 60, r.y1 - 2), str(data["ratio"][1]), fontsize=10)
 
     # --- Smart Tick Box Functions ---
     def tick_box_in_area(search_area):
-        box_hits = page.search_for("☐", clip=search_area)
+        box_hits = layout.boxes_in(search_area)
         closest = None; min_dist = 999
         for box in box_hits:
             dist = abs(box.x0 - search_area.x0)
@@ -119,10 +403,10 @@ def fill_pdf(template_path, output_path, data):
                 closest = box
         if closest:
             cx = closest.x0 + (closest.width/2) - 3; cy = closest.y1 - 1
-            page.insert_text(fitz.Point(cx, cy), "/", fontsize=12, color=(0, 0, 1))
+            shape.insert_text(fitz.Point(cx, cy), "/", fontsize=12, color=(0, 0, 1))
 
     def tick_box_smart(anchor, search_clip=None):
-        hits = page.search_for(anchor)
+        hits = layout.hits(anchor)
         if not hits: return
         target_rect = hits[0]
         # Define search area: slightly left and same height
@@ -141,7 +425,7 @@ def fill_pdf(template_path, output_path, data):
         elif check == "well-defined":
             tick_box_smart("well-defined")
         elif check == "is unremarkable":
-            hits = page.search_for("remaining of breast tissue")
+            hits = layout.hits("remaining of breast tissue")
             if hits:
                 t = hits[0]
                 area = fitz.Rect(t.x1, t.y0 - 5, t.x1 + 150, t.y1 + 5)
@@ -151,71 +435,157 @@ def fill_pdf(template_path, output_path, data):
 
     # --- Circles Logic ---
     for circle in data["circles"]:
-        target_text = None
-        if circle in ["right", "left"]: target_text = "( right / left )"
-        elif circle in ["lower", "outer", "upper", "inner"]: 
-            target_text = "in ( upper / lower"
-        elif circle in ["is a", "are", "two", "are multiple"]:
-            target_text = "( is a / are / two / are multiple )"
+        target_text = CIRCLE_TARGETS.get(circle)
 
         if target_text:
-            hits = page.search_for(target_text)
+            hits = layout.hits(target_text)
             if hits:
                 anchor = hits[0]
                 # Clip area around the line to find the specific word
                 clip_rect = fitz.Rect(anchor.x0, anchor.y0-15, anchor.x1+400, anchor.y1+15)
-                word_hits = page.search_for(circle, clip=clip_rect)
-                
+
                 # Special filter for 'are' to avoid matching parts of other words
-                if circle == "are":
-                    word_hits = [w for w in word_hits if page.get_text(w).strip() == "are"]
-                
+                if circle in EXACT_WORDS:
+                    word_hits = layout.exact_in(circle, clip_rect)
+                else:
+                    word_hits = layout.hits_in(circle, clip_rect)
+
                 if word_hits:
                     r = word_hits[0]
-                    page.draw_oval(fitz.Rect(r.x0-2, r.y0, r.x1+2, r.y1), color=(1,0,0), width=1.5)
+                    shape.draw_oval(fitz.Rect(r.x0-2, r.y0, r.x1+2, r.y1))
+                    shape.finish(color=(1,0,0), width=1.5)
 
     # --- Manual Write Logic (Y-Axis Centered) ---
     def write_manual_at_rect(rect, text, offset_x=0, align="left", color=(0,0,0)):
-        y_pos = rect.y1 - 5 
+        y_pos = rect.y1 - 5
         if align == "right":
             text_width = len(str(text)) * 8
             start_x = rect.x0 - text_width - 25
             if start_x < 20: start_x = 20
-            page.insert_text(fitz.Point(start_x, y_pos), str(text), fontsize=10, color=color)
+            shape.insert_text(fitz.Point(start_x, y_pos), str(text), fontsize=10, color=color)
         else:
-            page.insert_text(fitz.Point(rect.x0 + offset_x, y_pos), str(text), fontsize=10, color=color)
+            shape.insert_text(fitz.Point(rect.x0 + offset_x, y_pos), str(text), fontsize=10, color=color)
 
     # 1. Normal Sections
     if data["sections"].get("nipple"):
-        hits = page.search_for("= nipple")
+        hits = layout.hits("= nipple")
         if hits: write_manual_at_rect(hits[-1], data["sections"]["nipple"], offset_x=-80)
-        
+
     if data["sections"].get("mass"):
-        hits = page.search_for("= mass")
+        hits = layout.hits("= mass")
         if hits: write_manual_at_rect(hits[-1], data["sections"]["mass"], offset_x=-80)
 
     # 2. Deep / Nearest (Exclusion Logic)
     nearest_hit = None
-    nearest_search = page.search_for("nearest resected")
+    nearest_search = layout.hits("nearest resected")
     if nearest_search: nearest_hit = nearest_search[0]
-    
+
     deep_hit = None
-    resected_hits = page.search_for("resected margin")
+    resected_hits = layout.hits("resected margin")
     for r in resected_hits:
         if nearest_hit and abs(r.y0 - nearest_hit.y0) < 10: continue
         deep_hit = r; break
 
     if nearest_hit and data["sections"].get("nearest"):
          write_manual_at_rect(nearest_hit, data["sections"]["nearest"], align="right")
-         
+
     if deep_hit and data["sections"].get("deep"):
         write_manual_at_rect(deep_hit, data["sections"]["deep"], align="right")
 
     # 3. Nipple Other
     if data.get("nipple_other"):
-         hits = page.search_for("shows ulceration")
+         hits = layout.hits("shows ulceration")
          if hits: write_manual_at_rect(hits[-1], f"({data['nipple_other']})", offset_x=120, color=(1,0,0))
 
-    doc.save(output_path)
+    shape.commit()
+
+
+def _save_dirty_layout(layout):
+    # ถ้าเจอข้อความใหม่ที่ไม่อยู่ใน Index ให้บันทึก cache ลง disk ด้วย
+    if layout.dirty:
+        with _cache_lock:
+            _save_layout(layout)
+
+
+def _render_doc(template_path, data, regions=None):
+    with span("pdf.layout"):
+        layout = get_layout(template_path)
+        doc = layout.open_copy()
+    with span("pdf.fill_page"):
+        written = fill_page(doc[0], layout, data)
+    if regions is not None:
+        regions.extend(written)
+    _save_dirty_layout(layout)
+    return doc
+
+
+def render_pdf(template_path, data, regions=None):
+    """
+    เขียนรายงานในหน่วยความจำ คืนค่าเป็น bytes (ไม่แตะดิสก์)
+    ส่ง list มาใน regions เพื่อรับตำแหน่งที่เขียน (ผลของ fill_page) กลับไปด้วย
+    """
+    doc = _render_doc(template_path, data, regions)
+    # no_new_id: ข้อมูลเดิม -> bytes เดิมทุกครั้ง (ตั้งชื่อไฟล์ตาม hash ของเนื้อหาได้)
+    with span("pdf.serialize"):
+        pdf_bytes = doc.tobytes(no_new_id=True)
+    doc.close()
+    return pdf_bytes
+
+
+def fill_pdf(template_path, output_path, data):
+    doc = _render_doc(template_path, data)
+    doc.save(output_path, no_new_id=True)
+    doc.close()
+    return output_path
+
+
+def render_bulk(template_path, records, output_path=None, regions=None):
+    """
+    หลายรายงานเป็น PDF ไฟล์เดียว (1 หน้าต่อ record) เช่น เคสที่มีหลาย specimen / รายงานทั้งวัน
+    เปิด Template ครั้งเดียว แล้ว clone หน้าโดยชี้ไปที่ content / font ชุดเดิม (ไม่ copy ซ้ำ)
+    แต่ละหน้าแค่เพิ่ม content stream ของค่าที่เขียน คืนค่า bytes หรือเขียนลง output_path ถ้าส่งมา
+    regions (list) รับตำแหน่งที่เขียนของทุกหน้า (มี "page" บอกเลขหน้า)
+    """
+    with span("pdf.layout"):
+        layout = get_layout(template_path)
+        doc = layout.open_copy()
+    src = doc[0]
+    width, height = src.rect.width, src.rect.height
+    shared = {key: doc.xref_get_key(src.xref, key) for key in ("Resources", "Contents", "Group", "Tabs")}
+    for _ in range(len(records) - 1):
+        page = doc.new_page(width=width, height=height)
+        for key, (kind, value) in shared.items():
+            if kind != "null":
+                doc.xref_set_key(page.xref, key, value)
+
+    draft = fitz.open()
+    for page, data in zip(doc, records):
+        with span("pdf.fill_page"):
+            written = fill_page(page, layout, data, draft)
+        if regions is not None:
+            regions.extend(dict(r, page=page.number) for r in written)
+    draft.close()
+    _save_dirty_layout(layout)
+
+    if output_path:
+        doc.save(output_path, no_new_id=True)
+        doc.close()
+        return output_path
+    with span("pdf.serialize"):
+        pdf_bytes = doc.tobytes(no_new_id=True)
     doc.close()
-    return output_path
\ No newline at end of file
+    return pdf_bytes
+
+
+def render_bulk_files(template_path, records, output_paths):
+    """หลายรายงาน แยก 1 ไฟล์ต่อ record (parse Template / Layout ครั้งเดียว) คืนค่า list ของ path"""
+    layout = get_layout(template_path)
+    draft = fitz.open()
+    for data, output_path in zip(records, output_paths):
+        doc = layout.open_copy()
+        fill_page(doc[0], layout, data, draft)
+        doc.save(output_path, no_new_id=True)
+        doc.close()
+    draft.close()
+    _save_dirty_layout(layout)
+    return list(output_paths)
@@ -0,0 +1,159 @@
+import json
+import os
+import time
+import config
+from services import ai_service, metrics_service
+from services.profiling_service import span
+from services.parser_service import normalize_text, extract_specimens
+from services.pdf_service import render_bulk, render_pdf
+
+
+def resolve_template(assets_folder, template_filename):
+    """หา path ของ Template (ถ้าหาไม่เจอ ให้ใช้ไฟล์ blank)"""
+    template_path = os.path.join(assets_folder, template_filename)
+    if not os.path.exists(template_path):
+        print(f"Warning: Template not found at {template_path}, trying fallback...")
+        template_path = "template.pdf"
+    return template_path
+
+
+def run_pipeline(audio, template_path, output_path=None, filename="", profile=None):
+    """
+    ถอดเสียง -> แปลงข้อความ -> ดึงข้อมูล -> เขียนลง PDF
+    ใช้ร่วมกันทั้งหน้าเว็บและ Job Worker
+    audio เป็น path หรือ bytes ของไฟล์ที่อัปโหลดก็ได้ (filename ใช้ดูชนิดไฟล์)
+    PDF สร้างในหน่วยความจำ (pdf_bytes) เขียนลงไฟล์เฉพาะเมื่อส่ง output_path มา
+    profile = ชื่อ Decode Profile (config.DECODE_PROFILES) ไม่ส่งมา = config.DEFAULT_DECODE_PROFILE
+    """
+    metrics = metrics_service.get_metrics()
+    profile = profile or config.DEFAULT_DECODE_PROFILE
+    options, size = ai_service.profile_options(profile)
+
+    # 1. ถอดเสียง (Ear) 👂 -- ไฟล์เดิมที่เคยถอดแล้วจะดึงจาก Transcript Cache
+    print(f"Transcribing ({profile})...")
+    t0 = time.perf_counter()
+    with metrics.timer("transcribe"), span("transcribe"):
+        result = ai_service.transcribe_audio(audio, options, size, filename=filename)
+    seconds = time.perf_counter() - t0
+    timings = {"transcribe": seconds}  # เวลาแต่ละขั้น (วินาที) เก็บลง Report Store
+    if not result.get("cached") and result.get("duration"):
+        # Real-time factor: ใช้เวลาถอดกี่วินาทีต่อเสียง 1 วินาที (นับเฉพาะที่รัน Whisper จริง)
+        metrics.observe("pathology_audio_duration_seconds", result["duration"])
+        metrics.observe("pathology_realtime_factor", seconds / result["duration"])
+        metrics.inc("pathology_audio_seconds_total", result["duration"])
+        metrics.inc("pathology_transcribe_seconds_total", seconds)
+    raw_text = result["text"]
+    print(f"Raw Text: {raw_text}")
+
+    # 2. แปลงข้อมูล (Brain) 🧠
+    t0 = time.perf_counter()
+    with metrics.timer("normalize"), span("normalize"):
+        cleaned_text = normalize_text(raw_text)
+    timings["normalize"] = time.perf_counter() - t0
+    print(f"Cleaned: {cleaned_text}")
+
+    t0 = time.perf_counter()
+    with metrics.timer("extract"), span("extract"):
+        specimens = extract_specimens(cleaned_text)
+    timings["extract"] = time.perf_counter() - t0
+    data_points = specimens[0]["data"]
+    print(f"Extracted Data: {data_points}" if len(specimens) == 1 else f"Extracted {len(specimens)} specimens")
+
+    # 3. เขียนลง PDF (Hand) ✍️
+    t0 = time.perf_counter()
+    with metrics.timer("fill"), span("fill"):
+        pdf_bytes, regions = render_report(template_path, specimens)
+    timings["fill"] = time.perf_counter() - t0
+    if output_path:
+        with open(output_path, "wb") as f:
+            f.write(pdf_bytes)
+    print("PDF Generated Successfully!")
+
+    return {
+        "raw_text": raw_text,
+        "segments": result["segments"],
+        "transcription": cleaned_text,
+        "profile": profile,
+        "data": data_points,
+        "specimens": specimens,
+        "pdf_bytes": pdf_bytes,
+        "regions": regions,
+        "timings": {stage: round(t, 4) for stage, t in timings.items()},
+        "output_path": output_path,
+    }
+
+
+def render_report(template_path, specimens):
+    """
+    PDF ของรายงาน: specimen เดียว = 1 หน้า / หลาย specimen = 1 หน้าต่อ specimen ในไฟล์เดียว
+    คืนค่า (pdf_bytes, ตำแหน่งที่เขียน) ตำแหน่งใช้ไฮไลต์ใน preview
+    """
+    regions = []
+    if len(specimens) == 1:
+        return render_pdf(template_path, specimens[0]["data"], regions), regions
+    return render_bulk(template_path, [s["data"] for s in specimens], regions=regions), regions
+
+
+def rerender(text, template_path, previous_specimens=None):
+    """
+    สร้าง PDF ใหม่จากข้อความที่แก้แล้ว (ไม่ถอดเสียงซ้ำ): แปลงข้อความ -> ดึงข้อมูล -> เขียนลง PDF
+    คืนค่า diff รายช่องเทียบกับ previous_specimens (ข้อมูลของรายงานก่อนแก้) ด้วย
+    """
+    metrics = metrics_service.get_metrics()
+    t0 = time.perf_counter()
+    with metrics.timer("normalize"), span("normalize"):
+        cleaned_text = normalize_text(text)
+    t1 = time.perf_counter()
+    with metrics.timer("extract"), span("extract"):
+        specimens = extract_specimens(cleaned_text)
+    t2 = time.perf_counter()
+    with metrics.timer("fill"), span("fill"):
+        pdf_bytes, regions = render_report(template_path, specimens)
+    t3 = time.perf_counter()
+    return {
+        "transcription": cleaned_text,
+        "data": specimens[0]["data"],
+        "specimens": specimens,
+        "diff": diff_specimens(previous_specimens or [], specimens),
+        "pdf_bytes": pdf_bytes,
+        "regions": regions,
+        "timings": {"normalize": round(t1 - t0, 4), "extract": round(t2 - t1, 4), "fill": round(t3 - t2, 4)},
+    }
+
+
+def diff_specimens(before, after):
+    """
+    diff_data ทีละ specimen (จับคู่ตามลำดับ) ถ้ามีหลาย specimen ชื่อช่องจะขึ้นต้นด้วย "specimen <label>: "
+    specimen ที่เพิ่มมา / หายไป เทียบกับข้อมูลว่าง
+    """
+    changes = []
+    multiple = max(len(before), len(after)) > 1
+    for i in range(max(len(before), len(after))):
+        old = before[i] if i < len(before) else {"label": None, "data": {}}
+        new = after[i] if i < len(after) else {"label": None, "data": {}}
+        label = new["label"] or old["label"] or str(i + 1)
+        for change in diff_data(old["data"], new["data"]):
+            if multiple:
+                change["field"] = f"specimen {label}: {change['field']}"
+            changes.append(change)
+    return changes
+
+
+def diff_data(before, after):
+    """
+    เทียบผลของ extract_data 2 ชุด คืนค่า list ของช่องที่เปลี่ยน [{"field", "before", "after"}]
+    ช่องที่เป็น dict (margins, sections) เทียบทีละ key เช่น "margins.superior"
+    """
+    # ผ่าน JSON ก่อน: ข้อมูลเดิมมาจากไฟล์งาน (tuple กลายเป็น list) จะได้เทียบกันตรงๆ
+    before, after = json.loads(json.dumps(before)), json.loads(json.dumps(after))
+    changes = []
+    for name in sorted(set(before) | set(after)):
+        old, new = before.get(name), after.get(name)
+        if isinstance(old, dict) or isinstance(new, dict):
+            old, new = old or {}, new or {}
+            for key in sorted(set(old) | set(new)):
+                if old.get(key) != new.get(key):
+                    changes.append({"field": f"{name}.{key}", "before": old.get(key), "after": new.get(key)})
+        elif old != new:
+            changes.append({"field": name, "before": old, "after": new})
+    return changes
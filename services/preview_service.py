@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+import fitz
+import config
+
+# ==========================================
+# Preview: รูป PNG ความละเอียดต่ำของหน้ารายงาน (ตรวจว่าติ๊ก/วงถูกช่องโดยไม่ต้องโหลด PDF ทั้งไฟล์)
+# 1 รูปต่อหน้า (รายงานหลาย specimen = หลายหน้า)
+# cache ตาม hash ของรายงาน + หน้า + dpi + ไฮไลต์ ไว้ใน cache/previews ใช้ร่วมกันทุก worker
+# เกินขนาดรวม -> ลบรูปที่ไม่ได้เปิดนานที่สุดก่อน (LRU ตาม mtime)
+# ==========================================
+
+HIGHLIGHT_COLORS = {"text": (1, 0.85, 0), "circle": (1, 0.4, 0.4)}
+
+
+def render_preview(pdf_bytes, dpi, regions=None, page_number=0):
+    """
+    PDF (bytes) -> PNG ของหน้า page_number (เริ่มที่ 0) ถ้าส่ง regions มา (ผลของ fill_page) จะระบายสีช่องที่เขียนไว้
+    ไม่มีหน้านั้น -> ValueError
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        if not 0 <= page_number < doc.page_count:
+            raise ValueError(f"Report has {doc.page_count} page(s)")
+        page = doc[page_number]
+        for region in regions or []:
+            if region.get("page", 0) != page_number:
+                continue
+            rect = fitz.Rect(region["rect"]) + (-2, -2, 2, 2)
+            page.draw_rect(rect, color=None, fill=HIGHLIGHT_COLORS.get(region["kind"], (1, 0.85, 0)),
+                           fill_opacity=0.35, overlay=True)
+        return page.get_pixmap(dpi=dpi).tobytes("png")
+    finally:
+        doc.close()
+
+
+class PreviewCache:
+
+    def __init__(self, folder, max_bytes, evict_interval=60):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self._last_evict = 0
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, pdf_name, dpi, highlight, page_number=0):
+        stem = os.path.splitext(os.path.basename(pdf_name))[0]
+        return os.path.join(self.folder, f"{stem}-p{page_number}-{dpi}{'-h' if highlight else ''}.png")
+
+    def get(self, pdf_name, dpi, highlight, page_number=0):
+        """คืนค่า path ของรูปที่ cache ไว้ (None ถ้ายังไม่มี)"""
+        path = self.path(pdf_name, dpi, highlight, page_number)
+        try:
+            os.utime(path)  # เปิดใช้ -> ใหม่สุดใน LRU
+        except OSError:
+            return None
+        return path
+
+    def put(self, pdf_name, dpi, highlight, png_bytes, page_number=0):
+        path = self.path(pdf_name, dpi, highlight, page_number)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png_bytes)
+        os.replace(tmp_path, path)
+        self._maybe_evict()
+        return path
+
+    def _maybe_evict(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_evict < self.evict_interval:
+                return
+            self._last_evict = now
+        self.evict()
+
+    def evict(self):
+        """ลบรูปที่ไม่ได้เปิดนานที่สุดจนขนาดรวมไม่เกิน max_bytes"""
+        files = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and entry.name.endswith(".png"):
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+_cache = None
+_cache_pid = None
+
+
+def get_cache():
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        _cache = PreviewCache(config.PREVIEW_FOLDER, max_bytes=config.PREVIEW_CACHE_MB * 1024 * 1024)
+        _cache_pid = os.getpid()
+    return _cache
+
+
+def get_preview(pdf_name, pdf_bytes_or_path, dpi, regions=None, page_number=0):
+    """
+    path ของรูป preview หน้า page_number (สร้างครั้งแรกแล้วเก็บไว้ เปิดซ้ำไม่ต้อง render ใหม่)
+    pdf_bytes_or_path = bytes ของรายงาน หรือ path ไฟล์ (อ่านเฉพาะตอนยังไม่มีใน cache)
+    """
+    cache = get_cache()
+    highlight = regions is not None
+    path = cache.get(pdf_name, dpi, highlight, page_number)
+    if path:
+        return path
+    pdf_bytes = pdf_bytes_or_path
+    if isinstance(pdf_bytes, str):
+        with open(pdf_bytes, "rb") as f:
+            pdf_bytes = f.read()
+    return cache.put(pdf_name, dpi, highlight, render_preview(pdf_bytes, dpi, regions, page_number), page_number)
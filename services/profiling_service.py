@@ -0,0 +1,208 @@
+import collections
+import contextlib
+import html
+import os
+import sys
+import threading
+import time
+import zlib
+
+# ==========================================
+# Profiling ต่องาน: เปิดเฉพาะงานที่ขอ (header X-Profile: 1 หรือ config.PROFILE_JOBS)
+# - sampling profiler: thread แยกดู stack ของ thread ที่รันงานทุก PROFILE_INTERVAL_MS (ไม่ต้องแก้โค้ดที่ถูกวัด)
+# - span(name): ชื่อขั้นตอนครอบการเรียก services/* ขึ้นเป็นชั้นบนสุดของ flamegraph + เวลาจริงของแต่ละ span
+# - งานที่ไม่ได้เปิด: span() = ค้น dict ครั้งเดียว ไม่มี thread / ไม่มีการเก็บ sample
+# ผล: flamegraph (SVG) + folded stacks (ใช้กับ speedscope / flamegraph.pl ได้) + ตาราง top-N ฟังก์ชัน
+# หมายเหตุ: ถ้าใช้ Inference Worker เวลาใน Whisper จะเห็นเป็นการรอ socket (โมเดลอยู่อีก process)
+# ==========================================
+
+_active = {}  # thread id -> Profile ที่กำลังเก็บอยู่
+_null = contextlib.nullcontext()
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+
+    def __init__(self, thread_id, interval, base_depth):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.base_depth = base_depth  # frame ชั้นนอก (job worker) ที่ไม่ต้องแสดง
+        self.stacks = collections.Counter()  # tuple ของ label (root ก่อน) -> จำนวน sample
+        self.spans = []  # [name, เริ่ม (วินาทีจากต้นงาน), ระยะเวลา]
+        self.started = time.perf_counter()
+        self.duration = None
+        self._span_stack = []
+        self._labels = {}  # code object -> label (สร้างครั้งเดียว)
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{thread_id}", daemon=True)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        t0 = time.perf_counter()
+        self._span_stack.append(name)
+        try:
+            yield
+        finally:
+            self._span_stack.pop()
+            self.spans.append([name, round(t0 - self.started, 4), round(time.perf_counter() - t0, 4)])
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            frames.append(label)
+            frame = frame.f_back
+        frames.reverse()
+        spans = tuple(f"[{name}]" for name in self._span_stack)
+        self.stacks[spans + tuple(frames[self.base_depth:])] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self.started
+
+    # ---------- ผลลัพธ์ ----------
+    def folded(self):
+        """folded stacks: 1 บรรทัดต่อ stack "a;b;c <จำนวน sample>" """
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def top(self, n=25):
+        """ฟังก์ชันที่กินเวลามากสุด: self = อยู่บนสุดของ stack, total = อยู่ที่ไหนก็ได้ใน stack"""
+        self_counts, total_counts = collections.Counter(), collections.Counter()
+        for stack, count in self.stacks.items():
+            if not stack:
+                continue
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+        ms = self.interval * 1000
+        ranked = sorted(total_counts, key=lambda label: (self_counts[label], total_counts[label]), reverse=True)
+        return [{"function": label, "self_ms": round(self_counts[label] * ms, 1),
+                 "total_ms": round(total_counts[label] * ms, 1)} for label in ranked[:n]]
+
+    def span_totals(self):
+        totals = collections.defaultdict(float)
+        for name, _, seconds in self.spans:
+            totals[name] += seconds
+        return {name: round(seconds, 4) for name, seconds in totals.items()}
+
+    def summary(self, n=25):
+        return {
+            "interval_ms": round(self.interval * 1000, 2),
+            "samples": sum(self.stacks.values()),
+            "duration_s": round(self.duration or time.perf_counter() - self.started, 4),
+            "spans": self.span_totals(),
+            "timeline": self.spans,
+            "top": self.top(n),
+        }
+
+    def flamegraph(self, title="Profile", width=1200, row=17):
+        return render_flamegraph(self.stacks, title, width, row)
+
+
+def span(name):
+    """ครอบขั้นตอนที่อยากเห็นชื่อใน flamegraph (งานที่ไม่ได้ profile ไม่มีผลอะไร)"""
+    profile = _active.get(threading.get_ident())
+    return _null if profile is None else profile.span(name)
+
+
+@contextlib.contextmanager
+def profiled(enabled, interval_ms=5):
+    """
+    เก็บ profile ของโค้ดใน with (thread ปัจจุบัน) คืนค่า Profile หรือ None ถ้าไม่ได้เปิด
+        with profiled(True) as prof:
+            run_pipeline(...)
+        prof.summary() / prof.flamegraph()
+    """
+    if not enabled:
+        yield None
+        return
+    thread_id = threading.get_ident()
+    # นับ frame ของผู้เรียก (ชั้นนอก with) เพื่อตัดออกจาก stack: flamegraph เริ่มที่โค้ดใน with
+    depth, frame = 0, sys._getframe(2)
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    profile = Profile(thread_id, interval_ms / 1000, depth)
+    _active[thread_id] = profile
+    profile._sampler.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _active.pop(thread_id, None)
+
+
+# ==========================================
+# Flamegraph (SVG ไฟล์เดียว ไม่ต้องลงเครื่องมือเพิ่ม ชี้เมาส์ดูชื่อ / เวลา)
+# ==========================================
+def _color(label):
+    if label.startswith("["):
+        return "rgb(110,160,230)"  # span
+    h = zlib.crc32(label.encode())
+    return f"rgb({205 + h % 50},{80 + (h >> 8) % 120},{40 + (h >> 16) % 40})"
+
+
+def render_flamegraph(stacks, title="Profile", width=1200, row=17):
+    # รวม stack เป็นต้นไม้: node = [จำนวน sample, {label: node ลูก}]
+    root = [0, {}]
+    for stack, count in stacks.items():
+        node = root
+        node[0] += count
+        for label in stack:
+            node = node[1].setdefault(label, [0, {}])
+            node[0] += count
+    total = root[0] or 1
+    scale = (width - 20) / total
+
+    rects, max_depth = [], 0
+
+    def walk(children, x, depth):
+        nonlocal max_depth
+        for label, (count, grandchildren) in sorted(children.items()):
+            w = count * scale
+            if w >= 0.5:  # แคบกว่าครึ่ง pixel ไม่วาด
+                max_depth = max(max_depth, depth)
+                rects.append((label, count, x, depth, w))
+                walk(grandchildren, x, depth + 1)
+            x += w
+
+    walk(root[1], 10.0, 0)
+    height = (max_depth + 1) * row + 50
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+           f'font-family="Verdana, sans-serif" font-size="11">',
+           f'<rect width="{width}" height="{height}" fill="#fbfbf5"/>',
+           f'<text x="{width / 2}" y="20" text-anchor="middle" font-size="15">{html.escape(title)}</text>']
+    for label, count, x, depth, w in rects:
+        y = height - 20 - (depth + 1) * row  # root อยู่ล่างสุด
+        name = html.escape(label)
+        out.append(f'<g><title>{name} ({count} samples, {count / total:.1%})</title>'
+                   f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" rx="2" fill="{_color(label)}"/>')
+        chars = int(w / 7)
+        if chars >= 3:
+            text = label if len(label) <= chars else label[:chars - 2] + ".."
+            out.append(f'<text x="{x + 3:.1f}" y="{y + row - 5}">{html.escape(text)}</text>')
+        out.append("</g>")
+    out.append("</svg>")
+    return "\n".join(out)
+
+
+def save(profile, folder, name, top_n=25):
+    """เขียน <name>.profile.svg + <name>.profile.folded ลง folder คืนค่า summary (ตาราง top-N, span)"""
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, f"{name}.profile.svg"), "w") as f:
+        f.write(profile.flamegraph(title=f"Job {name}"))
+    with open(os.path.join(folder, f"{name}.profile.folded"), "w") as f:
+        f.write(profile.folded())
+    return profile.summary(top_n)
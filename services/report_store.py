@@ -0,0 +1,197 @@
+import contextlib
+import json
+import os
+import sqlite3
+import time
+import config
+
+# ==========================================
+# Report Store: ทุกรายงานที่สร้างเก็บเป็น record ใน SQLite (ข้อความ, ข้อมูลที่ดึงได้, เวลาแต่ละขั้น, ไฟล์ PDF)
+# ค้นได้ด้วย index เช่น "deep margin < 1 cm เดือนนี้" ไม่ต้องเปิด PDF / ไล่ไฟล์ในโฟลเดอร์
+# - reports:   1 แถวต่อการสร้างรายงาน 1 ครั้ง (รวมการแก้ transcript แล้วสร้างใหม่)
+# - specimens: 1 แถวต่อ specimen ช่องสำคัญแยกเป็นคอลัมน์ที่มี index
+# ==========================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    job_id TEXT,
+    source TEXT,
+    template TEXT,
+    profile TEXT,
+    raw_text TEXT,
+    transcription TEXT,
+    data TEXT NOT NULL,
+    timings TEXT,
+    pdf TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created);
+CREATE INDEX IF NOT EXISTS idx_reports_template_created ON reports (template, created);
+CREATE INDEX IF NOT EXISTS idx_reports_job ON reports (job_id);
+
+CREATE TABLE IF NOT EXISTS specimens (
+    report_id INTEGER NOT NULL REFERENCES reports (id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    label TEXT,
+    side TEXT,
+    procedure TEXT,
+    deep_margin REAL,
+    min_margin REAL,
+    min_margin_name TEXT,
+    mass_size REAL,
+    PRIMARY KEY (report_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_specimens_deep_margin ON specimens (deep_margin);
+CREATE INDEX IF NOT EXISTS idx_specimens_min_margin ON specimens (min_margin);
+CREATE INDEX IF NOT EXISTS idx_specimens_side ON specimens (side);
+CREATE INDEX IF NOT EXISTS idx_specimens_procedure ON specimens (procedure);
+"""
+
+PROCEDURES = ["modified radical mastectomy", "simple mastectomy"]
+
+# ตัวกรองของ query(): ชื่อ -> (เงื่อนไข SQL)
+FILTERS = {
+    "since": "r.created >= ?",
+    "until": "r.created < ?",
+    "template": "r.template = ?",
+    "profile": "r.profile = ?",
+    "job_id": "r.job_id = ?",
+    "side": "s.side = ?",
+    "procedure": "s.procedure = ?",
+    "deep_margin_lt": "s.deep_margin < ?",
+    "min_margin_lt": "s.min_margin < ?",
+    "mass_size_gte": "s.mass_size >= ?",
+}
+SPECIMEN_FILTERS = {"side", "procedure", "deep_margin_lt", "min_margin_lt", "mass_size_gte"}
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None  # เช่น "x" / ค่าว่าง
+
+
+def key_fields(data):
+    """ช่องสำคัญของ specimen 1 ชุด (ผลของ extract_data) สำหรับคอลัมน์ที่มี index"""
+    margins = {name: _number(v) for name, v in (data.get("margins") or {}).items()}
+    margins = {name: v for name, v in margins.items() if v is not None}
+    min_name = min(margins, key=margins.get) if margins else None
+    mass = [_number(v) for field in ("mass_infiltrative", "mass_welldefined") for v in (data.get(field) or [])]
+    mass = [v for v in mass if v is not None]
+    circles, checks = data.get("circles") or [], data.get("checks") or []
+    return {
+        "side": next((s for s in ("right", "left") if s in circles), None),
+        "procedure": next((p for p in PROCEDURES if p in checks), None),
+        "deep_margin": margins.get("deep margin"),
+        "min_margin": margins[min_name] if min_name else None,
+        "min_margin_name": min_name,
+        "mass_size": max(mass) if mass else None,
+    }
+
+
+class ReportStore:
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # เปิด connection ใหม่ทุกครั้ง: ปลอดภัยทั้งข้าม thread และหลัง fork (เหมือน Transcript Cache)
+        db = sqlite3.connect(self.db_path, timeout=10)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def add(self, specimens, raw_text=None, transcription=None, job_id=None, source=None,
+            template=None, profile=None, timings=None, pdf=None, created=None):
+        """
+        เก็บรายงาน 1 ครั้ง คืนค่า id
+        specimens = ผลของ extract_specimens [{"label", "data"}] (specimen เดียวส่ง [{"label": None, "data": data}])
+        """
+        with self._connect() as db:
+            cur = db.execute(
+                "INSERT INTO reports (created, job_id, source, template, profile, raw_text, transcription, data, timings, pdf)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (created or time.time(), job_id, source, template and os.path.basename(template), profile,
+                 raw_text, transcription, json.dumps(specimens, ensure_ascii=False),
+                 json.dumps(timings) if timings else None, pdf))
+            report_id = cur.lastrowid
+            db.executemany(
+                "INSERT INTO specimens (report_id, idx, label, side, procedure, deep_margin, min_margin, min_margin_name, mass_size)"
+                " VALUES (:report_id, :idx, :label, :side, :procedure, :deep_margin, :min_margin, :min_margin_name, :mass_size)",
+                [dict(key_fields(s["data"]), report_id=report_id, idx=i, label=s.get("label"))
+                 for i, s in enumerate(specimens)])
+        return report_id
+
+    def get(self, report_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def query(self, limit=50, before=None, with_text=False, **filters):
+        """
+        ค้นรายงานใหม่สุดก่อน แบ่งหน้าแบบ keyset: หน้าถัดไปส่ง before=<next_before> ของหน้าก่อน
+        (ทุกหน้าเป็น index seek ไม่ต้องนับข้ามแถวแบบ OFFSET)
+        filters: since / until (epoch วินาที), template, profile, job_id,
+                 side, procedure, deep_margin_lt, min_margin_lt, mass_size_gte (ตรงอย่างน้อย 1 specimen)
+        คืนค่า {"items": [...], "next_before": id หรือ None}
+        """
+        unknown = set(filters) - set(FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+        where, params = [], []
+        for name, value in filters.items():
+            if value is not None:
+                where.append(FILTERS[name])
+                params.append(value)
+        if before is not None:
+            where.append("r.id < ?")
+            params.append(before)
+        if any(filters.get(name) is not None for name in SPECIMEN_FILTERS):
+            sql = "SELECT DISTINCT r.* FROM reports r JOIN specimens s ON s.report_id = r.id"
+        else:
+            sql = "SELECT r.* FROM reports r"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # id เพิ่มตามเวลาที่บันทึก -> เรียงด้วย id แทน created ได้ (ใช้ PRIMARY KEY ตรงๆ)
+        sql += " ORDER BY r.id DESC LIMIT ?"
+        limit = max(1, min(int(limit), 500))
+        with self._connect() as db:
+            rows = db.execute(sql, params + [limit + 1]).fetchall()
+        items = [self._record(row, with_text) for row in rows[:limit]]
+        return {"items": items, "next_before": items[-1]["id"] if len(rows) > limit else None}
+
+    def _record(self, row, with_text=True):
+        record = dict(row)
+        record["specimens"] = json.loads(record.pop("data"))
+        record["timings"] = json.loads(record["timings"]) if record["timings"] else None
+        if not with_text:
+            record.pop("raw_text"); record.pop("transcription")
+        return record
+
+    def stats(self):
+        with self._connect() as db:
+            reports, first, last = db.execute("SELECT COUNT(*), MIN(created), MAX(created) FROM reports").fetchone()
+        return {"reports": reports, "first": first, "last": last}
+
+
+_store = None
+_store_pid = None
+
+
+def get_store():
+    global _store, _store_pid
+    if _store is None or _store_pid != os.getpid():
+        _store = ReportStore(config.REPORT_DB)
+        _store_pid = os.getpid()
+    return _store
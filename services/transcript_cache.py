@@ -0,0 +1,127 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import config
+
+# ==========================================
+# Transcript Cache: ไฟล์เสียงเดิม (เนื้อหาเดียวกัน) + โมเดล/option เดิม -> ไม่ต้องรัน Whisper ซ้ำ
+# เก็บใน SQLite ไฟล์เดียว ใช้ร่วมกันได้ทุก process (web worker / batch)
+# ==========================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transcripts_accessed ON transcripts (accessed);
+CREATE INDEX IF NOT EXISTS idx_transcripts_created ON transcripts (created);
+"""
+
+
+def audio_hash(data):
+    """hash จากเนื้อหาไฟล์เสียง (bytes) ชื่อไฟล์ต่างกันแต่เนื้อหาเดียวกัน = key เดียวกัน"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(content_hash, model_size, options):
+    """key = hash ของเสียง + ขนาดโมเดล + decode options (เรียง key ให้คงที่)"""
+    raw = json.dumps([content_hash, model_size, options], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+
+    def __init__(self, db_path, max_bytes, max_age):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # เปิด connection ใหม่ทุกครั้ง: ปลอดภัยทั้งข้าม thread และหลัง fork
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:  # commit / rollback
+                yield db
+        finally:
+            db.close()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def get(self, key):
+        with self._connect() as db:
+            row = db.execute("SELECT payload, created FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row and time.time() - row[1] <= self.max_age:
+                db.execute("UPDATE transcripts SET accessed = ? WHERE key = ?", (time.time(), key))
+                self._count("hits")
+                return json.loads(row[0])
+        self._count("misses")
+        return None
+
+    def put(self, key, result):
+        payload = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO transcripts (key, created, accessed, size, payload) VALUES (?, ?, ?, ?, ?)",
+                (key, now, now, len(payload), payload))
+            self._count("stores")
+            self._evict(db)
+
+    def _evict(self, db):
+        # 1) หมดอายุตามเวลา
+        removed = db.execute("DELETE FROM transcripts WHERE created < ?", (time.time() - self.max_age,)).rowcount
+        # 2) เกินขนาด -> ลบตัวที่ไม่ได้ใช้นานที่สุดก่อน (LRU)
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total > self.max_bytes:
+            for key, size in db.execute("SELECT key, size FROM transcripts ORDER BY accessed").fetchall():
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+        if removed:
+            self._count("evictions", removed)
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM transcripts")
+
+    def stats(self):
+        with self._connect() as db:
+            entries, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcripts").fetchone()
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update(entries=entries, bytes=total, hit_rate=(stats["hits"] / lookups) if lookups else None)
+        return stats
+
+
+_cache = None
+_cache_pid = None
+
+
+def get_cache():
+    """Cache ของ process นี้ (สร้างใหม่หลัง fork ตัวนับจะได้แยกกันต่อ worker)"""
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        _cache = TranscriptCache(config.TRANSCRIPT_CACHE_DB,
+                                 max_bytes=config.TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024,
+                                 max_age=config.TRANSCRIPT_CACHE_MAX_AGE_DAYS * 86400)
+        _cache_pid = os.getpid()
+    return _cache